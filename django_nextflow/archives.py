@@ -0,0 +1,261 @@
+import os
+import time
+import zlib
+import struct
+import shutil
+import hashlib
+import zipfile
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+STORED, DEFLATED = zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED
+ZIP64_LIMIT = 0xFFFFFFFF
+SPOOL_SIZE = 16777216
+LOCAL_HEADER = "<4s5H3L2H"
+CENTRAL_HEADER = "<4s6H3L5H2L"
+
+class HashingWriter:
+    """Wraps a file being written to, hashing and counting everything
+    written to it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.md5 = hashlib.md5()
+        self.position = 0
+
+
+    def write(self, data):
+        self.f.write(data)
+        self.md5.update(data)
+        self.position += len(data)
+
+
+
+def dos_time(timestamp):
+    """Converts a timestamp to the (time, date) pair zip headers use. Zip
+    files can't have dates before 1980."""
+
+    t = time.localtime(timestamp)
+    if t.tm_year < 1980: return 0, (1 << 5) | 1
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    )
+
+
+def list_directory(path):
+    """Gets the (name, path) pairs of everything within a directory, as they
+    would be named in a zip of it - directory names end with a slash. Symlinks
+    to files are included as the files they point to, but anything else which
+    isn't a regular file - such as a broken symlink, or a socket - is left
+    out."""
+
+    entries = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        relative = os.path.relpath(root, path)
+        prefix = "" if relative == "." else relative.replace(os.sep, "/") + "/"
+        for name in dirs:
+            entries.append((prefix + name + "/", os.path.join(root, name)))
+        for name in sorted(files):
+            if os.path.isfile(os.path.join(root, name)):
+                entries.append((prefix + name, os.path.join(root, name)))
+    return entries
+
+
+def compress_member(path, compresslevel=6, spool_dir=None, chunk_size=1048576):
+    """Deflates a file into a temporary file, hashing it on the way. Files
+    which compression doesn't make smaller (such as files which are already
+    compressed) are stored as they are instead, and no temporary file is
+    kept for them."""
+
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    md5, crc, size = hashlib.md5(), 0, 0
+    spool = tempfile.SpooledTemporaryFile(SPOOL_SIZE, dir=spool_dir)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            md5.update(chunk)
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            spool.write(compressor.compress(chunk))
+    spool.write(compressor.flush())
+    member = {
+        "size": size, "md5": md5.hexdigest(), "crc": crc,
+        "compressed_size": spool.tell(), "method": DEFLATED, "spool": spool
+    }
+    if member["compressed_size"] >= size:
+        spool.close()
+        member.update(compressed_size=size, method=STORED, spool=None)
+    else: spool.seek(0)
+    return member
+
+
+def write_member(writer, name, path, member, is_directory=False):
+    """Writes a member's local header and data to a zip being written, and
+    returns its central directory record. Members too large for a plain zip
+    header get a zip64 extra field."""
+
+    stat = os.stat(path)
+    encoded = name.encode()
+    flags = 0 if encoded.isascii() else 0x800
+    mod_time, mod_date = dos_time(stat.st_mtime)
+    offset = writer.position
+    large = member["size"] >= ZIP64_LIMIT or member["compressed_size"] >= ZIP64_LIMIT
+    extra = struct.pack(
+        "<2H2Q", 1, 16, member["size"], member["compressed_size"]
+    ) if large else b""
+    version = 45 if large or offset >= ZIP64_LIMIT else 20
+    writer.write(struct.pack(
+        LOCAL_HEADER, b"PK\x03\x04", version, flags, member["method"],
+        mod_time, mod_date, member["crc"],
+        ZIP64_LIMIT if large else member["compressed_size"],
+        ZIP64_LIMIT if large else member["size"], len(encoded), len(extra)
+    ) + encoded + extra)
+    member["offset"] = writer.position
+    if member["spool"]:
+        shutil.copyfileobj(member["spool"], writer)
+        member["spool"].close()
+    elif not is_directory:
+        with open(path, "rb") as f: shutil.copyfileobj(f, writer)
+    central_extra = [
+        value for value in (member["size"], member["compressed_size"], offset)
+        if value >= ZIP64_LIMIT
+    ]
+    central_extra = struct.pack(
+        f"<2H{len(central_extra)}Q", 1, 8 * len(central_extra), *central_extra
+    ) if central_extra else b""
+    attributes = (stat.st_mode & 0xFFFF) << 16 | (0x10 if is_directory else 0)
+    return struct.pack(
+        CENTRAL_HEADER, b"PK\x01\x02", 3 << 8 | version, version, flags,
+        member["method"], mod_time, mod_date, member["crc"],
+        min(member["compressed_size"], ZIP64_LIMIT),
+        min(member["size"], ZIP64_LIMIT), len(encoded), len(central_extra),
+        0, 0, 0, attributes, min(offset, ZIP64_LIMIT)
+    ) + encoded + central_extra
+
+
+def write_end_records(writer, count, start):
+    """Writes the end of central directory record of a zip being written,
+    with zip64 records before it if the zip needs them."""
+
+    size = writer.position - start
+    if count >= 0xFFFF or size >= ZIP64_LIMIT or start >= ZIP64_LIMIT:
+        position = writer.position
+        writer.write(struct.pack(
+            "<4sQ2H2L4Q", b"PK\x06\x06", 44, 45, 45, 0, 0, count, count, size, start
+        ))
+        writer.write(struct.pack("<4sLQL", b"PK\x06\x07", 0, position, 1))
+    writer.write(struct.pack(
+        "<4s4H2LH", b"PK\x05\x06", 0, 0, min(count, 0xFFFF),
+        min(count, 0xFFFF), min(size, ZIP64_LIMIT), min(start, ZIP64_LIMIT), 0
+    ))
+
+
+def write_archive(path, zip_path, workers=None, compresslevel=6):
+    """Zips a directory, compressing its files in parallel. A pool of threads
+    deflates files into temporary files (zlib releases the GIL while it
+    works), and they are then written to the zip in order - only a few files
+    ahead of the writer are compressed at once. The zip's MD5 is worked out
+    as it is written, and the size, MD5 and location in the zip of every file
+    is returned along with it, so that files can later be read straight from
+    the zip."""
+
+    entries = list_directory(path)
+    workers = workers or os.cpu_count() or 1
+    spool_dir = os.path.dirname(os.path.abspath(zip_path))
+    records, members = [], []
+    with open(zip_path, "wb") as f, ThreadPoolExecutor(max_workers=workers) as executor:
+        writer, pending = HashingWriter(f), deque()
+        entries = iter(entries)
+
+        def submit():
+            for name, entry_path in entries:
+                if name.endswith("/"):
+                    pending.append((name, entry_path, None))
+                else:
+                    pending.append((name, entry_path, executor.submit(
+                        compress_member, entry_path, compresslevel, spool_dir
+                    )))
+                    return
+
+        for _ in range(workers * 2): submit()
+        while pending:
+            name, entry_path, future = pending.popleft()
+            if future is None:
+                member = {
+                    "size": 0, "crc": 0, "compressed_size": 0,
+                    "method": STORED, "spool": None
+                }
+                records.append(write_member(writer, name, entry_path, member, True))
+                continue
+            member = future.result()
+            submit()
+            records.append(write_member(writer, name, entry_path, member))
+            members.append({
+                "name": name, "size": member["size"], "md5": member["md5"],
+                "offset": member["offset"], "method": member["method"],
+                "compressed_size": member["compressed_size"]
+            })
+        start = writer.position
+        for record in records: writer.write(record)
+        write_end_records(writer, len(records), start)
+    return writer.md5.hexdigest(), members
+
+
+def unpack_archive(zip_path, path, chunk_size=1048576):
+    """Unpacks a zip into a directory, hashing each file as it is extracted,
+    and returns the size, MD5 and location in the zip of every file in the
+    same form as write_archive. Members with absolute names, or names which
+    would be extracted outside of the directory, are skipped."""
+
+    members = []
+    with zipfile.ZipFile(zip_path) as archive, open(zip_path, "rb") as raw:
+        for info in archive.infolist():
+            name = info.filename
+            if name.startswith("/") or ".." in name.split("/"): continue
+            target = os.path.join(path, *name.split("/"))
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            md5 = hashlib.md5()
+            with archive.open(info) as source, open(target, "wb") as f:
+                for chunk in iter(lambda: source.read(chunk_size), b""):
+                    md5.update(chunk)
+                    f.write(chunk)
+            raw.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<2H", raw.read(4))
+            members.append({
+                "name": name, "size": info.file_size, "md5": md5.hexdigest(),
+                "offset": info.header_offset + 30 + name_length + extra_length,
+                "method": info.compress_type,
+                "compressed_size": info.compress_size
+            })
+    return members
+
+
+def iter_member(zip_path, offset, compressed_size, method, chunk_size=1048576):
+    """Yields the contents of a file within a zip in chunks, reading only its
+    own compressed bytes from their known offset - the zip's central
+    directory is never read. Chunks are at most chunk_size bytes however
+    well the file compressed."""
+
+    decompressor = zlib.decompressobj(-15) if method == DEFLATED else None
+    remaining = compressed_size
+    with open(zip_path, "rb") as f:
+        f.seek(offset)
+        while remaining:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk: break
+            remaining -= len(chunk)
+            if not decompressor:
+                yield chunk
+                continue
+            while chunk:
+                data = decompressor.decompress(chunk, chunk_size)
+                if data: yield data
+                chunk = decompressor.unconsumed_tail
+    if decompressor:
+        data = decompressor.flush()
+        if data: yield data
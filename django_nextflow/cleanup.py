@@ -0,0 +1,134 @@
+import os
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import transaction
+from .models import Data, Execution, PendingDeletion
+
+def remove_path(path):
+    """Deletes a file, symlink or directory. Paths which are already gone
+    count as deleted."""
+
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    except FileNotFoundError: pass
+
+
+def claim_deletions(batch_size=100, max_attempts=5, lease=600):
+    """Claims a batch of queued deletions which are due. Claimed deletions
+    aren't due again until the lease runs out, so several collectors can run
+    at once without trying the same paths - and if a collector dies, its
+    paths are picked up again later."""
+
+    now = time.time()
+    with transaction.atomic():
+        ids = list(PendingDeletion.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            next_attempt__lte=now, attempts__lt=max_attempts
+        ).order_by("next_attempt").values_list("id", flat=True)[:batch_size])
+        PendingDeletion.objects.filter(id__in=ids).update(next_attempt=now + lease)
+    return list(PendingDeletion.objects.filter(id__in=ids))
+
+
+def collect_garbage(batch_size=100, workers=4, max_attempts=5, retry_delay=60, lease=600):
+    """Deletes the paths queued for deletion, a batch at a time, with a pool
+    of threads. Deleted paths are removed from the queue in one query per
+    batch, and failed ones are tried again later - after retry_delay seconds,
+    doubling after each failure - until max_attempts have failed. Returns the
+    number of paths deleted and the number which failed."""
+
+    deleted, failed = 0, 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            batch = claim_deletions(batch_size, max_attempts, lease)
+            if not batch: break
+
+            def remove(deletion):
+                try:
+                    remove_path(deletion.path)
+                except OSError as e: return e
+
+            errors = list(executor.map(remove, batch))
+            PendingDeletion.objects.filter(id__in=[
+                deletion.id for deletion, error in zip(batch, errors) if not error
+            ]).delete()
+            for deletion, error in zip(batch, errors):
+                if not error: continue
+                deletion.attempts += 1
+                deletion.error = str(error)
+                deletion.next_attempt = time.time() + retry_delay * 2 ** (deletion.attempts - 1)
+                deletion.save(update_fields=["attempts", "error", "next_attempt"])
+            deleted += errors.count(None)
+            failed += len(errors) - errors.count(None)
+    return deleted, failed
+
+
+def last_modified(path):
+    """Gets when a directory, or the log file within it, was last changed."""
+
+    times = [os.path.getmtime(path)]
+    log = os.path.join(path, ".nextflow.log")
+    if os.path.exists(log): times.append(os.path.getmtime(log))
+    return max(times)
+
+
+def find_orphaned_directories(min_age=86400):
+    """Finds execution directories in NEXTFLOW_DATA_ROOT and upload
+    directories in NEXTFLOW_UPLOADS_ROOT which have no object in the database
+    and aren't already queued for deletion. An execution's directory is made
+    before its object - run only creates the object once the execution has
+    finished, and run_and_update once it first polls it - so a directory with
+    no object may just be young. Directories (or logs within them) changed
+    within the last min_age seconds are left alone."""
+
+    orphans, cutoff = [], time.time() - min_age
+    for root, model in (
+        (settings.NEXTFLOW_DATA_ROOT, Execution),
+        (settings.NEXTFLOW_UPLOADS_ROOT, Data)
+    ):
+        if not os.path.isdir(root): continue
+        directories = {
+            int(entry.name): entry.path for entry in os.scandir(root)
+            if entry.name.isdigit() and entry.is_dir(follow_symlinks=False)
+        }
+        ids = list(directories)
+        existing = set()
+        for index in range(0, len(ids), 500):
+            existing.update(model.objects.filter(
+                id__in=ids[index:index + 500]
+            ).values_list("id", flat=True))
+        queued = set(PendingDeletion.objects.filter(
+            path__startswith=root
+        ).values_list("path", flat=True))
+        orphans += sorted(
+            path for id, path in directories.items() if id not in existing
+            and path not in queued and last_modified(path) < cutoff
+        )
+    return orphans
+
+
+def find_missing_data():
+    """Finds data objects which are ready and not removed, but whose files
+    are no longer on disk."""
+
+    missing = []
+    objects = Data.objects.filter(is_ready=True, is_removed=False).select_related(
+        "upstream_process_execution__execution"
+    ).only(
+        "id", "filename", "is_directory",
+        "upstream_process_execution__identifier",
+        "upstream_process_execution__execution__id"
+    )
+    for data in objects.iterator(chunk_size=1000):
+        try:
+            path = data.full_path + (".zip" if data.is_directory else "")
+        except (FileNotFoundError, IndexError):
+            missing.append(data)
+            continue
+        if not os.path.lexists(path): missing.append(data)
+    return missing
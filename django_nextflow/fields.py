@@ -0,0 +1,82 @@
+import gzip
+from django import forms
+from django.db import models
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+class CompressedTextField(models.BinaryField):
+    """A text field which is stored gzip-compressed in the database. Values are
+    plain strings in Python, and are compressed and decompressed transparently.
+
+    Short values are stored as raw UTF-8, as they would not compress, and
+    values written before the field was compressed are read back unchanged.
+    UTF-8 text can never start with the gzip magic bytes, so the two can always
+    be told apart."""
+
+    empty_values = [None, "", b""]
+
+    def __init__(self, *args, min_length=256, compresslevel=6, **kwargs):
+        kwargs.setdefault("editable", True)
+        self.min_length = min_length
+        self.compresslevel = compresslevel
+        super().__init__(*args, **kwargs)
+
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs.pop("editable", None)
+        if self.min_length != 256: kwargs["min_length"] = self.min_length
+        if self.compresslevel != 6: kwargs["compresslevel"] = self.compresslevel
+        return name, path, args, kwargs
+
+
+    def _check_str_default_value(self):
+        return []
+
+
+    def get_default(self):
+        default = super().get_default()
+        return "" if default == b"" else default
+
+
+    def compress(self, value):
+        """Turns a string into the bytes that will be stored."""
+
+        encoded = value.encode()
+        if len(encoded) < self.min_length: return encoded
+        return gzip.compress(encoded, compresslevel=self.compresslevel, mtime=0)
+
+
+    @staticmethod
+    def decompress(value):
+        """Turns stored bytes back into a string."""
+
+        value = bytes(value)
+        if value.startswith(GZIP_MAGIC): value = gzip.decompress(value)
+        return value.decode(errors="replace")
+
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or isinstance(value, str): return value
+        return self.decompress(value)
+
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)): return self.decompress(value)
+        return value
+
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if isinstance(value, str): value = self.compress(value)
+        return super().get_db_prep_value(value, connection, prepared)
+
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+
+    def formfield(self, **kwargs):
+        return forms.CharField(**{
+            "required": not self.blank, "label": self.verbose_name,
+            "widget": forms.Textarea, **kwargs
+        })
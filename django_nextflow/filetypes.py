@@ -0,0 +1,106 @@
+from django.conf import settings
+
+COMPRESSION_SUFFIXES = {"gz", "bgz", "bz2", "xz", "zst"}
+INDEX_SUFFIXES = {"tbi", "csi", "bai", "crai", "fai", "gzi", "md5"}
+
+DEFAULT_FILETYPES = [
+    "fastq", "fq", "fasta", "fa", "fna", "faa", "sam", "bam", "cram", "vcf",
+    "bcf", "bed", "bedgraph", "bw", "bigwig", "gff", "gff3", "gtf", "tsv",
+    "csv", "txt", "json", "yaml", "yml", "html", "pdf", "png", "svg", "h5",
+    "nf", "config", "log", "zip", "fastq.gz", "fq.gz", "fastq.bz2", "fq.bz2",
+    "fasta.gz", "fa.gz", "vcf.gz", "bed.gz", "gff.gz", "gff3.gz", "gtf.gz",
+    "tsv.gz", "csv.gz", "txt.gz", "tar.gz", "tar.bz2", "tar.xz", "tgz",
+    "vcf.gz.tbi", "vcf.gz.csi", "bcf.csi", "bed.gz.tbi", "bam.bai", "bam.csi",
+    "cram.crai", "fa.fai", "fasta.fai", "fa.gz.fai", "fa.gz.gzi",
+]
+
+MAGIC_FILETYPES = {
+    "bam": "bam", "cram": "cram", "bcf": "bcf", "gzip": "gz", "bgzf": "gz",
+    "zip": "zip", "bzip2": "bz2", "xz": "xz", "zstd": "zst", "hdf5": "h5",
+    "pdf": "pdf", "png": "png", "jpeg": "jpg", "tiff": "tiff",
+}
+
+class FileTypeRegistry:
+    """Works out the filetype of files from their names. Known filetypes,
+    which can span several suffixes (like vcf.gz.tbi), are compiled into a
+    trie of suffixes read from the end of the name, so the longest known one
+    is found in a single walk. Names with unknown suffixes keep any trailing
+    compression and index suffixes along with the suffix before them.
+
+    Files without any suffix can be identified by the format detected from
+    their first bytes instead."""
+
+    def __init__(self, filetypes=(), magic=None):
+        self.trie = {}
+        self.magic = dict(magic or {})
+        for filetype in filetypes: self.register(filetype)
+
+
+    def __repr__(self):
+        return f"<FileTypeRegistry ({len(self.magic)} magic numbers)>"
+
+
+    def register(self, filetype):
+        """Adds a filetype, made of one or more suffixes."""
+
+        node = self.trie
+        for part in reversed(filetype.lower().split(".")):
+            node = node.setdefault(part, {})
+        node[None] = filetype.lower()
+
+
+    def register_magic(self, format, filetype):
+        """Sets the filetype of suffix-less files whose first bytes show them
+        to be in some format."""
+
+        self.magic[format] = filetype
+
+
+    def match(self, suffixes):
+        """Gets the longest known filetype which some list of suffixes ends
+        with, if there is one."""
+
+        node, match = self.trie, None
+        for part in reversed(suffixes):
+            node = node.get(part.lower())
+            if node is None: break
+            match = node.get(None, match)
+        return match
+
+
+    def detect(self, filename, format=None):
+        """Gets the filetype of a file from its name, or from the format of
+        its contents if it has no suffix."""
+
+        suffixes = filename.split(".")[1:]
+        if not suffixes:
+            return self.magic.get(format, "") if format else ""
+        match = self.match(suffixes)
+        if match: return match[:50]
+        count = 1
+        while count < len(suffixes) and suffixes[-count].lower() in\
+            COMPRESSION_SUFFIXES | INDEX_SUFFIXES:
+            count += 1
+        return ".".join(suffixes[-count:])[:50]
+
+
+
+registry = FileTypeRegistry(DEFAULT_FILETYPES, MAGIC_FILETYPES)
+_settings_loaded = False
+
+def get_registry():
+    """Gets the filetype registry, including any extra filetypes listed in
+    the NEXTFLOW_FILETYPES setting."""
+
+    global _settings_loaded
+    if not _settings_loaded:
+        for filetype in getattr(settings, "NEXTFLOW_FILETYPES", []):
+            registry.register(filetype)
+        _settings_loaded = True
+    return registry
+
+
+def register_filetype(filetype):
+    """Adds a filetype to the registry."""
+
+    get_registry().register(filetype)
@@ -0,0 +1,116 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+MAX_UPLOAD_HASHERS = 1024
+UPLOAD_HASHER_TIMEOUT = 86400
+
+class UploadHasher:
+    """Hashes an upload as its chunks arrive, so that its MD5 is ready as soon
+    as the last chunk is written rather than needing the whole file to be read
+    again. It remembers how many bytes it has hashed - chunks which start there
+    are hashed as they are written, and anything beyond that is caught up from
+    disk, while it is still likely to be cached, once it is contiguous.
+
+    The lock is only held while bytes are added to the hash, never while
+    chunks are written or the file is read, so writers of other chunks of the
+    same upload are never kept waiting."""
+
+    def __init__(self, path):
+        self.path = path
+        self.md5 = hashlib.md5()
+        self.offset = 0
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+    def __repr__(self):
+        return f"<UploadHasher ({self.path}: {self.offset} bytes)>"
+
+
+    def update(self, offset, data):
+        """Hashes some bytes which start at some offset in the file. They are
+        ignored if they don't start where hashing has got to."""
+
+        with self.lock:
+            if offset != self.offset: return False
+            self.md5.update(data)
+            self.offset += len(data)
+            return True
+
+
+    def hash_chunks(self, offset, chunks):
+        """Passes through chunks of bytes which are being written at some
+        offset, hashing them on the way if they start where hashing has got
+        to. If hashing moves past a chunk before it is hashed, the rest are
+        passed through unhashed and are caught up from disk later."""
+
+        hashing = offset == self.offset
+        for chunk in chunks:
+            if hashing: hashing = self.update(offset, chunk)
+            offset += len(chunk)
+            yield chunk
+
+
+    def catch_up(self, end, block_size=1048576):
+        """Hashes the file from wherever hashing has got to up to some offset,
+        reading it from disk. Blocks are read without holding the lock, and
+        are only hashed if nothing else has hashed past them in the meantime."""
+
+        if self.offset >= end: return
+        with open(self.path, "rb") as f:
+            while True:
+                start = self.offset
+                if start >= end: return
+                f.seek(start)
+                block = f.read(min(block_size, end - start))
+                if not block: return
+                self.update(start, block)
+
+
+    def hexdigest(self, size):
+        """Gets the MD5 of the whole file, once it is some size."""
+
+        self.catch_up(size)
+        return self.md5.hexdigest()
+
+
+
+def start_upload_hasher(key, path):
+    """Creates a hasher for a new upload, replacing any existing one. Hashers
+    of uploads which were abandoned are forgotten at the same time - any
+    which haven't been used for UPLOAD_HASHER_TIMEOUT seconds, and the least
+    recently used if there are more than MAX_UPLOAD_HASHERS. An upload whose
+    hasher is forgotten is hashed from disk when it is finalised instead."""
+
+    now = time.monotonic()
+    with _hashers_lock:
+        _hashers[key] = UploadHasher(path)
+        _hashers.move_to_end(key)
+        while _hashers and (len(_hashers) > MAX_UPLOAD_HASHERS or
+            now - next(iter(_hashers.values())).last_used > UPLOAD_HASHER_TIMEOUT):
+            _hashers.popitem(last=False)
+        return _hashers[key]
+
+
+def get_upload_hasher(key):
+    """Gets the hasher for an upload, if this process has one. Hash state
+    can't be saved anywhere, so a worker which didn't see an upload start -
+    or which has restarted since - won't have one."""
+
+    with _hashers_lock:
+        hasher = _hashers.get(key)
+        if hasher:
+            hasher.last_used = time.monotonic()
+            _hashers.move_to_end(key)
+        return hasher
+
+
+def discard_upload_hasher(key):
+    """Forgets the hasher for an upload."""
+
+    with _hashers_lock:
+        return _hashers.pop(key, None)
@@ -0,0 +1,148 @@
+import threading
+from queue import Queue, Empty
+
+_followers = {}
+_followers_lock = threading.Lock()
+
+class LogFollower:
+    """Follows a log file as it is written. It remembers how far through the
+    file it has read, and each poll passes only the newly appended lines to its
+    subscribers. Everything watching an execution in this process shares one
+    follower, so the file is read once per poll however many watchers there
+    are. Each poll reads at most chunk_size bytes, so a log which has grown a
+    lot is caught up with over several polls rather than read all at once."""
+
+    def __init__(self, path, chunk_size=1024 * 1024):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.partial = b""
+        self.caught_up = True
+        self.closed = False
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+
+    def __repr__(self):
+        return f"<LogFollower ({self.path})>"
+
+
+    def subscribe(self, callback):
+        """Registers a function to be called with each list of new lines. It
+        will be called with None when the log is closed."""
+
+        with self.lock: self.subscribers.append(callback)
+        return callback
+
+
+    def unsubscribe(self, callback):
+        """Stops a function being sent new lines."""
+
+        with self.lock:
+            if callback in self.subscribers: self.subscribers.remove(callback)
+
+
+    def poll(self):
+        """Reads up to chunk_size bytes appended to the log since the last poll
+        and passes the new complete lines to the subscribers. The lines are also
+        returned, and caught_up says whether the end of the file was reached. A
+        line which is still being written is held back until it is finished."""
+
+        with self.lock:
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(self.offset)
+                    data = f.read(self.chunk_size)
+            except FileNotFoundError:
+                self.caught_up = True
+                return []
+            self.offset += len(data)
+            self.caught_up = len(data) < self.chunk_size
+            *lines, self.partial = (self.partial + data).split(b"\n")
+            lines = [line.decode(errors="replace") for line in lines]
+            subscribers = list(self.subscribers)
+        if lines:
+            for callback in subscribers: callback(lines)
+        return lines
+
+
+    def close(self):
+        """Reads any final lines and tells subscribers the log is finished."""
+
+        self.poll()
+        while not self.caught_up: self.poll()
+        with self.lock:
+            if self.partial:
+                lines = [self.partial.decode(errors="replace")]
+                self.partial = b""
+            else: lines = []
+            self.closed = True
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            if lines: callback(lines)
+            callback(None)
+
+
+    def follow(self, interval=1, stop=None):
+        """Yields lines as they are appended to the log, until it is closed.
+        If no new lines arrive within the interval, the file is polled - and
+        any lines found go to every other subscriber too - straight away while
+        the follower is catching up with a large log. If a stop function is
+        given, it is checked at the start and whenever the file is polled, and
+        once it returns True the log is closed - so that a log which nothing
+        else will close still comes to an end."""
+
+        queue = Queue()
+        self.subscribe(queue.put)
+        try:
+            if self.closed: return
+            if stop and stop(): self.close()
+            while True:
+                try:
+                    lines = queue.get(timeout=interval if self.caught_up else 0)
+                except Empty:
+                    if stop and stop():
+                        self.close()
+                    else: self.poll()
+                    continue
+                if lines is None: return
+                yield from lines
+        finally:
+            self.unsubscribe(queue.put)
+
+
+
+def get_log_follower(key, path):
+    """Gets the follower for some log file, creating it if this process isn't
+    following it yet (or its last follower was closed)."""
+
+    with _followers_lock:
+        if key not in _followers or _followers[key].closed:
+            _followers[key] = LogFollower(path)
+        return _followers[key]
+
+
+def poll_log_follower(key):
+    """Polls the follower for some log file if anything is following it."""
+
+    follower = _followers.get(key)
+    if follower: follower.poll()
+
+
+def close_log_follower(key):
+    """Closes and forgets the follower for some log file, if there is one."""
+
+    with _followers_lock:
+        follower = _followers.pop(key, None)
+    if follower: follower.close()
+
+
+def release_log_follower(key, follower):
+    """Forgets the follower for some log file once it is closed or nothing is
+    subscribed to it any more, so that followers of finished logs don't stay
+    in memory."""
+
+    with _followers_lock:
+        if _followers.get(key) is follower and (
+            follower.closed or not follower.subscribers
+        ): del _followers[key]
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django_nextflow.models import Pipeline
+from django_nextflow.retention import apply_retention, executions_due
+
+class Command(BaseCommand):
+    help = "Reclaims space from finished executions using their pipelines' retention policies."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pipeline", type=int, action="append", help=(
+            "Only apply the policy of this pipeline (can be given more than once)."
+        ))
+        parser.add_argument("--workers", type=int, default=4, help=(
+            "How many paths to measure and delete at once."
+        ))
+        parser.add_argument("--dry-run", action="store_true")
+
+
+    def handle(self, *args, **options):
+        pipelines = Pipeline.objects.exclude(retention_policy=Pipeline.KEEP_ALL)
+        if options["pipeline"]: pipelines = pipelines.filter(id__in=options["pipeline"])
+        total, count = 0, 0
+        for pipeline in pipelines:
+            for execution in executions_due(pipeline):
+                reclaimed = apply_retention(
+                    execution, pipeline.retention_policy,
+                    workers=options["workers"], dry_run=options["dry_run"]
+                )
+                self.stdout.write(f"{execution}: {reclaimed / 1e6:.1f} MB")
+                total += reclaimed
+                count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would reclaim' if options['dry_run'] else 'Reclaimed'} "
+            f"{total / 1e6:.1f} MB from {count} executions"
+        ))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django_nextflow.models import Data
+from django_nextflow.utils import BINARY_CHECK_SIZE, get_file_extension
+
+class Command(BaseCommand):
+    help = "Recalculates the filetype of existing Data objects."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--sniff", action="store_true", help=(
+            "Read the first bytes of files without an extension to identify "
+            "them by their magic number."
+        ))
+        parser.add_argument("--dry-run", action="store_true")
+
+
+    def handle(self, *args, **options):
+        batch, checked, changed = [], 0, 0
+        objects = Data.objects.only(
+            "id", "filename", "filetype", "is_directory", "is_ready",
+            "upstream_process_execution"
+        ).order_by("id").iterator(chunk_size=options["batch_size"])
+        for data in objects:
+            checked += 1
+            filetype = self.get_filetype(data, options["sniff"])
+            if filetype != data.filetype:
+                data.filetype = filetype
+                batch.append(data)
+            if len(batch) >= options["batch_size"]:
+                changed += self.save(batch, options["dry_run"])
+                batch = []
+        changed += self.save(batch, options["dry_run"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would update' if options['dry_run'] else 'Updated'} "
+            f"{changed} of {checked} data objects"
+        ))
+
+
+    def get_filetype(self, data, sniff):
+        """Gets the filetype a data object should have."""
+
+        filetype = get_file_extension(data.filename)
+        if filetype or not sniff or data.is_directory or not data.is_ready:
+            return filetype
+        try:
+            with open(data.full_path, "rb") as f:
+                return get_file_extension(data.filename, f.read(BINARY_CHECK_SIZE))
+        except OSError: return filetype
+
+
+    def save(self, batch, dry_run):
+        """Saves the new filetypes of some data objects."""
+
+        if batch and not dry_run:
+            Data.objects.bulk_update(batch, ["filetype"])
+        return len(batch)
@@ -0,0 +1,64 @@
+import time
+from django.core.management.base import BaseCommand
+from django_nextflow.cleanup import (
+    collect_garbage, find_missing_data, find_orphaned_directories
+)
+from django_nextflow.models import Data, PendingDeletion
+
+class Command(BaseCommand):
+    help = "Deletes files and directories queued for deletion."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--max-attempts", type=int, default=5)
+        parser.add_argument("--retry-delay", type=int, default=60, help=(
+            "Seconds to wait before retrying a failed deletion - doubled "
+            "after each failure."
+        ))
+        parser.add_argument("--interval", type=int, help=(
+            "Keep running, collecting garbage every this many seconds."
+        ))
+        parser.add_argument("--reconcile", action="store_true", help=(
+            "Also queue directories with no object in the database for "
+            "deletion, and report data whose files are missing."
+        ))
+        parser.add_argument("--min-age", type=int, default=86400, help=(
+            "Seconds since a directory was last changed before it can be "
+            "treated as orphaned."
+        ))
+        parser.add_argument("--mark-removed", action="store_true", help=(
+            "When reconciling, mark data whose files are missing as removed."
+        ))
+
+
+    def handle(self, *args, **options):
+        while True:
+            if options["reconcile"]: self.reconcile(options)
+            deleted, failed = collect_garbage(
+                batch_size=options["batch_size"], workers=options["workers"],
+                max_attempts=options["max_attempts"],
+                retry_delay=options["retry_delay"]
+            )
+            style = self.style.SUCCESS if not failed else self.style.WARNING
+            self.stdout.write(style(f"Deleted {deleted} paths, {failed} failed"))
+            if not options["interval"]: break
+            time.sleep(options["interval"])
+
+
+    def reconcile(self, options):
+        """Queues orphaned directories for deletion and reports data whose
+        files are missing."""
+
+        orphans = find_orphaned_directories(options["min_age"])
+        if orphans: PendingDeletion.enqueue(*orphans)
+        for path in orphans: self.stdout.write(f"Orphaned directory: {path}")
+        missing = find_missing_data()
+        for data in missing:
+            self.stdout.write(f"Missing files: Data {data.id} ({data.filename})")
+        if missing and options["mark_removed"]:
+            Data.objects.filter(id__in=[d.id for d in missing]).update(is_removed=True)
+        self.stdout.write(
+            f"Queued {len(orphans)} orphaned directories, found "
+            f"{len(missing)} data objects with missing files"
+        )
@@ -0,0 +1,125 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django_nextflow.models import Data
+from django_nextflow.utils import IMPORT_MODES, get_file_hash
+
+class Command(BaseCommand):
+    help = "Imports files from directories or manifests as Data objects."
+
+    def add_arguments(self, parser):
+        parser.add_argument("sources", nargs="+", help=(
+            "Directories to import every file within, or manifest files "
+            "listing one path per line."
+        ))
+        parser.add_argument("--mode", default="copy", choices=list(IMPORT_MODES))
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--checkpoint", help=(
+            "File recording paths already handled, so that an interrupted "
+            "import can be resumed by running it again."
+        ))
+
+
+    def handle(self, *args, **options):
+        start = time.time()
+        paths = self.get_paths(options["sources"])
+        done = self.read_checkpoint(options["checkpoint"])
+        paths = [path for path in paths if path not in done]
+        self.stdout.write(f"{len(paths)} files to import ({len(done)} already done)")
+        duplicates = self.find_duplicates(paths, options["workers"])
+        imported, failed, size = 0, 0, 0
+        for index in range(0, len(paths), options["batch_size"]):
+            batch = paths[index:index + options["batch_size"]]
+            to_import = [path for path in batch if path not in duplicates]
+            objects, errors = Data.bulk_create_from_paths(
+                to_import, mode=options["mode"], workers=options["workers"],
+                saved=lambda paths: self.write_checkpoint(options["checkpoint"], paths)
+            )
+            for path, error in errors.items():
+                self.stderr.write(f"Could not import {path}: {error}")
+            imported += len(objects)
+            failed += len(errors)
+            size += sum(data.size for data in objects)
+            self.write_checkpoint(
+                options["checkpoint"], [p for p in batch if p in duplicates]
+            )
+            self.stdout.write(
+                f"{min(index + len(batch), len(paths))}/{len(paths)} files"
+            )
+        elapsed = max(time.time() - start, 0.001)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} files ({size / 1e6:.1f} MB), skipped "
+            f"{len(duplicates)} already imported, {failed} failed, in "
+            f"{elapsed:.1f}s - {imported / elapsed:.1f} files/s, "
+            f"{size / 1e6 / elapsed:.1f} MB/s"
+        ))
+
+
+    def get_paths(self, sources):
+        """Gets every file path to import, from directories to walk or manifest
+        files to read."""
+
+        paths = []
+        for source in sources:
+            if os.path.isdir(source):
+                for root, dirs, files in os.walk(source):
+                    dirs.sort()
+                    paths += [os.path.join(root, f) for f in sorted(files)]
+            elif os.path.isfile(source):
+                with open(source) as f:
+                    paths += [line.strip() for line in f if line.strip()]
+            else: raise CommandError(f"{source} does not exist")
+        return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+
+    def read_checkpoint(self, checkpoint):
+        """Gets the paths which a previous run already handled."""
+
+        if not checkpoint or not os.path.exists(checkpoint): return set()
+        with open(checkpoint) as f:
+            return {line.rstrip("\n") for line in f if line.strip()}
+
+
+    def write_checkpoint(self, checkpoint, paths):
+        """Records that some paths have been handled. Imported paths are
+        recorded as soon as their objects are saved, so that files which were
+        moved are never imported again."""
+
+        if not checkpoint or not paths: return
+        with open(checkpoint, "a") as f:
+            f.write("".join(f"{path}\n" for path in paths))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+    def find_duplicates(self, paths, workers):
+        """Gets the paths whose contents have already been uploaded, matching
+        them by size first so that only files which might be duplicates are
+        hashed."""
+
+        sizes = {}
+        for path in paths:
+            try:
+                if os.path.isfile(path): sizes[path] = os.path.getsize(path)
+            except OSError: pass
+        existing, values = set(), list(set(sizes.values()))
+        for index in range(0, len(values), 500):
+            existing |= set(Data.objects.filter(
+                size__in=values[index:index + 500], is_ready=True,
+                upstream_process_execution=None
+            ).values_list("size", "md5"))
+        existing_sizes = {size for size, _ in existing}
+        candidates = [p for p, size in sizes.items() if size in existing_sizes]
+        def hash_file(path):
+            try:
+                return get_file_hash(path)
+            except OSError: return None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            hashes = executor.map(hash_file, candidates)
+            return {
+                path for path, md5 in zip(candidates, hashes)
+                if (sizes[path], md5) in existing
+            }
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django_nextflow.models import Pipeline
+
+class Command(BaseCommand):
+    help = "Stores the input definitions of each pipeline's schema file in the database."
+
+    def handle(self, *args, **options):
+        stored, count = 0, 0
+        for pipeline in Pipeline.objects.all():
+            pipeline.save(update_fields=["schema_json"])
+            stored += bool(pipeline.schema_json)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored schemas for {stored} of {count} pipelines"
+        ))
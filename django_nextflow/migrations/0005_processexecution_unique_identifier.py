@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_nextflow', '0004_execution_data_params_execution_execution_params_and_more'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='processexecution',
+            constraint=models.UniqueConstraint(fields=('execution', 'identifier'), name='unique_process_execution_identifier'),
+        ),
+    ]
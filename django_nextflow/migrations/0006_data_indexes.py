@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_nextflow', '0005_processexecution_unique_identifier'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='data',
+            index=models.Index(fields=['upstream_process_execution', 'filename'], name='data_output_filename_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='data',
+            index=models.Index(fields=['md5'], name='data_md5_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-19 11:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_nextflow', '0006_data_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='execution',
+            options={'base_manager_name': 'objects', 'ordering': ['started']},
+        ),
+        migrations.AlterModelOptions(
+            name='processexecution',
+            options={'base_manager_name': 'objects', 'ordering': ['started']},
+        ),
+    ]
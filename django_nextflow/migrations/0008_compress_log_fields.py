@@ -0,0 +1,69 @@
+# Generated by Django 3.2.25 on 2026-10-19 11:30
+
+from django.db import migrations
+import django_nextflow.fields
+
+FIELDS = {
+    "execution": ["stdout", "stderr", "command"],
+    "processexecution": ["stdout", "stderr"],
+}
+
+def copy_logs(apps, forwards):
+    """Copies each log column to its replacement a batch of rows at a time.
+    Values are strings in Python either way, so the new field compresses
+    them as they are written (or the old field stores them as text)."""
+
+    for model_name, fields in FIELDS.items():
+        model = apps.get_model("django_nextflow", model_name)
+        source = fields if forwards else [f"{f}_compressed" for f in fields]
+        target = [f"{f}_compressed" for f in fields] if forwards else fields
+        objects = model.objects.only("id", *source).order_by("id")
+        batch = []
+        for obj in objects.iterator(chunk_size=500):
+            for old, new in zip(source, target):
+                setattr(obj, new, getattr(obj, old))
+            batch.append(obj)
+            if len(batch) == 500:
+                model.objects.bulk_update(batch, target)
+                batch = []
+        if batch: model.objects.bulk_update(batch, target)
+
+
+def compress_logs(apps, schema_editor):
+    copy_logs(apps, forwards=True)
+
+
+def decompress_logs(apps, schema_editor):
+    copy_logs(apps, forwards=False)
+
+
+def operations():
+    """The log columns can't be altered in place - on PostgreSQL, casting
+    text to bytea treats backslashes as escapes. So each gets a new column,
+    which the existing values are compressed into before the old column is
+    dropped and the new one takes its name."""
+
+    add, remove, rename = [], [], []
+    for model_name, fields in FIELDS.items():
+        for name in fields:
+            add.append(migrations.AddField(
+                model_name=model_name, name=f"{name}_compressed",
+                field=django_nextflow.fields.CompressedTextField(default=""),
+                preserve_default=False,
+            ))
+            remove.append(migrations.RemoveField(model_name=model_name, name=name))
+            rename.append(migrations.RenameField(
+                model_name=model_name, old_name=f"{name}_compressed", new_name=name,
+            ))
+    return add + [
+        migrations.RunPython(compress_logs, decompress_logs)
+    ] + remove + rename
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_nextflow', '0007_defer_log_fields'),
+    ]
+
+    operations = operations()
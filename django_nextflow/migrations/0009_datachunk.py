@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_nextflow', '0008_compress_log_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataChunk',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('offset', models.BigIntegerField()),
+                ('size', models.BigIntegerField()),
+                ('data', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='django_nextflow.data')),
+            ],
+            options={
+                'ordering': ['offset'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='datachunk',
+            constraint=models.UniqueConstraint(fields=('data', 'offset'), name='unique_data_chunk_offset'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_nextflow', '0009_datachunk'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='data',
+            name='filetype',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_nextflow', '0010_data_filetype_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataMember',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=1000)),
+                ('size', models.BigIntegerField()),
+                ('md5', models.CharField(max_length=32)),
+                ('offset', models.BigIntegerField()),
+                ('compressed_size', models.BigIntegerField()),
+                ('method', models.IntegerField()),
+                ('data', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='django_nextflow.data')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+    ]
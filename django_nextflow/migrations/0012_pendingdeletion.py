@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:41
+
+from django.db import migrations, models
+import time
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_nextflow', '0011_datamember'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingDeletion',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('path', models.CharField(max_length=1000)),
+                ('created', models.IntegerField(default=time.time)),
+                ('next_attempt', models.FloatField(db_index=True, default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'ordering': ['next_attempt'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_nextflow', '0012_pendingdeletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='execution',
+            name='reclaimed_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='execution',
+            name='retention_applied',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pipeline',
+            name='retention_days',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pipeline',
+            name='retention_policy',
+            field=models.CharField(choices=[('all', 'Keep everything'), ('outputs', 'Keep published outputs only'), ('referenced', 'Keep outputs used by other executions only')], default='all', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_nextflow', '0013_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pipeline',
+            name='schema_json',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
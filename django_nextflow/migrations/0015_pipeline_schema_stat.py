@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_nextflow', '0014_pipeline_schema_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pipeline',
+            name='schema_stat',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+    ]
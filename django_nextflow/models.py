@@ -3,14 +3,58 @@ import re
 import time
 import json
 import shutil
+import zipfile
+import filecmp
+import threading
 import nextflow
-from django.db import models
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.db import models, transaction
 from django.conf import settings
 from django.dispatch import receiver
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, pre_delete
 from django_random_id_model import RandomIDModel, generate_random_id
+from .archives import STORED, DEFLATED, iter_member, unpack_archive, write_archive
+from .fields import CompressedTextField
 from .graphs import Graph
-from .utils import check_if_binary, get_file_extension, get_file_hash
+from .hashing import discard_upload_hasher, get_upload_hasher, start_upload_hasher
+from .logs import close_log_follower, get_log_follower, poll_log_follower, release_log_follower
+from .paging import get_line_index, open_data_file, read_last_compressed_lines
+from .schemas import get_schema_definitions, get_schema_json, get_schema_stat, get_validator, read_schema_definitions
+from .utils import (
+    allocate_file, check_bytes_if_binary, get_file_extension,
+    hash_file, import_directory, import_file, is_gzipped, iter_file_text,
+    map_file, read_file_range, read_last_lines, read_text_page,
+    write_and_hash, write_at
+)
+
+class LogDeferringQuerySet(models.QuerySet):
+    """A queryset for models with large log columns."""
+
+    def with_logs(self):
+        """Loads the log columns as part of the query, rather than lazily."""
+
+        return self.defer(None)
+
+
+
+class ExecutionQuerySet(LogDeferringQuerySet):
+    """A queryset of executions."""
+
+    def delete(self):
+        with deleting_executions(): return super().delete()
+
+
+
+class LogDeferringManager(models.Manager.from_queryset(LogDeferringQuerySet)):
+    """Leaves a model's log columns out of queries by default - they can be
+    very large, and are rarely needed when listing objects. They will be
+    fetched when accessed, or up front if with_logs() is used."""
+
+    def get_queryset(self):
+        return super().get_queryset().defer(*self.model.LOG_FIELDS)
+
+
 
 class PipelineCategory(RandomIDModel):
     """A category that pipelines can belong to."""
@@ -27,6 +71,8 @@ class PipelineCategory(RandomIDModel):
 
 
 
+_nextflow_pipelines = {}
+
 class Pipeline(RandomIDModel):
     """A Nextflow pipeline, representing some .nf file."""
 
@@ -41,30 +87,131 @@ class Pipeline(RandomIDModel):
     order = models.IntegerField(default=1)
     category = models.ForeignKey(PipelineCategory, null=True, on_delete=models.SET_NULL, related_name="pipelines")
 
+    KEEP_ALL, KEEP_OUTPUTS, KEEP_REFERENCED = "all", "outputs", "referenced"
+    RETENTION_POLICIES = [
+        (KEEP_ALL, "Keep everything"),
+        (KEEP_OUTPUTS, "Keep published outputs only"),
+        (KEEP_REFERENCED, "Keep outputs used by other executions only"),
+    ]
+    retention_policy = models.CharField(max_length=20, choices=RETENTION_POLICIES, default=KEEP_ALL)
+    retention_days = models.IntegerField(null=True, blank=True)
+    schema_json = models.TextField(default="", blank=True)
+    schema_stat = models.CharField(max_length=50, default="", blank=True)
+
     def __str__(self):
         return self.name
     
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "schema_json" in update_fields:
+            self.refresh_schema()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "schema_stat"}
+        super().save(*args, **kwargs)
+    
+
+    def delete(self, *args, **kwargs):
+        with deleting_executions(): return super().delete(*args, **kwargs)
+    
+
+    def refresh_schema(self):
+        """Stores the input definitions from the schema file in the
+        schema_json column, so that getting the input schema doesn't need to
+        read the file. This happens whenever the pipeline is saved - if the
+        schema file can't be read, the column is left empty and the file is
+        read when needed instead. The file's modification time and size are
+        stored too, so that a file changed since can be spotted."""
+
+        root = getattr(settings, "NEXTFLOW_PIPELINE_ROOT", None)
+        self.schema_json, self.schema_stat = "", ""
+        if not self.schema_path or not root: return
+        path = os.path.join(root, self.schema_path)
+        try:
+            stat = get_schema_stat(path)
+            self.schema_json = read_schema_definitions(path)
+            self.schema_stat = stat
+        except (OSError, ValueError, KeyError): pass
+    
+
+    def stored_schema_json(self):
+        """Gets the stored input definitions as a JSON string, or an empty
+        string if there are none or the schema file has changed since they
+        were stored. If the file can't be checked, the stored definitions
+        are used as they are."""
+
+        if not self.schema_json: return ""
+        root = getattr(settings, "NEXTFLOW_PIPELINE_ROOT", None)
+        if not root: return self.schema_json
+        try:
+            stat = get_schema_stat(os.path.join(root, self.schema_path))
+        except OSError: return self.schema_json
+        return self.schema_json if stat == self.schema_stat else ""
+    
+
     def create_pipeline(self):
-        """Creates a nextflow.py pipeline from the model."""
-
-        return nextflow.Pipeline(
-            path=os.path.join(settings.NEXTFLOW_PIPELINE_ROOT, self.path),
-            config=os.path.join(
-                settings.NEXTFLOW_PIPELINE_ROOT, self.config_path
-            ) if self.config_path else None,
-            schema=os.path.join(
-                settings.NEXTFLOW_PIPELINE_ROOT, self.schema_path
-            ) if self.schema_path else None,
+        """Creates a nextflow.py pipeline from the model. Each pipeline's
+        object is kept and reused for as long as its paths stay the same."""
+
+        root = settings.NEXTFLOW_PIPELINE_ROOT
+        key = (root, self.path, self.config_path, self.schema_path)
+        cached = _nextflow_pipelines.get(self.id)
+        if cached and cached[0] == key: return cached[1]
+        pipeline = nextflow.Pipeline(
+            path=os.path.join(root, self.path),
+            config=os.path.join(root, self.config_path) if self.config_path else None,
+            schema=os.path.join(root, self.schema_path) if self.schema_path else None,
         )
+        _nextflow_pipelines[self.id] = (key, pipeline)
+        return pipeline
     
 
     @property
     def input_schema(self):
         """Gets the pipeline's input requirements according to the schema
-        file."""
+        file. They come from the schema_json column if it has been filled
+        and the file hasn't changed since, and otherwise from a cache of
+        schema files which is only refreshed when a file changes."""
+
+        if not self.schema_path: return None
+        stored = self.stored_schema_json()
+        if stored: return json.loads(stored)
+        return get_schema_definitions(
+            os.path.join(settings.NEXTFLOW_PIPELINE_ROOT, self.schema_path)
+        )
+    
+
+    def get_validator(self):
+        """Gets the compiled validator for the pipeline's input schema, or
+        None if it has no schema which can be read."""
+
+        definitions = self.stored_schema_json()
+        root = getattr(settings, "NEXTFLOW_PIPELINE_ROOT", None)
+        if not definitions and self.schema_path and root:
+            try:
+                definitions = get_schema_json(os.path.join(root, self.schema_path))
+            except (OSError, ValueError, KeyError): pass
+        return get_validator(definitions) if definitions else None
+    
+
+    def validate_params(self, params=None, data_params=None, execution_params=None):
+        """Checks params against the pipeline's input schema, raising a
+        ValidationError with messages for each param which is wrong. Nothing
+        is checked if the pipeline has no readable schema."""
+
+        validator = self.get_validator()
+        if validator: validator.validate(params, data_params, execution_params)
+    
 
-        return self.create_pipeline().input_schema
+    def check_data_params(self, data_params):
+        """Raises a ValueError if any data given as a param has had its files
+        removed, so that nothing is created for an execution which can't
+        use it."""
+
+        ids = [id for value in (data_params or {}).values()
+            for id in (value if isinstance(value, list) else [value])]
+        removed = Data.objects.filter(id__in=ids, is_removed=True).first()
+        if removed: removed.check_not_removed()
     
 
     def create_params(self, params, data_params, execution_params, dir_name):
@@ -105,7 +252,8 @@ class Pipeline(RandomIDModel):
 
     def create_execution_params(self, execution_params, dir_name, params):
         """Creates a param dict for params which refer to django-nextflow
-        execution objects."""
+        execution objects. Data whose files have been removed (by a retention
+        policy, for example) is left out of the execution's directory."""
 
         execution_objects = []
         for name, value in execution_params.items():
@@ -117,13 +265,13 @@ class Pipeline(RandomIDModel):
             os.makedirs(ex_dir_name, exist_ok=True)
             for process in execution.process_executions.all():
                 os.mkdir(os.path.join(ex_dir_name, process.process_name))
-                for data in process.downstream_data.all():
+                for data in process.downstream_data.filter(is_removed=False):
                     os.symlink(data.full_path, os.path.join(
                         ex_dir_name, process.process_name, data.filename
                     ))
             data_params = json.loads(execution.data_params)
             os.mkdir(os.path.join(ex_dir_name, "inputs"))
-            for data in execution.upstream_data.all():
+            for data in execution.upstream_data.filter(is_removed=False):
                 param_names = [k for k, v in data_params.items() if str(v) == str(data.id)]
                 if param_names:
                     os.mkdir(os.path.join(ex_dir_name, "inputs", param_names[0]))
@@ -137,17 +285,22 @@ class Pipeline(RandomIDModel):
 
 
     def run(self, params=None, data_params=None, execution_params=None, profile=None, execution_id=None, post_poll=None):
-        """Run the pipeline with a set of parameters."""
+        """Run the pipeline with a set of parameters. The parameters are
+        checked against the input schema first."""
         
+        self.validate_params(params, data_params, execution_params)
+        self.check_data_params(data_params)
         pipeline = self.create_pipeline()
         id = Execution.prepare_directory(execution_id=execution_id)
         full_params, data_objects, execution_objects = self.create_params(
             params or {}, data_params or {}, execution_params or {}, str(id)
         )
-        execution = pipeline.run(
-            location=os.path.join(settings.NEXTFLOW_DATA_ROOT, str(id)),
-            params=full_params, profile=profile
-        )
+        try:
+            execution = pipeline.run(
+                location=os.path.join(settings.NEXTFLOW_DATA_ROOT, str(id)),
+                params=full_params, profile=profile
+            )
+        finally: close_log_follower(str(id))
         execution_model = Execution.create_from_object(
             execution, id, self, params, data_params, execution_params
         )
@@ -166,33 +319,38 @@ class Pipeline(RandomIDModel):
 
 
     def run_and_update(self, params=None, data_params=None, execution_params=None, profile=None, execution_id=None, post_poll=None):
+        self.validate_params(params, data_params, execution_params)
+        self.check_data_params(data_params)
         pipeline = self.create_pipeline()
         id = Execution.prepare_directory(execution_id=execution_id)
         full_params, data_objects, execution_objects = self.create_params(
             params or {}, data_params or {}, execution_params or {}, str(id)
         )
-        for execution in pipeline.run_and_poll(
-            location=os.path.join(settings.NEXTFLOW_DATA_ROOT, str(id)),
-            params=full_params, profile=profile
-        ):
-            execution_model = Execution.create_from_object(
-                execution, id, self, params, data_params, execution_params
-            )
-            for data in data_objects:
-                if not execution_model.upstream_data.filter(id=data.id):
-                    execution_model.upstream_data.add(data)
-            for ex in execution_objects:
-                if not execution_model.upstream_executions.filter(id=ex.id):
-                    execution_model.upstream_executions.add(ex)
-            for process_execution in execution.process_executions:
-                process_execution_model = ProcessExecution.create_from_object(
-                    process_execution, execution_model
+        try:
+            for execution in pipeline.run_and_poll(
+                location=os.path.join(settings.NEXTFLOW_DATA_ROOT, str(id)),
+                params=full_params, profile=profile
+            ):
+                execution_model = Execution.create_from_object(
+                    execution, id, self, params, data_params, execution_params
                 )
-                process_execution_model.create_downstream_data_objects()
-            for process_execution_model in execution_model.process_executions.all():
-                process_execution_model.create_upstream_data_objects()
-            if post_poll:
-                post_poll(execution_model)
+                for data in data_objects:
+                    if not execution_model.upstream_data.filter(id=data.id):
+                        execution_model.upstream_data.add(data)
+                for ex in execution_objects:
+                    if not execution_model.upstream_executions.filter(id=ex.id):
+                        execution_model.upstream_executions.add(ex)
+                for process_execution in execution.process_executions:
+                    process_execution_model = ProcessExecution.create_from_object(
+                        process_execution, execution_model
+                    )
+                    process_execution_model.create_downstream_data_objects()
+                for process_execution_model in execution_model.process_executions.all():
+                    process_execution_model.create_upstream_data_objects()
+                poll_log_follower(str(id))
+                if post_poll:
+                    post_poll(execution_model)
+        finally: close_log_follower(str(id))
         try:
             execution_model.remove_symlinks()
             return execution_model
@@ -205,27 +363,38 @@ class Execution(RandomIDModel):
 
     class Meta:
         ordering = ["started"]
+        base_manager_name = "objects"
+
+    LOG_FIELDS = ["stdout", "stderr", "command"]
 
     identifier = models.CharField(max_length=100)
     params = models.TextField(default="{}")
     data_params = models.TextField(default="{}")
     execution_params = models.TextField(default="{}")
-    stdout = models.TextField()
-    stderr = models.TextField()
+    stdout = CompressedTextField()
+    stderr = CompressedTextField()
     exit_code = models.IntegerField(null=True)
     status = models.CharField(max_length=20)
-    command = models.TextField()
+    command = CompressedTextField()
     started = models.FloatField(null=True)
     duration = models.FloatField(null=True)
     label = models.CharField(max_length=80, default="", blank=True)
     notes = models.TextField(default="", blank=True)
+    reclaimed_bytes = models.BigIntegerField(default=0)
+    retention_applied = models.FloatField(null=True, blank=True)
     pipeline = models.ForeignKey(Pipeline, related_name="executions", on_delete=models.CASCADE)
     upstream_executions = models.ManyToManyField("django_nextflow.Execution", related_name="downstream_executions")
 
+    objects = LogDeferringManager.from_queryset(ExecutionQuerySet)()
+
     def __str__(self):
         return self.identifier
     
 
+    def delete(self, *args, **kwargs):
+        with deleting_executions(): return super().delete(*args, **kwargs)
+    
+
     @property
     def finished(self):
         """The timestamp for when the execution stopped."""
@@ -234,18 +403,77 @@ class Execution(RandomIDModel):
             return self.started + self.duration
     
 
+    @property
+    def log_path(self):
+        """The location of the execution's nextflow log file."""
+
+        return os.path.join(
+            settings.NEXTFLOW_DATA_ROOT, str(self.id), ".nextflow.log"
+        )
+    
+
     def get_log_text(self):
         """Gets the text of the execution's nextflow log file. This requires a
         disk read, so is its own method."""
 
         try:
-            with open(os.path.join(
-                settings.NEXTFLOW_DATA_ROOT, str(self.id), ".nextflow.log"
-            )) as f:
+            with open(self.log_path) as f:
                 return f.read()
         except FileNotFoundError: return None
     
 
+    def get_log_tail(self, lines=100):
+        """Gets the last few lines of the execution's nextflow log file,
+        without reading the rest of it."""
+
+        try:
+            return read_last_lines(self.log_path, lines)
+        except FileNotFoundError: return None
+    
+
+    def get_log_range(self, offset=0, size=65536):
+        """Gets part of the execution's nextflow log file, starting at some
+        byte offset. The offset to read from next is returned too, so a log that
+        is still being written can be followed."""
+
+        try:
+            return read_file_range(self.log_path, offset, size)
+        except FileNotFoundError: return None, offset
+    
+
+    def iter_log(self, offset=0, chunk_size=65536):
+        """Iterates through the execution's nextflow log file in chunks of
+        text, so that the whole file never needs to be in memory."""
+
+        try:
+            yield from iter_file_text(self.log_path, offset, chunk_size)
+        except FileNotFoundError: return
+    
+
+    def log_follower(self):
+        """Gets the follower of the execution's nextflow log file, which is
+        shared by everything in this process watching the execution. It is
+        polled each time run_and_update polls the execution."""
+
+        return get_log_follower(str(self.id), self.log_path)
+    
+
+    def follow_log(self, interval=1):
+        """Yields lines as they are appended to the execution's nextflow log
+        file, until the execution finishes. Whatever is running the execution
+        closes the log when it finishes if it is in this process - otherwise
+        the execution's row is checked each time the log is polled, and the
+        log is closed once it has a duration or exit code."""
+
+        follower = self.log_follower()
+        finished = lambda: not Execution.objects.filter(
+            id=self.id, duration=None, exit_code=None
+        ).exists()
+        try:
+            yield from follower.follow(interval, stop=finished)
+        finally: release_log_follower(str(self.id), follower)
+    
+
     @staticmethod
     def prepare_directory(execution_id=None):
         """Generates a random 18-digit ID and creates a directory in the data
@@ -259,21 +487,29 @@ class Execution(RandomIDModel):
 
     @staticmethod
     def create_from_object(execution, id, pipeline, params=None, data_params=None, execution_params=None):
-        """Creates a Execution model object from a nextflow.py Execution."""
-
-        execution_model = Execution.objects.get_or_create(id=id, pipeline=pipeline)[0]
-        execution_model.identifier = execution.id
-        if params: execution_model.params = json.dumps(params)
-        if data_params: execution_model.data_params = json.dumps(data_params)
-        if execution_params: execution_model.execution_params = json.dumps(execution_params)
-        execution_model.stdout = execution.stdout
-        execution_model.stderr = execution.stderr
-        execution_model.status = execution.status
-        execution_model.exit_code = execution.returncode
-        execution_model.command = execution.command
-        execution_model.started = execution.started
-        execution_model.duration = execution.duration
-        execution_model.save()
+        """Creates a Execution model object from a nextflow.py Execution. If it
+        already exists, only the fields which have changed are written."""
+
+        fields = {
+            "identifier": execution.id,
+            "stdout": execution.stdout,
+            "stderr": execution.stderr,
+            "status": execution.status,
+            "exit_code": execution.returncode,
+            "command": execution.command,
+            "started": execution.started,
+            "duration": execution.duration,
+        }
+        if params: fields["params"] = json.dumps(params)
+        if data_params: fields["data_params"] = json.dumps(data_params)
+        if execution_params: fields["execution_params"] = json.dumps(execution_params)
+        execution_model, created = Execution.objects.with_logs().get_or_create(
+            id=id, pipeline=pipeline, defaults=fields
+        )
+        if not created:
+            changed = [k for k, v in fields.items() if getattr(execution_model, k) != v]
+            for field in changed: setattr(execution_model, field, fields[field])
+            if changed: execution_model.save(update_fields=changed)
         return execution_model
     
 
@@ -301,17 +537,26 @@ class ProcessExecution(RandomIDModel):
     
     class Meta:
         ordering = ["started"]
+        constraints = [models.UniqueConstraint(
+            fields=["execution", "identifier"],
+            name="unique_process_execution_identifier"
+        )]
+        base_manager_name = "objects"
+
+    LOG_FIELDS = ["stdout", "stderr"]
 
     name = models.CharField(max_length=200)
     process_name = models.CharField(max_length=200)
     identifier = models.CharField(max_length=200)
     status = models.CharField(max_length=20)
-    stdout = models.TextField()
-    stderr = models.TextField()
+    stdout = CompressedTextField()
+    stderr = CompressedTextField()
     started = models.FloatField(null=True)
     duration = models.FloatField(null=True)
     execution = models.ForeignKey(Execution, related_name="process_executions", on_delete=models.CASCADE)
 
+    objects = LogDeferringManager()
+
     def __str__(self):
         return self.name
     
@@ -319,20 +564,27 @@ class ProcessExecution(RandomIDModel):
     @staticmethod
     def create_from_object(process_execution, execution):
         """Creates a ProcessExecution model object from a nextflow.py
-        ProcessExecution."""
-
-        proc_ex = ProcessExecution.objects.get_or_create(
+        ProcessExecution. If it already exists, only the fields which have
+        changed since the last poll are written."""
+
+        fields = {
+            "name": process_execution.name,
+            "process_name": process_execution.process,
+            "status": process_execution.status,
+            "stdout": process_execution.stdout,
+            "stderr": process_execution.stderr,
+            "started": process_execution.started,
+            "duration": process_execution.duration,
+        }
+        proc_ex, created = ProcessExecution.objects.with_logs().get_or_create(
             identifier=process_execution.hash,
-            execution=execution
-        )[0]
-        proc_ex.name = process_execution.name
-        proc_ex.process_name = process_execution.process
-        proc_ex.status = process_execution.status
-        proc_ex.stdout = process_execution.stdout
-        proc_ex.stderr = process_execution.stderr
-        proc_ex.started = process_execution.started
-        proc_ex.duration = process_execution.duration
-        proc_ex.save()
+            execution=execution,
+            defaults=fields
+        )
+        if not created:
+            changed = [k for k, v in fields.items() if getattr(proc_ex, k) != v]
+            for field in changed: setattr(proc_ex, field, fields[field])
+            if changed: proc_ex.save(update_fields=changed)
         return proc_ex
     
 
@@ -411,30 +663,65 @@ class ProcessExecution(RandomIDModel):
                 run = f.read()
         except FileNotFoundError: return
         stage = re.search(r"nxf_stage\(\)((.|\n|\r)+?)}", run)
-        if stage:
-            contents = stage[1]
-            tokens = contents.split()
-            for token in tokens:
-                if settings.NEXTFLOW_UPLOADS_ROOT in token:
-                    data_id = token.split(os.path.sep)[-2]
-                    self.upstream_data.add(Data.objects.get(id=data_id))
-                elif settings.NEXTFLOW_DATA_ROOT in token:
-                    components = token.split(os.path.sep)
-                    execution_id = components[-5]
-                    identifier = "/".join(components[-3:-1])[:9]
-                    filename = components[-1]
+        if not stage: return
+        upload_ids, outputs = self.parse_stage_tokens(stage[1].split())
+        data_ids = set(Data.objects.filter(
+            id__in=upload_ids
+        ).order_by().values_list("id", flat=True)) if upload_ids else set()
+        if outputs:
+            process_executions = {
+                (str(pe.execution_id), pe.identifier): pe
+                for pe in ProcessExecution.objects.filter(
+                    execution_id__in={o[0] for o in outputs},
+                    identifier__in={o[1] for o in outputs}
+                ).order_by().select_related("execution")
+            }
+            existing = {
+                (d.upstream_process_execution_id, d.filename): d.id
+                for d in Data.objects.filter(
+                    upstream_process_execution__in=list(process_executions.values()),
+                    filename__in={o[2] for o in outputs}
+                ).order_by().only("id", "filename", "upstream_process_execution")
+            }
+            for execution_id, identifier, filename in outputs:
+                process_execution = process_executions.get((execution_id, identifier))
+                if not process_execution: continue
+                data_id = existing.get((process_execution.id, filename))
+                if not data_id:
                     try:
-                        execution = Execution.objects.get(id=execution_id)
-                        process_execution = execution.process_executions.get(identifier=identifier)
-                        upstream = process_execution.downstream_data.filter(filename=filename).first()
-                        if upstream:
-                            self.upstream_data.add(upstream)
-                        else:
-                            path = os.path.join(process_execution.work_dir, filename)
-                            self.upstream_data.add(
-                                Data.create_from_output(path, process_execution)
-                            )
-                    except: pass
+                        path = os.path.join(process_execution.work_dir, filename)
+                        data = Data.create_from_output(path, process_execution)
+                    except: continue
+                    if not data: continue
+                    data_id = existing[(process_execution.id, filename)] = data.id
+                data_ids.add(data_id)
+        through = ProcessExecution.upstream_data.through
+        through.objects.bulk_create([through(
+            data_id=data_id, processexecution_id=self.id
+        ) for data_id in data_ids], ignore_conflicts=True)
+
+
+    @staticmethod
+    def parse_stage_tokens(tokens):
+        """Takes the tokens of a .command.run staging block and works out which
+        uploads, and which process execution outputs, they refer to. Nothing is
+        looked up here - the IDs and (execution ID, identifier, filename)
+        triples are returned so that they can be resolved in bulk."""
+
+        upload_ids, outputs = [], []
+        for token in tokens:
+            if settings.NEXTFLOW_UPLOADS_ROOT in token:
+                data_id = token.split(os.path.sep)[-2]
+                if data_id.isdigit(): upload_ids.append(data_id)
+            elif settings.NEXTFLOW_DATA_ROOT in token:
+                components = token.split(os.path.sep)
+                if len(components) < 5 or not components[-5].isdigit(): continue
+                outputs.append((
+                    components[-5],
+                    "/".join(components[-3:-1])[:9],
+                    components[-1]
+                ))
+        return upload_ids, outputs
 
 
 
@@ -443,9 +730,16 @@ class Data(RandomIDModel):
 
     class Meta:
         ordering = ["filename"]
+        indexes = [
+            models.Index(
+                fields=["upstream_process_execution", "filename"],
+                name="data_output_filename_idx"
+            ),
+            models.Index(fields=["md5"], name="data_md5_idx"),
+        ]
 
     filename = models.CharField(max_length=1000)
-    filetype = models.CharField(max_length=50)
+    filetype = models.CharField(max_length=50, db_index=True)
     size = models.BigIntegerField()
     created = models.IntegerField(default=time.time)
     is_directory = models.BooleanField(default=False)
@@ -464,33 +758,148 @@ class Data(RandomIDModel):
     
 
     @staticmethod
-    def create_from_path(path):
-        """Creates a data object representing an uploaded file from a path."""
+    def create_from_path(path, mode="copy"):
+        """Creates a data object representing an uploaded file from a path.
+        By default the file is copied, and hashed as it is copied. The mode can
+        instead be 'link', 'reflink' or 'move' to hardlink, clone or move the
+        file into place without copying it, where the filesystem allows."""
 
         filename = path.split(os.path.sep)[-1]
         is_directory = os.path.isdir(path)
         data = Data.objects.create(
             filename=filename, filetype=get_file_extension(filename),
             size=os.path.getsize(path), is_directory=is_directory,
-            is_binary=not is_directory and check_if_binary(path)
         )
-        os.mkdir(os.path.join(settings.NEXTFLOW_UPLOADS_ROOT, str(data.id)))
+        members = data.import_path(path, mode)
+        data.save()
+        data.save_members(members)
+        return data
+    
+
+    @staticmethod
+    def bulk_create_from_paths(paths, mode="copy", workers=8, progress=None, saved=None, flush_size=20):
+        """Creates data objects for many files at once. A row is inserted for
+        every file up front, not yet ready, so that no file is ever in the
+        uploads root (or moved from where it was) without one. The files are
+        then imported as create_from_path would, by a pool of threads, and
+        their rows are marked ready in batches of flush_size as they finish -
+        so an interrupted import loses nothing already imported.
+
+        A file which can't be imported doesn't stop the others - its row and
+        files are deleted (unless it had already been moved, in which case its
+        row is kept, not ready, so the file isn't lost) and the data objects
+        created are returned along with a dict of the exception raised for
+        each path which failed. If a progress function is given, it is called
+        with the number of files done and the total number after each one. If
+        a saved function is given, it is called with the paths of each batch
+        of files once their rows are ready."""
+
+        paths = list(paths)
+        objects, errors, created, finished, failed = {}, {}, [], [], []
+        for path, id in zip(paths, Data.generate_ids(len(paths))):
+            filename = path.split(os.path.sep)[-1]
+            try:
+                objects[path] = Data(
+                    id=id, filename=filename, filetype=get_file_extension(filename),
+                    size=os.path.getsize(path), is_directory=os.path.isdir(path),
+                    is_ready=False
+                )
+            except OSError as e:
+                errors[path] = e
+        Data.objects.bulk_create(objects.values())
+        done = len(errors)
+        if progress:
+            for number in range(1, done + 1): progress(number, len(paths))
+
+        def flush():
+            if finished:
+                for _, data, _ in finished: data.is_ready = True
+                Data.objects.bulk_update(
+                    [data for _, data, _ in finished],
+                    ["md5", "is_binary", "filetype", "is_ready"]
+                )
+                members = [
+                    DataMember(data=data, **member)
+                    for _, data, data_members in finished for member in data_members
+                ]
+                for member, id in zip(members, Data.generate_ids(len(members), model=DataMember)):
+                    member.id = id
+                DataMember.objects.bulk_create(members)
+                created.extend(data for _, data, _ in finished)
+                if saved: saved([path for path, _, _ in finished])
+                finished.clear()
+            if failed:
+                Data.objects.filter(id__in=failed).delete()
+                failed.clear()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(data.import_path, path, mode): path
+                for path, data in objects.items()
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    finished.append((path, objects[path], future.result()))
+                except Exception as e:
+                    errors[path] = e
+                    if os.path.lexists(path):
+                        shutil.rmtree(os.path.join(
+                            settings.NEXTFLOW_UPLOADS_ROOT, str(objects[path].id)
+                        ), ignore_errors=True)
+                        failed.append(objects[path].id)
+                done += 1
+                if len(finished) + len(failed) >= flush_size: flush()
+                if progress: progress(done, len(paths))
+        flush()
+        return created, errors
+    
+
+    @staticmethod
+    def generate_ids(count, batch_size=500, model=None):
+        """Generates some number of random IDs which aren't already in use,
+        checking them in batches rather than one at a time. IDs for some other
+        model can be generated instead."""
+
+        ids = set()
+        while len(ids) < count:
+            new = {generate_random_id() for _ in range(min(count - len(ids), batch_size))}
+            new -= ids
+            ids |= new - set((model or Data).objects.filter(
+                id__in=new
+            ).values_list("id", flat=True))
+        return list(ids)
+    
+
+    def import_path(self, path, mode="copy"):
+        """Puts a file or directory into the data's uploads directory, hashing
+        it and checking whether it is binary on the way. Directories are
+        zipped, and the files within them are returned so that they can be
+        saved as members once the data is."""
+
+        os.mkdir(os.path.join(settings.NEXTFLOW_UPLOADS_ROOT, str(self.id)))
         new_path = os.path.join(
-            settings.NEXTFLOW_UPLOADS_ROOT, str(data.id), filename
+            settings.NEXTFLOW_UPLOADS_ROOT, str(self.id), self.filename
         )
-        shutil.copy(path, new_path)
-        if data.is_directory:
-            shutil.make_archive(new_path, "zip", new_path)
-            data.md5 = get_file_hash(new_path + ".zip")
+        if self.is_directory:
+            import_directory(path, new_path, mode)
+            self.md5, members = Data.archive_directory(new_path)
+            self.is_binary = False
         else:
-            data.md5 = get_file_hash(new_path)
-        data.save()
-        return data
+            self.md5, head = import_file(path, new_path, mode)
+            self.is_binary = check_bytes_if_binary(head)
+            if not self.filetype:
+                self.filetype = get_file_extension(self.filename, head)
+            members = []
+        self.deduplicate()
+        return members
     
 
     @staticmethod
     def create_from_upload(upload, is_directory=False):
-        """Creates a data object froma django UploadedFile."""
+        """Creates a data object froma django UploadedFile. The upload is
+        hashed and checked for binary content as it is written, so the file is
+        only read again if it is a zip to be unpacked."""
 
         name = upload.name
         if is_directory and upload.name.endswith(".zip"):
@@ -502,33 +911,42 @@ class Data(RandomIDModel):
         location = os.path.join(settings.NEXTFLOW_UPLOADS_ROOT, str(data.id))
         os.mkdir(location)
         new_path = os.path.join(location, upload.name)
-        with open(new_path, "wb+") as f:
-            for chunk in upload.chunks():
-                f.write(chunk)
+        data.md5, head = write_and_hash(new_path, upload.chunks())
         if data.is_directory:
-            shutil.unpack_archive(new_path, new_path[:-4], "zip")
-        data.is_binary = not data.is_directory and check_if_binary(new_path)
-        data.md5 = get_file_hash(new_path)
+            data.save_members(unpack_archive(new_path, new_path[:-4]))
+        elif not data.filetype:
+            data.filetype = get_file_extension(name, head)
+        data.is_binary = not data.is_directory and check_bytes_if_binary(head)
+        data.deduplicate()
         data.save()
         return data
     
 
     @staticmethod
     def create_from_partial_upload(blob, filename="blob", data=None, final=False, is_directory=False, filesize=None):
-        """Updates a data object from a django UploadedFile."""
+        """Updates a data object from a django UploadedFile. The file is
+        hashed as each blob is written, and whether it is binary is decided
+        from the first blob, so the final blob doesn't need to re-read the
+        file - unless this process hasn't seen every blob, in which case the
+        hash is caught up from disk."""
 
         if not data:
             filename_to_write_to, data_filename = filename, filename
             if is_directory and filename.endswith(".zip"):
                 data_filename = data_filename[:-4]
+            content = blob.read()
             data = Data.objects.create(
                 filename=data_filename, filetype=get_file_extension(data_filename),
-                size=blob.size, is_ready=False, is_directory=is_directory
+                size=blob.size, is_ready=False, is_directory=is_directory,
+                is_binary=not is_directory and check_bytes_if_binary(content)
             )
             location = os.path.join(settings.NEXTFLOW_UPLOADS_ROOT, str(data.id))
             os.mkdir(location)
             full_path = os.path.join(location, filename_to_write_to)
-            with open(full_path, "wb") as f: f.write(blob.read())
+            with open(full_path, "wb") as f: f.write(content)
+            start_upload_hasher(data.id, full_path).update(0, content)
+            if not data.filetype and not is_directory:
+                data.filetype = get_file_extension(data_filename, content)
         else:
             if filesize is not None:
                 if filesize < data.size: return data
@@ -537,18 +955,162 @@ class Data(RandomIDModel):
             if data.is_directory: filename_to_write_to += ".zip"
             location = os.path.join(settings.NEXTFLOW_UPLOADS_ROOT, str(data.id))
             full_path = os.path.join(location, filename_to_write_to)
-            with open(full_path, "ab") as f: f.write(blob.read())
+            content = blob.read()
+            with open(full_path, "ab") as f: f.write(content)
+            hasher = get_upload_hasher(data.id)
+            if hasher: hasher.update(data.size, content)
             data.size = os.path.getsize(full_path)
             data.created = time.time()
         if final:
             data.is_ready = True
             if data.is_directory:
-                shutil.unpack_archive(full_path, full_path[:-4], "zip")
-            data.is_binary = not data.is_directory and check_if_binary(full_path)
-            data.md5 = get_file_hash(full_path)
+                data.save_members(unpack_archive(full_path, full_path[:-4]))
             data.size = os.path.getsize(full_path)
+            hasher = discard_upload_hasher(data.id)
+            if hasher:
+                data.md5 = hasher.hexdigest(data.size)
+            else:
+                data.md5, head = hash_file(full_path)
+                data.is_binary = not data.is_directory and check_bytes_if_binary(head)
+            data.deduplicate()
         data.save()
         return data
+    
+
+    @staticmethod
+    def create_for_chunked_upload(filename, size, is_directory=False):
+        """Creates a data object which will be uploaded in chunks. Unlike
+        partial uploads, the chunks can arrive in any order and in parallel -
+        the file is allocated at its full size up front, and each chunk is
+        written at its own offset with write_chunk."""
+
+        data_filename = filename
+        if is_directory and filename.endswith(".zip"):
+            data_filename = data_filename[:-4]
+        data = Data.objects.create(
+            filename=data_filename, filetype=get_file_extension(data_filename),
+            size=size, is_ready=False, is_directory=is_directory,
+            is_binary=not is_directory
+        )
+        os.mkdir(os.path.join(settings.NEXTFLOW_UPLOADS_ROOT, str(data.id)))
+        allocate_file(data.upload_path, size)
+        start_upload_hasher(data.id, data.upload_path)
+        if not size: data.finalise_chunked_upload()
+        return data
+    
+
+    @property
+    def upload_path(self):
+        """Gets the path an uploaded file is written to - for directories, this
+        is the zip file they are uploaded as."""
+
+        return os.path.join(
+            settings.NEXTFLOW_UPLOADS_ROOT, str(self.id),
+            self.filename + (".zip" if self.is_directory else "")
+        )
+    
+
+    def write_chunk(self, blob, offset):
+        """Writes a chunk of a chunked upload, from a django UploadedFile, at
+        some byte offset. Chunks can be sent again if they were interrupted.
+        The first chunk decides whether the data is binary, and chunks are
+        hashed as they arrive where possible. Once every byte has been received
+        the upload is finalised."""
+
+        if self.is_ready: raise ValueError("Data is already complete")
+        if offset < 0 or offset + blob.size > self.size:
+            raise ValueError("Chunk is outside of file")
+        hasher = get_upload_hasher(self.id)
+        chunks = blob.chunks()
+        if hasher: chunks = hasher.hash_chunks(offset, chunks)
+        size = write_at(self.upload_path, offset, chunks)
+        start, end = self.record_chunk(offset, size)
+        if offset == 0 and not self.is_directory:
+            blob.seek(0)
+            head = blob.read(4096)
+            self.is_binary = check_bytes_if_binary(head)
+            self.filetype = self.filetype or get_file_extension(self.filename, head)
+            Data.objects.filter(id=self.id).update(
+                is_binary=self.is_binary, filetype=self.filetype
+            )
+        if hasher and start == 0: hasher.catch_up(end)
+        if (start, end) == (0, self.size): self.finalise_chunked_upload()
+        return self
+    
+
+    def record_chunk(self, offset, size):
+        """Records that some bytes of a chunked upload have been written. They
+        are merged with any received ranges they overlap or touch, so that
+        each contiguous range is one row however many chunks it took, and the
+        (start, end) of the merged range is returned. The data's row is locked
+        while this happens, so that chunks written at once are all kept."""
+
+        start, end = offset, offset + size
+        with transaction.atomic():
+            Data.objects.select_for_update().only("id").get(id=self.id)
+            touching = list(self.chunks.filter(offset__lte=end).annotate(
+                end=models.F("offset") + models.F("size")
+            ).filter(end__gte=start))
+            for chunk in touching:
+                start, end = min(start, chunk.offset), max(end, chunk.end)
+            DataChunk.objects.filter(id__in=[c.id for c in touching]).delete()
+            DataChunk.objects.create(data=self, offset=start, size=end - start)
+        return start, end
+    
+
+    def received_ranges(self):
+        """Gets the (start, end) byte ranges of a chunked upload which have
+        been received so far. Chunks are merged as they are recorded, so this
+        is only a matter of reading them (and merging any which weren't)."""
+
+        ranges = []
+        chunks = self.chunks.order_by("offset").values_list("offset", "size")
+        for offset, size in chunks:
+            if ranges and offset <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], offset + size)
+            else: ranges.append([offset, offset + size])
+        return [tuple(r) for r in ranges]
+    
+
+    def missing_ranges(self):
+        """Gets the (start, end) byte ranges of a chunked upload which still
+        need to be sent, so that an interrupted upload can be resumed."""
+
+        missing, position = [], 0
+        for start, end in self.received_ranges():
+            if start > position: missing.append((position, start))
+            position = max(position, end)
+        if position < self.size: missing.append((position, self.size))
+        return missing
+    
+
+    def finalise_chunked_upload(self):
+        """Marks a chunked upload as ready once all its chunks are written.
+        Several writers may finish at once, so the data is only claimed by
+        whichever one updates it first, and only that one unpacks directories.
+        Returns whether this call was the one which finalised it."""
+
+        path = self.upload_path
+        hasher = get_upload_hasher(self.id)
+        if hasher:
+            fields = {"md5": hasher.hexdigest(self.size)}
+        else:
+            md5, head = hash_file(path)
+            fields = {
+                "md5": md5,
+                "is_binary": not self.is_directory and check_bytes_if_binary(head)
+            }
+        claimed = Data.objects.filter(id=self.id, is_ready=False).update(
+            is_ready=True, created=time.time(), **fields
+        )
+        if claimed:
+            if self.is_directory:
+                self.save_members(unpack_archive(path, path[:-4]))
+            self.chunks.all().delete()
+            discard_upload_hasher(self.id)
+        self.refresh_from_db()
+        if claimed: self.deduplicate()
+        return bool(claimed)
 
 
     @staticmethod
@@ -557,25 +1119,114 @@ class Data(RandomIDModel):
         creates a Data object from it."""
 
         filename = path.split(os.path.sep)[-1]
-        if process_execution.downstream_data.filter(filename=filename): return
+        if process_execution.downstream_data.filter(filename=filename).exists(): return
         is_directory = os.path.isdir(path)
-        if is_directory: shutil.make_archive(path, "zip", path)
+        filetype = get_file_extension(filename)
+        members = []
+        if is_directory:
+            (md5, members), is_binary = Data.archive_directory(path), False
+        else:
+            md5, head = hash_file(path)
+            is_binary = check_bytes_if_binary(head)
+            filetype = filetype or get_file_extension(filename, head)
         data = Data.objects.create(
             filename=filename,
             is_directory=is_directory,
-            filetype=get_file_extension(filename),
+            filetype=filetype,
             size=os.path.getsize(path + ".zip" if is_directory else path),
             upstream_process_execution=process_execution,
-            is_binary=not is_directory and check_if_binary(path)
+            is_binary=is_binary, md5=md5
         )
-        if is_directory:
-            data.md5 = get_file_hash(path + ".zip")
-        else:
-            data.md5 = get_file_hash(path)
-        data.save()
+        data.save_members(members)
         return data
+    
+
+    @staticmethod
+    def archive_directory(path):
+        """Zips a directory to a zip file alongside it, compressing its files
+        with NEXTFLOW_ARCHIVE_WORKERS threads (by default, one per CPU). The
+        zip's MD5 and the files within it are returned."""
+
+        return write_archive(
+            path, path + ".zip",
+            workers=getattr(settings, "NEXTFLOW_ARCHIVE_WORKERS", None),
+            compresslevel=getattr(settings, "NEXTFLOW_ARCHIVE_COMPRESSION", 6)
+        )
+    
+
+    def save_members(self, members):
+        """Saves the files within a directory's zip as members of the data,
+        all in one query."""
+
+        if not members: return
+        DataMember.objects.bulk_create([
+            DataMember(id=id, data=self, **member) for id, member in zip(
+                Data.generate_ids(len(members), model=DataMember), members
+            )
+        ])
+    
+
+    def member(self, name):
+        """Gets a file within a directory's zip by its path, or None if there
+        is no such file."""
+
+        return self.members.filter(name=name).first()
+
+    
+    @property
+    def blob_path(self):
+        """Gets the path in the blob store that an upload's file can be shared
+        from, if NEXTFLOW_BLOB_ROOT is set. Blobs are named by their MD5."""
+
+        root = getattr(settings, "NEXTFLOW_BLOB_ROOT", None)
+        if not root or not self.md5 or self.upstream_process_execution_id:
+            return None
+        return os.path.join(root, self.md5[:2], self.md5)
+    
+
+    def deduplicate(self):
+        """Shares an upload's file with any identical uploads, using the blob
+        store. The first upload with some content is hardlinked into the
+        store, and later ones are replaced with hardlinks to that blob. If the
+        upload's file is already linked elsewhere - as it is when imported
+        with mode='link' - whatever else links to it could change it, so the
+        store gets its own copy instead. Files are compared byte for byte
+        before being replaced, so MD5 collisions can't swap one file for
+        another. Returns whether the file is now shared with an existing
+        blob."""
+
+        blob_path = self.blob_path
+        if not blob_path: return False
+        path = self.upload_path
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            if os.stat(path).st_nlink > 1:
+                temp_path = f"{blob_path}.{self.id}"
+                shutil.copyfile(path, temp_path)
+                try:
+                    os.link(temp_path, blob_path)
+                finally: os.remove(temp_path)
+            else: os.link(path, blob_path)
+            return False
+        except FileExistsError: pass
+        except OSError: return False
+        try:
+            if os.path.samefile(path, blob_path): return True
+            if not filecmp.cmp(path, blob_path, shallow=False): return False
+            os.link(blob_path, path + ".blob")
+            os.replace(path + ".blob", path)
+            return True
+        except OSError: return False
+    
+
+    def check_not_removed(self):
+        """Raises a ValueError if the data's files have been removed, so that
+        it can't be used as an input."""
 
+        if self.is_removed:
+            raise ValueError(f"Data {self.id} ({self.filename}) has been removed")
     
+
     @property
     def full_path(self):
         """Gets the data's full path on the filesystem."""
@@ -625,15 +1276,64 @@ class Data(RandomIDModel):
         return Data.objects.filter(id__in=data_ids)
     
 
+    @property
+    def is_text(self):
+        """Whether the data is a plain text file which is ready to be read."""
+
+        return not (self.is_directory or self.is_binary or not self.is_ready)
+    
+
     def contents(self, position=0, size=1024):
-        """For plain text files, gets a portion of the text within."""
+        """For plain text files, gets a portion of the text within. The file is
+        split into pages of some number of bytes, and the text of the page at
+        the given position is returned. Gzipped text is decompressed as it is
+        read, and the pages are of the decompressed text."""
+
+        if not self.is_text: return None
+        return read_text_page(
+            self.full_path, position * size, size, opener=open_data_file
+        )
+    
 
-        if self.is_directory or self.is_binary or not self.is_ready:
-            return None
-        position *= size
-        with open(self.full_path) as f:
-            f.seek(position)
-            return f.read(size)
+    def memory_map(self):
+        """Gets a context manager which memory-maps the data's file and yields
+        a read-only memoryview of its bytes, for random access to large files
+        without reading them. Directories map their zip file. Data which is
+        still being uploaded, or whose files have been removed, can't be mapped
+        and raises a ValueError."""
+
+        if not self.is_ready: raise ValueError("Data is not ready to be read")
+        if self.is_removed: raise ValueError("Data has been removed")
+        path = self.full_path + (".zip" if self.is_directory else "")
+        return map_file(path)
+    
+
+    def lines(self, start=0, count=100):
+        """For plain text files, gets some number of lines starting at a
+        zero-indexed line number. The file's lines are indexed the first time
+        this is used, so that jumping to any line is cheap - for gzipped files
+        this means decompressing the whole file once."""
+
+        if not self.is_text: return None
+        return get_line_index(self.full_path).read_lines(start, count)
+    
+
+    def line_count(self):
+        """For plain text files, gets the number of lines in the file."""
+
+        if not self.is_text: return None
+        return get_line_index(self.full_path).line_count
+    
+
+    def tail(self, count=100):
+        """For plain text files, gets the last few lines, reading backwards
+        from the end of the file. Bgzipped files are read backwards a block
+        at a time, but other gzipped files have to be decompressed in full."""
+
+        if not self.is_text: return None
+        if is_gzipped(self.full_path):
+            return read_last_compressed_lines(self.full_path, count)
+        return read_last_lines(self.full_path, count).splitlines()
     
 
     def remove(self):
@@ -646,17 +1346,184 @@ class Data(RandomIDModel):
         self.save()
 
 
+class DataChunk(RandomIDModel):
+    """A contiguous range of a chunked upload which has been written to disk,
+    made up of one or more chunks."""
+
+    class Meta:
+        ordering = ["offset"]
+        constraints = [models.UniqueConstraint(
+            fields=["data", "offset"], name="unique_data_chunk_offset"
+        )]
+
+    data = models.ForeignKey(Data, related_name="chunks", on_delete=models.CASCADE)
+    offset = models.BigIntegerField()
+    size = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.data} ({self.offset}-{self.offset + self.size})"
+
+
+
+class DataMember(RandomIDModel):
+    """A file within the zip of a directory data object. Its size and MD5
+    are recorded, along with where its bytes are within the zip, so that it
+    can be read without unpacking or even opening the zip as a whole."""
+
+    class Meta:
+        ordering = ["name"]
+
+    data = models.ForeignKey(Data, related_name="members", on_delete=models.CASCADE)
+    name = models.CharField(max_length=1000)
+    size = models.BigIntegerField()
+    md5 = models.CharField(max_length=32)
+    offset = models.BigIntegerField()
+    compressed_size = models.BigIntegerField()
+    method = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.data}/{self.name}"
+    
+
+    @property
+    def filename(self):
+        """Gets the member's name without the directories it is in."""
+
+        return self.name.split("/")[-1]
+    
+
+    def iter_content(self, chunk_size=1048576):
+        """Yields the member's contents in chunks, decompressing as it goes
+        if it was compressed. Members compressed with something other than
+        deflate (possible in uploaded zips) are read through zipfile."""
+
+        path = self.data.full_path + ".zip"
+        if self.method in (STORED, DEFLATED):
+            return iter_member(
+                path, self.offset, self.compressed_size, self.method, chunk_size
+            )
+        return read_zip_member(path, self.name, chunk_size)
+    
+
+    def read(self):
+        """Gets the member's full contents."""
+
+        return b"".join(self.iter_content())
+
+
+
+def read_zip_member(path, name, chunk_size):
+    """Yields the contents of a file within a zip using zipfile."""
+
+    with zipfile.ZipFile(path) as archive, archive.open(name) as f:
+        yield from iter(lambda: f.read(chunk_size), b"")
+
+
+
+class PendingDeletion(RandomIDModel):
+    """A file or directory which is no longer needed and is waiting to be
+    deleted. Deleting large directories can take minutes, so deleting objects
+    only records what needs removing, and the collect_garbage command does
+    the removing later. Failed removals are retried, waiting longer after
+    each failure."""
+
+    class Meta:
+        ordering = ["next_attempt"]
+
+    path = models.CharField(max_length=1000)
+    created = models.IntegerField(default=time.time)
+    next_attempt = models.FloatField(default=0, db_index=True)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(default="", blank=True)
+
+    def __str__(self):
+        return self.path
+    
+
+    @staticmethod
+    def enqueue(*paths):
+        """Queues some paths for deletion, in one query."""
+
+        PendingDeletion.objects.bulk_create([
+            PendingDeletion(id=id, path=path) for id, path in zip(
+                Data.generate_ids(len(paths), model=PendingDeletion), paths
+            )
+        ])
+
+
+
+_deleting = threading.local()
+
+@contextmanager
+def deleting_executions():
+    """Marks that executions are being deleted in this thread. While the mark
+    is there, the process executions of each execution deleted are noted, so
+    that their data's files aren't queued one by one. The mark is always taken
+    away afterwards - even if the deletion fails - so the data of executions
+    which weren't deleted after all doesn't go unqueued later."""
+
+    if getattr(_deleting, "process_executions", None) is not None:
+        yield
+        return
+    _deleting.process_executions = set()
+    try:
+        yield
+    finally: _deleting.process_executions = None
+
+
+@receiver(pre_delete, sender=Execution)
+def execution_pre_delete(sender, **kwargs):
+    """Notes the process executions of an execution about to be deleted -
+    the files of their data will be deleted along with the execution's
+    directory, so they don't need queueing one by one. This only happens
+    within deleting_executions - otherwise their files are queued as any
+    other data's are."""
+
+    process_executions = getattr(_deleting, "process_executions", None)
+    if process_executions is None: return
+    process_executions.update(
+        kwargs["instance"].process_executions.values_list("id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Execution)
+def execution_post_delete(sender, **kwargs):
+    """Queues a deleted execution's directory for deletion."""
+
+    execution = kwargs["instance"]
+    PendingDeletion.enqueue(
+        os.path.join(settings.NEXTFLOW_DATA_ROOT, str(execution.id))
+    )
+
+
 @receiver(post_delete, sender=Data)
 def data_post_delete(sender, **kwargs):
-    """Delete the files on disk if data is deleted for real."""
+    """Queue the files on disk for deletion if data is deleted for real."""
 
     data = kwargs["instance"]
+    release_blob(data)
+    discard_upload_hasher(data.id)
+    if not data.upstream_process_execution_id:
+        PendingDeletion.enqueue(
+            os.path.join(settings.NEXTFLOW_UPLOADS_ROOT, str(data.id))
+        )
+    elif data.upstream_process_execution_id not in (
+        getattr(_deleting, "process_executions", None) or ()
+    ):
+        try:
+            path = data.full_path
+        except (ProcessExecution.DoesNotExist, FileNotFoundError, IndexError):
+            return
+        PendingDeletion.enqueue(path, *([path + ".zip"] if data.is_directory else []))
+
+
+def release_blob(data):
+    """Deletes a deleted upload's blob, if no other uploads still share it."""
+
+    blob_path = data.blob_path
+    if not blob_path: return
+    if Data.objects.filter(md5=data.md5, upstream_process_execution=None).exists():
+        return
     try:
-        if not data.upstream_process_execution:
-            shutil.rmtree(os.path.join(settings.NEXTFLOW_UPLOADS_ROOT, str(data.id)))
-        else:
-            shutil.rmtree(kwargs["instance"].full_path)
-            if data.is_directory:
-                shutil.rmtree(kwargs["instance"].full_path + ".zip")
+        os.remove(blob_path)
     except FileNotFoundError: pass
-    except ProcessExecution.DoesNotExist: pass
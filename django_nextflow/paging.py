@@ -0,0 +1,232 @@
+import io
+import os
+import gzip
+import struct
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from .utils import GZIP_MAGIC, is_bgzf
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+MAX_CACHED_INDEXES = 128
+
+class LineIndex:
+    """A sparse index of where the lines of a text file start. The byte offset
+    of every nth line is recorded, so reading from any line only means seeking
+    to the nearest recorded line and reading forward from there."""
+
+    def __init__(self, path, step=1000, chunk_size=1048576):
+        self.path = path
+        self.step = step
+        self.offsets = [0]
+        self.line_count = 0
+        self.build(chunk_size)
+
+
+    def __repr__(self):
+        return f"<LineIndex ({self.line_count} line{'' if self.line_count == 1 else 's'})>"
+
+
+    def build(self, chunk_size):
+        """Reads through the file once, counting lines and recording the
+        offset of every nth one."""
+
+        lines, position, next_mark, last = 0, 0, self.step, b""
+        with open_data_file(self.path) as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                count = chunk.count(b"\n")
+                if lines + count >= next_mark:
+                    start = 0
+                    while lines + count >= next_mark:
+                        for _ in range(next_mark - lines):
+                            start = chunk.find(b"\n", start) + 1
+                        count -= next_mark - lines
+                        lines = next_mark
+                        self.offsets.append(position + start)
+                        next_mark += self.step
+                lines += count
+                position += len(chunk)
+                last = chunk[-1:]
+        self.line_count = lines + (1 if last and last != b"\n" else 0)
+
+
+    def read_lines(self, start, count):
+        """Gets some number of lines, starting at a zero-indexed line number.
+        Line endings are removed."""
+
+        count = min(count, self.line_count - start)
+        if start < 0 or count <= 0: return []
+        with open_data_file(self.path) as f:
+            f.seek(self.offsets[start // self.step])
+            for _ in range(start % self.step): f.readline()
+            lines = [f.readline() for _ in range(count)]
+        return [line.rstrip(b"\r\n").decode(errors="replace") for line in lines]
+
+
+
+class BlockIndex:
+    """An index of the blocks of a bgzipped file. Each block is a complete
+    gzip member of at most 64KB, and its header gives its compressed size, so
+    the whole file can be indexed by reading only the headers and footers."""
+
+    def __init__(self, path):
+        self.path = path
+        self.blocks = []
+        self.starts = []
+        self.size = 0
+        self.build()
+
+
+    def __repr__(self):
+        return f"<BlockIndex ({len(self.blocks)} block{'' if len(self.blocks) == 1 else 's'})>"
+
+
+    def build(self):
+        """Records the compressed offset and length, and the uncompressed
+        offset, of every non-empty block."""
+
+        position = 0
+        with open(self.path, "rb") as f:
+            while True:
+                f.seek(position)
+                header = f.read(18)
+                if len(header) < 18: break
+                length = struct.unpack("<H", header[16:18])[0] + 1
+                f.seek(position + length - 4)
+                block_size = struct.unpack("<I", f.read(4))[0]
+                if block_size:
+                    self.blocks.append((position, length))
+                    self.starts.append(self.size)
+                    self.size += block_size
+                position += length
+
+
+
+class BgzfReader(io.RawIOBase):
+    """A seekable reader of the uncompressed contents of a bgzipped file.
+    Seeking only means looking up a block in the index, and reading only
+    decompresses the blocks actually read."""
+
+    def __init__(self, path, index):
+        super().__init__()
+        self.file = open(path, "rb")
+        self.index = index
+        self.position = 0
+        self.block = None
+        self.data = b""
+
+
+    def readable(self):
+        return True
+
+
+    def seekable(self):
+        return True
+
+
+    def tell(self):
+        return self.position
+
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR: offset += self.position
+        if whence == io.SEEK_END: offset += self.index.size
+        self.position = max(offset, 0)
+        return self.position
+
+
+    def readinto(self, buffer):
+        number = bisect_right(self.index.starts, self.position) - 1
+        if number < 0 or self.position >= self.index.size: return 0
+        if number != self.block:
+            offset, length = self.index.blocks[number]
+            self.file.seek(offset)
+            self.data = gzip.decompress(self.file.read(length))
+            self.block = number
+        start = self.position - self.index.starts[number]
+        chunk = self.data[start:start + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self.position += len(chunk)
+        return len(chunk)
+
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+
+def open_data_file(path):
+    """Opens a file for reading bytes. Gzipped files are decompressed as they
+    are read, without decompressing the whole file. Bgzipped files are read
+    through their block index, so seeking anywhere in them is cheap - seeking
+    forward in other gzipped files means decompressing up to that point."""
+
+    with open(path, "rb") as f:
+        header = f.read(18)
+    if is_bgzf(header):
+        return io.BufferedReader(BgzfReader(path, get_block_index(path)))
+    if header[:2] == GZIP_MAGIC: return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_last_compressed_lines(path, count, chunk_size=1048576):
+    """Gets the last few lines of a gzipped file. Bgzipped files are read
+    backwards a block at a time through their block index, so only the
+    blocks holding those lines are decompressed. Other gzipped files can't be
+    read from the end, so the whole file is decompressed once - but only the
+    last lines are held in memory."""
+
+    if count <= 0: return []
+    with open(path, "rb") as f:
+        header = f.read(18)
+    if is_bgzf(header):
+        data = b""
+        with open(path, "rb") as f:
+            for offset, length in reversed(get_block_index(path).blocks):
+                f.seek(offset)
+                data = gzip.decompress(f.read(length)) + data
+                if data.count(b"\n") > count: break
+        lines = data.split(b"\n")
+        if lines[-1] == b"": lines.pop()
+        lines = lines[-count:]
+    else:
+        lines, partial = deque(maxlen=count), b""
+        with gzip.open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                *complete, partial = (partial + chunk).split(b"\n")
+                lines.extend(complete)
+        if partial: lines.append(partial)
+    return [line.rstrip(b"\r").decode(errors="replace") for line in lines]
+
+
+def get_index(cls, path):
+    """Gets some kind of index for a file. Indexes are built the first time
+    they are needed and cached, and are rebuilt if the file changes."""
+
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _indexes_lock:
+        cached = _indexes.get((cls, path))
+        if cached and cached[0] == key:
+            _indexes.move_to_end((cls, path))
+            return cached[1]
+    index = cls(path)
+    with _indexes_lock:
+        _indexes[(cls, path)] = (key, index)
+        _indexes.move_to_end((cls, path))
+        while len(_indexes) > MAX_CACHED_INDEXES: _indexes.popitem(last=False)
+    return index
+
+
+def get_line_index(path):
+    """Gets the cached line index for a file."""
+
+    return get_index(LineIndex, path)
+
+
+def get_block_index(path):
+    """Gets the cached block index for a bgzipped file."""
+
+    return get_index(BlockIndex, path)
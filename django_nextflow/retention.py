@@ -0,0 +1,133 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db.models import F
+from .cleanup import remove_path
+from .models import Data, Execution, Pipeline
+
+def path_size(path):
+    """Gets the bytes used by a file or directory tree. Symlinks are counted
+    as themselves, not as what they point to."""
+
+    try:
+        stat = os.lstat(path)
+    except FileNotFoundError: return 0
+    if not os.path.isdir(path) or os.path.islink(path): return stat.st_size
+    size = stat.st_size
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError: pass
+    return size
+
+
+def protected_data_ids(execution):
+    """Gets the IDs of an execution's data which other executions use as
+    inputs, and so must be kept whatever the policy. If the execution as a
+    whole is an input to another execution, all of its data is kept."""
+
+    outputs = Data.objects.filter(upstream_process_execution__execution=execution)
+    if execution.downstream_executions.exists():
+        return set(outputs.values_list("id", flat=True))
+    ids = set(Data.downstream_executions.through.objects.filter(
+        data__upstream_process_execution__execution=execution
+    ).exclude(execution=execution).values_list("data_id", flat=True))
+    ids.update(Data.downstream_process_executions.through.objects.filter(
+        data__upstream_process_execution__execution=execution
+    ).exclude(processexecution__execution=execution).values_list("data_id", flat=True))
+    return ids
+
+
+def plan_retention(execution, policy):
+    """Works out which paths in an execution's work directory a policy
+    would delete, and which data objects would lose their files. Everything
+    outside the work directory is kept, as are the files of kept data and the
+    small .command files Nextflow leaves in each task directory. Task
+    directories with nothing to keep are deleted whole."""
+
+    work = os.path.join(settings.NEXTFLOW_DATA_ROOT, str(execution.id), "work")
+    if policy == Pipeline.KEEP_ALL or not os.path.isdir(work): return [], []
+    protected = protected_data_ids(execution) if policy != Pipeline.KEEP_OUTPUTS else set()
+    listings, keep, removed = {}, set(), []
+    outputs = Data.objects.filter(
+        upstream_process_execution__execution=execution, is_removed=False
+    ).select_related("upstream_process_execution").only(
+        "id", "filename", "is_directory", "upstream_process_execution__identifier"
+    )
+    for data in outputs:
+        if policy != Pipeline.KEEP_OUTPUTS and data.id not in protected:
+            removed.append(data)
+            continue
+        prefix, name = data.upstream_process_execution.identifier.split("/")
+        if prefix not in listings:
+            try:
+                listings[prefix] = os.listdir(os.path.join(work, prefix))
+            except FileNotFoundError: listings[prefix] = []
+        for task in listings[prefix]:
+            if task.startswith(name):
+                path = os.path.join(work, prefix, task, data.filename)
+                keep.update({path, path + ".zip"})
+    kept_tasks = defaultdict(set)
+    for path in keep: kept_tasks[os.path.dirname(path)].add(path)
+    paths = []
+    for prefix in sorted(os.listdir(work)):
+        prefix_path = os.path.join(work, prefix)
+        if not os.path.isdir(prefix_path) or os.path.islink(prefix_path):
+            paths.append(prefix_path)
+            continue
+        for task in sorted(os.scandir(prefix_path), key=lambda e: e.name):
+            if task.path not in kept_tasks:
+                paths.append(task.path)
+                continue
+            paths += sorted(
+                entry.path for entry in os.scandir(task.path)
+                if entry.path not in kept_tasks[task.path]
+                and not entry.name.startswith(".")
+            )
+    return paths, removed
+
+
+def apply_retention(execution, policy, workers=4, dry_run=False):
+    """Applies a retention policy to a finished execution, deleting paths
+    with a bounded pool of threads and measuring each before it goes. Data
+    whose files were deleted is marked as removed, and the bytes reclaimed
+    are added to the execution's total. Returns the bytes reclaimed (or
+    which would be, for a dry run)."""
+
+    paths, removed = plan_retention(execution, policy)
+
+    def reclaim(path):
+        size = path_size(path)
+        if not dry_run: remove_path(path)
+        return size
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        reclaimed = sum(executor.map(reclaim, paths))
+    if not dry_run:
+        Data.objects.filter(id__in=[d.id for d in removed]).update(is_removed=True)
+        execution.reclaimed_bytes += reclaimed
+        execution.retention_applied = time.time()
+        Execution.objects.filter(id=execution.id).update(
+            reclaimed_bytes=execution.reclaimed_bytes,
+            retention_applied=execution.retention_applied
+        )
+    return reclaimed
+
+
+def executions_due(pipeline, now=None):
+    """Gets a pipeline's finished executions whose retention policy is due
+    and hasn't been applied yet."""
+
+    now = now or time.time()
+    executions = Execution.objects.filter(
+        pipeline=pipeline, retention_applied=None,
+        started__isnull=False, duration__isnull=False
+    )
+    if pipeline.retention_days:
+        executions = executions.filter(
+            started__lt=now - pipeline.retention_days * 86400 - F("duration")
+        )
+    return executions
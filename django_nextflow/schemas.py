@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import operator
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from django.core.exceptions import ValidationError
+
+_schemas = OrderedDict()
+_schemas_lock = threading.Lock()
+MAX_CACHED_SCHEMAS = 256
+
+def read_schema_definitions(path):
+    """Reads the input definitions of an nf-core style JSON schema file, as
+    a JSON string."""
+
+    with open(path) as f:
+        return json.dumps(json.load(f)["definitions"])
+
+
+def get_schema_stat(path):
+    """Gets a string of a schema file's modification time and size, which
+    changes whenever the file does."""
+
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def get_schema_json(path):
+    """Gets the input definitions of a schema file as a JSON string. The
+    file is only parsed the first time it is needed, and again if it
+    changes - its modification time and size are checked on each call."""
+
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _schemas_lock:
+        cached = _schemas.get(path)
+        if cached and cached[0] == key:
+            _schemas.move_to_end(path)
+            return cached[1]
+    definitions = read_schema_definitions(path)
+    with _schemas_lock:
+        _schemas[path] = (key, definitions)
+        _schemas.move_to_end(path)
+        while len(_schemas) > MAX_CACHED_SCHEMAS: _schemas.popitem(last=False)
+    return definitions
+
+
+def get_schema_definitions(path):
+    """Gets the input definitions of a schema file. They are cached as JSON
+    so that each caller gets its own copy to modify."""
+
+    return json.loads(get_schema_json(path))
+
+
+
+class SchemaValidator:
+    """Checks the params of an execution against the input definitions of an
+    nf-core style schema. The definitions are compiled once into a list of
+    checks for each param - with patterns compiled and enums made into sets -
+    so that validating params is just a matter of running them.
+
+    Params are passed to Nextflow on the command line, so values can be
+    given as strings - '5' is a valid integer and 'true' a valid boolean.
+    Data and execution params are given as IDs, and are only allowed for
+    params which take a path. Required params with a default can be left
+    out, as Nextflow will use the default."""
+
+    def __init__(self, definitions):
+        self.required = []
+        self.checks = {}
+        self.path_params = set()
+        defaults = set()
+        for group in definitions.values():
+            for name in group.get("required", []):
+                if name not in self.required: self.required.append(name)
+            for name, schema in group.get("properties", {}).items():
+                self.checks[name] = compile_checks(schema)
+                if "default" in schema: defaults.add(name)
+                if schema.get("type", "string") == "string":
+                    self.path_params.add(name)
+        self.required = [name for name in self.required if name not in defaults]
+
+
+    def __repr__(self):
+        return f"<SchemaValidator ({len(self.checks)} param{'' if len(self.checks) == 1 else 's'})>"
+
+
+    def validate(self, params=None, data_params=None, execution_params=None):
+        """Checks some params, raising a ValidationError with a list of
+        messages for each param which is wrong."""
+
+        params, errors = params or {}, {}
+        id_params = {**(data_params or {}), **(execution_params or {})}
+        for name in self.required:
+            if name not in params and name not in id_params:
+                errors[name] = ["This param is required."]
+        for name, value in params.items():
+            messages = [message for message in (
+                check(value) for check in self.checks.get(name, [])
+            ) if message]
+            if messages: errors[name] = messages
+        for name, value in id_params.items():
+            if name in self.checks and name not in self.path_params:
+                errors[name] = ["This param doesn't take files."]
+            elif not all(is_id(v) for v in (value if isinstance(value, list) else [value])):
+                errors[name] = ["Expected an object ID or list of IDs."]
+        if errors: raise ValidationError(errors)
+
+
+
+def to_integer(value):
+    """Converts a param value to an integer if it is one."""
+
+    if isinstance(value, bool): raise ValueError
+    if isinstance(value, float) and not value.is_integer(): raise ValueError
+    return int(value)
+
+
+def to_number(value):
+    """Converts a param value to a number if it is one."""
+
+    if isinstance(value, bool): raise ValueError
+    return float(value)
+
+
+def to_boolean(value):
+    """Converts a param value to a boolean if it is one."""
+
+    if isinstance(value, bool): return value
+    if str(value).lower() in ("true", "false"): return str(value).lower() == "true"
+    raise ValueError
+
+
+CONVERTERS = {
+    "integer": (to_integer, "Expected an integer."),
+    "number": (to_number, "Expected a number."),
+    "boolean": (to_boolean, "Expected true or false."),
+}
+
+def compile_checks(schema):
+    """Turns the schema of one param into a list of functions which each
+    take a value and return an error message if it is wrong."""
+
+    checks = []
+    converter, message = CONVERTERS.get(schema.get("type"), (None, None))
+
+    def convert(value):
+        try:
+            return converter(value) if converter else value
+        except (TypeError, ValueError): return None
+
+    if converter:
+        checks.append(lambda value: message if convert(value) is None else None)
+    if "enum" in schema:
+        allowed = {str(option) for option in schema["enum"]}
+        options = ", ".join(str(option) for option in schema["enum"])
+        checks.append(lambda value: None if str(value) in allowed or
+            str(convert(value)) in allowed else f"Must be one of: {options}.")
+    if "pattern" in schema:
+        pattern = re.compile(schema["pattern"])
+        checks.append(lambda value: None if pattern.search(str(value)) else
+            f"Must match the pattern {schema['pattern']}.")
+    for key, compare, word in (
+        ("minimum", operator.ge, "least"), ("maximum", operator.le, "most")
+    ):
+        if key in schema:
+            checks.append(lambda value, limit=schema[key], compare=compare, word=word:
+                None if not isinstance(convert(value), (int, float))
+                or compare(convert(value), limit) else f"Must be at {word} {limit}.")
+    return checks
+
+
+def is_id(value):
+    """Checks whether a value is an object ID, or a string of one."""
+
+    return not isinstance(value, bool) and (
+        isinstance(value, int) or (isinstance(value, str) and value.isdigit())
+    )
+
+
+@lru_cache(maxsize=MAX_CACHED_SCHEMAS)
+def get_validator(definitions):
+    """Gets the validator for some input definitions, given as JSON. Each
+    different set of definitions is only compiled once."""
+
+    return SchemaValidator(json.loads(definitions))
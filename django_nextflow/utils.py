@@ -1,12 +1,34 @@
+import os
+import mmap
+import zlib
+import shutil
 import hashlib
+from contextlib import contextmanager
+from .filetypes import get_registry
 
+GZIP_MAGIC = b"\x1f\x8b"
+BINARY_CHECK_SIZE = 4096
+MAGIC_NUMBERS = [
+    *((b"CRAM" + bytes([version]), "cram") for version in range(1, 5)),
+    (b"BAM\x01", "bam"), (b"BCF\x02", "bcf"),
+    (b"PK\x03\x04", "zip"), (b"PK\x05\x06", "zip"),
+    *((b"BZh" + str(level).encode(), "bzip2") for level in range(1, 10)),
+    (b"\xfd7zXZ\x00", "xz"), (b"\x28\xb5\x2f\xfd", "zstd"),
+    (b"\x89HDF\r\n\x1a\n", "hdf5"), (b"%PDF", "pdf"),
+    (b"\x89PNG\r\n\x1a\n", "png"), (b"\xff\xd8\xff", "jpeg"),
+    (b"II*\x00", "tiff"), (b"MM\x00*", "tiff"),
+]
+BGZF_MAGIC_NUMBERS = [(b"BAM\x01", "bam"), (b"BCF\x02", "bcf")]
+UTF8_BYTE_ORDER_MARK = b"\xef\xbb\xbf"
 
-def get_file_extension(filename):
-    """Gets the file extension from some filename."""
+
+def get_file_extension(filename, head=None):
+    """Gets the filetype of a file from its name, using the filetype registry.
+    If the name has no extension, the file's first bytes can be given to
+    identify it by its magic number instead."""
     
-    if filename.endswith(".gz"):
-        return ".".join(filename.split(".")[-2:])
-    return filename.split(".")[-1] if "." in filename else ""
+    format = detect_format(head) if head else None
+    return get_registry().detect(filename, format)
 
 
 def get_file_hash(path):
@@ -19,12 +41,310 @@ def get_file_hash(path):
     return hash_md5.hexdigest()
 
 
+def is_gzipped(path):
+    """Checks if a file is gzip-compressed (which includes bgzip), from its
+    first two bytes rather than its name."""
+
+    with open(path, "rb") as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+def write_and_hash(path, chunks, head_size=BINARY_CHECK_SIZE):
+    """Writes chunks of bytes to a new file, hashing them on the way so that
+    the file doesn't need to be read again. The MD5 is returned, along with
+    the first few bytes for checking whether the file is binary."""
+
+    hash_md5, head = hashlib.md5(), b""
+    with open(path, "wb+") as f:
+        for chunk in chunks:
+            if len(head) < head_size: head += chunk[:head_size - len(head)]
+            hash_md5.update(chunk)
+            f.write(chunk)
+    return hash_md5.hexdigest(), head
+
+
+def hash_file(path, head_size=BINARY_CHECK_SIZE, chunk_size=1048576):
+    """Gets the MD5 hash of a file and its first few bytes, in one read."""
+
+    with open(path, "rb") as f:
+        head = f.read(head_size)
+        hash_md5 = hashlib.md5(head)
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest(), head
+
+
+def copy_and_hash(source, destination, chunk_size=1048576):
+    """Copies a file, hashing it as it is copied. The MD5 and the first few
+    bytes are returned."""
+
+    with open(source, "rb") as f:
+        return write_and_hash(destination, iter(lambda: f.read(chunk_size), b""))
+
+
+def reflink_file(source, destination):
+    """Makes a copy-on-write clone of a file, which shares its blocks until
+    either is changed. FICLONE is tried first, then copy_file_range - which
+    filesystems can serve with a clone or a server-side copy. OSError is
+    raised if neither is possible."""
+
+    try:
+        import fcntl
+        FICLONE = 0x40049409
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return
+            except OSError:
+                if not hasattr(os, "copy_file_range"): raise
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    count = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if not count: raise OSError("copy_file_range stopped early")
+                    remaining -= count
+    except (OSError, ImportError) as e:
+        if os.path.exists(destination): os.remove(destination)
+        raise OSError(f"Could not reflink {source}") from e
+
+
+IMPORT_MODES = {"copy": None, "link": os.link, "reflink": reflink_file, "move": os.rename}
+
+def import_file(source, destination, mode="copy"):
+    """Puts a file at a new location and returns its MD5 and first few bytes.
+    'copy' copies it, hashing as it goes. 'link' hardlinks it, 'reflink'
+    clones it and 'move' renames it - these share or take over the existing
+    storage, so only need to read it to hash it. If the filesystem can't do
+    that (for example if the file is on another device), it is copied."""
+
+    if mode not in IMPORT_MODES: raise ValueError(f"Unknown import mode: {mode}")
+    if IMPORT_MODES[mode]:
+        try:
+            IMPORT_MODES[mode](source, destination)
+            return hash_file(destination)
+        except OSError:
+            if not os.path.exists(source): raise
+    result = copy_and_hash(source, destination)
+    if mode == "move": os.remove(source)
+    return result
+
+
+def import_directory(source, destination, mode="copy"):
+    """Puts a directory at a new location, importing each file within it
+    using some mode as import_file does."""
+
+    if mode not in IMPORT_MODES: raise ValueError(f"Unknown import mode: {mode}")
+    if mode == "move":
+        try:
+            return os.rename(source, destination)
+        except OSError: pass
+    def copy_function(src, dst):
+        if IMPORT_MODES[mode] and mode != "move":
+            try:
+                return IMPORT_MODES[mode](src, dst)
+            except OSError: pass
+        shutil.copy2(src, dst)
+    shutil.copytree(source, destination, copy_function=copy_function)
+    if mode == "move": shutil.rmtree(source)
+
+
 def check_if_binary(path):
-    """Checks if a file contains data that needs to be opened with 'rb'."""
+    """Checks if a file contains data that needs to be opened with 'rb', from
+    a fixed number of its first bytes."""
     
+    with open(path, "rb") as f:
+        return check_bytes_if_binary(f.read(BINARY_CHECK_SIZE))
+
+
+def allocate_file(path, size):
+    """Creates a file of some size up front, so that chunks of it can be
+    written in any order. The space is reserved where the filesystem supports
+    it, and otherwise the file is left sparse."""
+
+    with open(path, "wb") as f:
+        f.truncate(size)
+        if size and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+            except OSError: pass
+
+
+def write_at(path, offset, chunks):
+    """Writes chunks of bytes into an existing file starting at some offset,
+    and returns how many bytes were written. Each call has its own file
+    descriptor and writes with pwrite where available, so several writers can
+    fill different parts of the same file at once."""
+
+    fd = os.open(path, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+    written = 0
     try:
-        with open(path) as f:
-            f.read(1024)
+        for chunk in chunks:
+            view = memoryview(chunk)
+            while view:
+                if hasattr(os, "pwrite"):
+                    count = os.pwrite(fd, view, offset + written)
+                else:
+                    os.lseek(fd, offset + written, os.SEEK_SET)
+                    count = os.write(fd, view)
+                written += count
+                view = view[count:]
+    finally:
+        os.close(fd)
+    return written
+
+
+def is_bgzf(header):
+    """Checks if the first 18 bytes of a file are a BGZF block header - a gzip
+    header with an extra 'BC' field holding the block size."""
+
+    return len(header) >= 18 and header[:4] == GZIP_MAGIC + b"\x08\x04" and\
+        header[12:14] == b"BC"
+
+
+def decompress_prefix(data, size=BINARY_CHECK_SIZE):
+    """Decompresses as much of the start of some gzipped bytes as it can, up
+    to some size. None is returned if they aren't valid gzip, or are too
+    damaged or truncated for anything to be decompressed."""
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        decompressed = decompressor.decompress(data, size)
+    except zlib.error: return None
+    if not decompressed and not decompressor.eof: return None
+    return decompressed
+
+
+def detect_format(data):
+    """Identifies the format of a file from its first few bytes, for the
+    binary and compressed formats that have magic numbers. Bgzipped data is
+    decompressed to tell BAM and BCF files apart from other bgzipped files.
+    None is returned for anything else, including plain text."""
+
+    if data[:2] == GZIP_MAGIC:
+        if not is_bgzf(data): return "gzip"
+        inner = decompress_prefix(data) or b""
+        for magic, name in BGZF_MAGIC_NUMBERS:
+            if inner.startswith(magic): return name
+        return "bgzf"
+    for magic, name in MAGIC_NUMBERS:
+        if data.startswith(magic): return name
+    return None
+
+
+def check_bytes_if_binary(data):
+    """Checks if a file needs to be opened with 'rb' from its first few bytes.
+    Formats with magic numbers are binary, except that gzipped data has its
+    start decompressed and checked instead. Otherwise text must be UTF-8 (with
+    or without a byte order mark) and have no null bytes - a character cut off
+    at the end of the bytes is allowed. Text is always read as UTF-8, so
+    UTF-16 and UTF-32 files count as binary."""
+
+    format = detect_format(data)
+    if format in ("gzip", "bgzf"):
+        data = decompress_prefix(data)
+        if data is None or detect_format(data): return True
+    elif format: return True
+    data = data[:BINARY_CHECK_SIZE]
+    if b"\x00" in data: return True
+    try:
+        data.decode()
         return False
-    except UnicodeDecodeError:
-        return True
\ No newline at end of file
+    except UnicodeDecodeError as e:
+        return e.reason != "unexpected end of data"
+
+
+def split_utf8(data):
+    """Splits some bytes into the part made of complete UTF-8 characters, and
+    any partial character left over at the end."""
+
+    for i in range(1, min(4, len(data)) + 1):
+        byte = data[-i]
+        if byte & 0xC0 != 0x80:
+            needed = 1 if byte < 0x80 else 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return (data[:-i], data[-i:]) if needed > i else (data, b"")
+    return data, b""
+
+
+def read_last_lines(path, count, block_size=65536):
+    """Gets the last few lines of a file as a string. The file is read
+    backwards from the end in blocks, so its size doesn't matter."""
+
+    if count <= 0: return ""
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b""
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.splitlines(keepends=True)
+    return b"".join(lines[-count:]).decode(errors="replace")
+
+
+def read_file_range(path, offset=0, size=65536):
+    """Reads up to some number of bytes from a file starting at a byte offset.
+    The text is returned along with the offset to read from next - a character
+    split by the end of the range is left for the next read."""
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size)
+    complete, partial = split_utf8(data)
+    if not complete: complete, partial = data, b""
+    return complete.decode(errors="replace"), offset + len(complete)
+
+
+def read_text_page(path, offset, size, opener=None):
+    """Reads the text of a file whose characters start within some byte range.
+    Characters split by the start of the range belong to the previous page, and
+    those split by the end are completed, so consecutive pages never share or
+    lose a character - a page too small to reach the start of a character is
+    empty. A different function for opening the file in binary mode can be
+    given."""
+
+    if size < 1: raise ValueError("Page size must be at least one byte")
+    with (opener or (lambda path: open(path, "rb")))(path) as f:
+        f.seek(offset)
+        data = f.read(size + 3)
+    start, end = 0, min(size, len(data))
+    if offset:
+        while start < min(3, len(data)) and data[start] & 0xC0 == 0x80: start += 1
+    if start >= end: return ""
+    while end < len(data) and data[end] & 0xC0 == 0x80: end += 1
+    return data[start:end].decode(errors="replace")
+
+
+def iter_file_text(path, offset=0, chunk_size=65536):
+    """Iterates through a file from some byte offset, yielding its text in
+    chunks so that only one chunk is held in memory at a time."""
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        partial = b""
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            complete, partial = split_utf8(partial + chunk)
+            if complete: yield complete.decode(errors="replace")
+        if partial: yield partial.decode(errors="replace")
+
+
+@contextmanager
+def map_file(path):
+    """Memory-maps a file read-only and yields a memoryview of it. Slicing the
+    view copies nothing, and the operating system pages the file in only as
+    its regions are touched. Empty files, which can't be mapped, give an empty
+    view."""
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield memoryview(b"")
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+            try:
+                mapped.close()
+            except BufferError:
+                pass # Slices still in use keep the map open until collected
@@ -0,0 +1,118 @@
+import os
+import hashlib
+import zipfile
+import tempfile
+from django.test import TestCase
+from django_nextflow.archives import (
+    DEFLATED, STORED, iter_member, list_directory, unpack_archive, write_archive
+)
+
+class ArchiveTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.dir.name, "source")
+        os.makedirs(os.path.join(self.source, "sub", "empty"))
+        self.files = {
+            "a.txt": b"hello\n" * 10000, "empty.txt": b"",
+            "sub/b.bin": os.urandom(50000), "sub/é.txt": b"x",
+        }
+        for name, content in self.files.items():
+            with open(os.path.join(self.source, *name.split("/")), "wb") as f:
+                f.write(content)
+        self.zip_path = self.source + ".zip"
+    
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+
+
+class DirectoryListingTests(ArchiveTest):
+
+    def test_can_list_directory(self):
+        self.assertEqual([name for name, _ in list_directory(self.source)], [
+            "sub/", "a.txt", "empty.txt", "sub/empty/", "sub/b.bin", "sub/é.txt"
+        ])
+    
+
+    def test_broken_symlinks_left_out(self):
+        os.symlink(os.path.join(self.dir.name, "missing"), os.path.join(self.source, "broken"))
+        os.symlink(os.path.join(self.source, "a.txt"), os.path.join(self.source, "link.txt"))
+        names = [name for name, _ in list_directory(self.source)]
+        self.assertNotIn("broken", names)
+        self.assertIn("link.txt", names)
+
+
+
+class ArchiveWritingTests(ArchiveTest):
+
+    def test_can_write_archive(self):
+        md5, members = write_archive(self.source, self.zip_path, workers=3)
+        with open(self.zip_path, "rb") as f:
+            self.assertEqual(md5, hashlib.md5(f.read()).hexdigest())
+        with zipfile.ZipFile(self.zip_path) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertIn("sub/empty/", archive.namelist())
+            for name, content in self.files.items():
+                self.assertEqual(archive.read(name), content)
+        self.assertEqual([m["name"] for m in members], [
+            "a.txt", "empty.txt", "sub/b.bin", "sub/é.txt"
+        ])
+        for member in members:
+            content = self.files[member["name"]]
+            self.assertEqual(member["size"], len(content))
+            self.assertEqual(member["md5"], hashlib.md5(content).hexdigest())
+    
+
+    def test_can_archive_directory_with_broken_symlink(self):
+        os.symlink(os.path.join(self.dir.name, "missing"), os.path.join(self.source, "sub", "broken"))
+        md5, members = write_archive(self.source, self.zip_path)
+        with zipfile.ZipFile(self.zip_path) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertNotIn("sub/broken", archive.namelist())
+        self.assertEqual(len(members), 4)
+    
+
+    def test_incompressible_files_stored(self):
+        _, members = write_archive(self.source, self.zip_path)
+        members = {m["name"]: m for m in members}
+        self.assertEqual(members["a.txt"]["method"], DEFLATED)
+        self.assertLess(members["a.txt"]["compressed_size"], 1000)
+        self.assertEqual(members["sub/b.bin"]["method"], STORED)
+        self.assertEqual(members["sub/b.bin"]["compressed_size"], 50000)
+    
+
+    def test_can_unpack_archive(self):
+        _, written = write_archive(self.source, self.zip_path)
+        target = os.path.join(self.dir.name, "target")
+        unpacked = unpack_archive(self.zip_path, target)
+        self.assertEqual(unpacked, written)
+        for name, content in self.files.items():
+            with open(os.path.join(target, *name.split("/")), "rb") as f:
+                self.assertEqual(f.read(), content)
+        self.assertTrue(os.path.isdir(os.path.join(target, "sub", "empty")))
+    
+
+    def test_unsafe_names_not_unpacked(self):
+        with zipfile.ZipFile(self.zip_path, "w") as archive:
+            archive.writestr("../escape.txt", "no")
+            archive.writestr("safe.txt", "yes")
+        target = os.path.join(self.dir.name, "target")
+        members = unpack_archive(self.zip_path, target)
+        self.assertEqual([m["name"] for m in members], ["safe.txt"])
+        self.assertFalse(os.path.exists(os.path.join(self.dir.name, "escape.txt")))
+
+
+
+class MemberReadingTests(ArchiveTest):
+
+    def test_can_read_members_in_chunks(self):
+        _, members = write_archive(self.source, self.zip_path)
+        for member in members:
+            chunks = list(iter_member(
+                self.zip_path, member["offset"], member["compressed_size"],
+                member["method"], chunk_size=1000
+            ))
+            self.assertTrue(all(len(chunk) <= 1000 for chunk in chunks))
+            self.assertEqual(b"".join(chunks), self.files[member["name"]])
@@ -0,0 +1,138 @@
+import os
+import time
+import tempfile
+from unittest.mock import patch
+from django.test import TestCase
+from django.test.utils import override_settings
+from mixer.backend.django import mixer
+from django_nextflow.cleanup import (
+    collect_garbage, find_missing_data, find_orphaned_directories, remove_path
+)
+from django_nextflow.models import Data, Execution, PendingDeletion, ProcessExecution
+
+class CleanupTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.data_root = os.path.join(self.dir.name, "data")
+        self.uploads = os.path.join(self.dir.name, "uploads")
+        os.mkdir(self.data_root)
+        os.mkdir(self.uploads)
+        self.settings = override_settings(
+            NEXTFLOW_DATA_ROOT=self.data_root, NEXTFLOW_UPLOADS_ROOT=self.uploads
+        )
+        self.settings.enable()
+    
+
+    def tearDown(self):
+        self.settings.disable()
+        self.dir.cleanup()
+    
+
+    def make_dir(self, *path, age=0):
+        path = os.path.join(*path)
+        os.makedirs(path)
+        with open(os.path.join(path, "file.txt"), "w") as f: f.write("x")
+        if age: os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+
+
+class PathRemovalTests(CleanupTest):
+
+    def test_can_remove_paths(self):
+        directory = self.make_dir(self.uploads, "1")
+        link = os.path.join(self.uploads, "link")
+        os.symlink(directory, link)
+        remove_path(link)
+        self.assertTrue(os.path.exists(directory))
+        remove_path(os.path.join(directory, "file.txt"))
+        remove_path(directory)
+        self.assertFalse(os.path.exists(directory))
+        remove_path(directory)
+
+
+
+class GarbageCollectionTests(CleanupTest):
+
+    def test_can_collect_garbage(self):
+        paths = [self.make_dir(self.uploads, str(n)) for n in range(5)]
+        PendingDeletion.enqueue(*paths, os.path.join(self.uploads, "gone"))
+        self.assertEqual(collect_garbage(batch_size=2), (6, 0))
+        self.assertFalse(PendingDeletion.objects.exists())
+        self.assertEqual(os.listdir(self.uploads), [])
+    
+
+    @patch("django_nextflow.cleanup.remove_path")
+    def test_failed_deletions_retried_later(self, mock_remove):
+        mock_remove.side_effect = PermissionError("denied")
+        PendingDeletion.enqueue("/protected")
+        self.assertEqual(collect_garbage(retry_delay=60), (0, 1))
+        deletion = PendingDeletion.objects.get()
+        self.assertEqual(deletion.attempts, 1)
+        self.assertEqual(deletion.error, "denied")
+        self.assertGreater(deletion.next_attempt, time.time() + 50)
+        self.assertEqual(collect_garbage(), (0, 0))
+        PendingDeletion.objects.update(next_attempt=0)
+        mock_remove.side_effect = None
+        self.assertEqual(collect_garbage(), (1, 0))
+    
+
+    @patch("django_nextflow.cleanup.remove_path")
+    def test_deletions_given_up_after_max_attempts(self, mock_remove):
+        mock_remove.side_effect = PermissionError("denied")
+        PendingDeletion.enqueue("/protected")
+        PendingDeletion.objects.update(attempts=2)
+        self.assertEqual(collect_garbage(max_attempts=3), (0, 1))
+        PendingDeletion.objects.update(next_attempt=0)
+        self.assertEqual(collect_garbage(max_attempts=3), (0, 0))
+        self.assertEqual(mock_remove.call_count, 1)
+
+
+
+class ReconciliationTests(CleanupTest):
+
+    def test_can_find_orphaned_directories(self):
+        mixer.blend(Execution, id=1)
+        mixer.blend(Data, id=2, upstream_process_execution=None)
+        self.make_dir(self.data_root, "1", age=100000)
+        orphan = self.make_dir(self.data_root, "3", age=100000)
+        self.make_dir(self.data_root, "4")
+        self.make_dir(self.data_root, "other", age=100000)
+        self.make_dir(self.uploads, "2", age=100000)
+        upload = self.make_dir(self.uploads, "5", age=100000)
+        queued = self.make_dir(self.uploads, "6", age=100000)
+        PendingDeletion.enqueue(queued)
+        self.assertEqual(find_orphaned_directories(), [orphan, upload])
+        self.assertEqual(len(find_orphaned_directories(min_age=0)), 3)
+    
+
+    def test_running_execution_not_orphaned(self):
+        path = self.make_dir(self.data_root, "3", age=100000)
+        with open(os.path.join(path, ".nextflow.log"), "w") as f: f.write("")
+        self.assertEqual(find_orphaned_directories(), [])
+    
+
+    def test_can_find_missing_data(self):
+        self.make_dir(self.uploads, "1")
+        os.rename(
+            os.path.join(self.uploads, "1", "file.txt"),
+            os.path.join(self.uploads, "1", "a.txt")
+        )
+        mixer.blend(Data, id=1, filename="a.txt", upstream_process_execution=None)
+        mixer.blend(Data, id=2, filename="b.txt", upstream_process_execution=None)
+        mixer.blend(Data, id=3, filename="c.txt", upstream_process_execution=None, is_removed=True)
+        self.assertEqual([data.id for data in find_missing_data()], [2])
+    
+
+    def test_can_find_missing_outputs(self):
+        execution = mixer.blend(Execution, id=1)
+        process_execution = mixer.blend(
+            ProcessExecution, execution=execution, identifier="ab/cdef"
+        )
+        work = self.make_dir(self.data_root, "1", "work", "ab", "cdef12")
+        mixer.blend(Data, id=2, filename="file.txt", upstream_process_execution=process_execution)
+        mixer.blend(Data, id=3, filename="gone.txt", upstream_process_execution=process_execution)
+        self.assertEqual([data.id for data in find_missing_data()], [3])
+        os.rename(work, os.path.join(os.path.dirname(work), "zz"))
+        self.assertEqual([data.id for data in find_missing_data()], [2, 3])
@@ -0,0 +1,176 @@
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.test.utils import override_settings
+from mixer.backend.django import mixer
+from django_nextflow.models import Data, PendingDeletion
+
+class CommandTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.uploads = os.path.join(self.dir.name, "uploads")
+        self.source = os.path.join(self.dir.name, "source")
+        os.mkdir(self.uploads)
+        os.makedirs(os.path.join(self.source, "run1"))
+        self.settings = override_settings(NEXTFLOW_UPLOADS_ROOT=self.uploads)
+        self.settings.enable()
+    
+
+    def tearDown(self):
+        self.settings.disable()
+        self.dir.cleanup()
+    
+
+    def write(self, path, content):
+        path = os.path.join(self.source, path)
+        with open(path, "w") as f: f.write(content)
+        return path
+    
+
+    def call(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(*args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+
+
+class DataImportCommandTests(CommandTest):
+
+    def test_can_import_directory_tree(self):
+        self.write("a.txt", "A")
+        self.write("run1/b.fastq", "@B\nACGT\n")
+        stdout, _ = self.call("import_data", self.source)
+        self.assertEqual(
+            sorted(Data.objects.values_list("filename", flat=True)),
+            ["a.txt", "b.fastq"]
+        )
+        self.assertIn("Imported 2 files", stdout)
+        self.assertIn("files/s", stdout)
+    
+
+    def test_can_import_manifest(self):
+        path1, path2 = self.write("a.txt", "A"), self.write("b.txt", "B")
+        manifest = os.path.join(self.dir.name, "manifest.txt")
+        with open(manifest, "w") as f: f.write(f"{path2}\n\n")
+        self.call("import_data", manifest)
+        self.assertEqual(list(Data.objects.values_list("filename", flat=True)), ["b.txt"])
+    
+
+    def test_missing_source(self):
+        with self.assertRaises(CommandError):
+            self.call("import_data", os.path.join(self.dir.name, "missing"))
+    
+
+    def test_already_imported_files_skipped(self):
+        path = self.write("a.txt", "A")
+        Data.create_from_path(path)
+        self.write("run1/copy.txt", "A")
+        self.write("run1/b.txt", "B")
+        stdout, _ = self.call("import_data", self.source)
+        self.assertEqual(Data.objects.count(), 2)
+        self.assertIn("Imported 1 files", stdout)
+        self.assertIn("skipped 2 already imported", stdout)
+    
+
+    def test_checkpoint_resumes_import(self):
+        self.write("a.txt", "A")
+        self.write("b.txt", "B")
+        checkpoint = os.path.join(self.dir.name, "checkpoint")
+        with open(checkpoint, "w") as f: f.write(os.path.join(self.source, "a.txt") + "\n")
+        self.call("import_data", self.source, "--checkpoint", checkpoint)
+        self.assertEqual(list(Data.objects.values_list("filename", flat=True)), ["b.txt"])
+        with open(checkpoint) as f:
+            self.assertEqual(f.read().splitlines(), [
+                os.path.join(self.source, "a.txt"), os.path.join(self.source, "b.txt")
+            ])
+        stdout, _ = self.call("import_data", self.source, "--checkpoint", checkpoint)
+        self.assertIn("0 files to import (2 already done)", stdout)
+    
+
+    def test_moved_files_are_checkpointed(self):
+        self.write("a.txt", "A")
+        self.write("b.txt", "B")
+        checkpoint = os.path.join(self.dir.name, "checkpoint")
+        self.call("import_data", self.source, "--mode", "move", "--checkpoint", checkpoint)
+        with open(checkpoint) as f:
+            self.assertEqual(sorted(f.read().splitlines()), [
+                os.path.join(self.source, "a.txt"), os.path.join(self.source, "b.txt")
+            ])
+        self.assertFalse(os.path.exists(os.path.join(self.source, "a.txt")))
+        self.assertEqual(Data.objects.filter(is_ready=True).count(), 2)
+    
+
+    @patch("django_nextflow.models.import_file")
+    def test_failures_reported_and_not_checkpointed(self, mock_import):
+        self.write("a.txt", "A")
+        mock_import.side_effect = PermissionError("denied")
+        checkpoint = os.path.join(self.dir.name, "checkpoint")
+        stdout, stderr = self.call("import_data", self.source, "--checkpoint", checkpoint)
+        self.assertIn("Could not import", stderr)
+        self.assertIn("1 failed", stdout)
+        self.assertFalse(os.path.exists(checkpoint))
+
+
+
+
+class FiletypeBackfillCommandTests(CommandTest):
+
+    def test_can_backfill_filetypes(self):
+        mixer.blend(Data, id=1, filename="calls.vcf.gz.tbi", filetype="gz.tbi")
+        mixer.blend(Data, id=2, filename="reads.fastq.gz", filetype="fastq.gz")
+        mixer.blend(Data, id=3, filename="a.tar.gz", filetype="tar.gz")
+        stdout, _ = self.call("backfill_filetypes", "--batch-size", "1")
+        self.assertIn("Updated 1 of 3", stdout)
+        self.assertEqual(Data.objects.get(id=1).filetype, "vcf.gz.tbi")
+    
+
+    def test_dry_run_changes_nothing(self):
+        mixer.blend(Data, id=1, filename="calls.vcf.gz.tbi", filetype="gz.tbi")
+        stdout, _ = self.call("backfill_filetypes", "--dry-run")
+        self.assertIn("Would update 1 of 1", stdout)
+        self.assertEqual(Data.objects.get(id=1).filetype, "gz.tbi")
+    
+
+    def test_can_sniff_files_without_extension(self):
+        os.mkdir(os.path.join(self.uploads, "1"))
+        with open(os.path.join(self.uploads, "1", "alignments"), "wb") as f:
+            f.write(b"CRAM\x03\x00")
+        mixer.blend(
+            Data, id=1, filename="alignments", filetype="", is_directory=False,
+            is_ready=True, upstream_process_execution=None
+        )
+        self.call("backfill_filetypes")
+        self.assertEqual(Data.objects.get(id=1).filetype, "")
+        self.call("backfill_filetypes", "--sniff")
+        self.assertEqual(Data.objects.get(id=1).filetype, "cram")
+
+
+
+class GarbageCollectionCommandTests(CommandTest):
+
+    def test_can_collect_garbage(self):
+        path = os.path.join(self.uploads, "1")
+        os.mkdir(path)
+        PendingDeletion.enqueue(path)
+        stdout, _ = self.call("collect_garbage")
+        self.assertIn("Deleted 1 paths, 0 failed", stdout)
+        self.assertFalse(os.path.exists(path))
+    
+
+    def test_can_reconcile(self):
+        path = os.path.join(self.uploads, "1")
+        os.mkdir(path)
+        mixer.blend(Data, id=2, filename="a.txt", upstream_process_execution=None)
+        with override_settings(NEXTFLOW_DATA_ROOT=self.source):
+            stdout, _ = self.call(
+                "collect_garbage", "--reconcile", "--min-age", "0", "--mark-removed"
+            )
+        self.assertIn(f"Orphaned directory: {path}", stdout)
+        self.assertIn("Missing files: Data 2 (a.txt)", stdout)
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(Data.objects.get(id=2).is_removed)
@@ -1,10 +1,15 @@
 import os
 import time
+import hashlib
+import shutil
+import tempfile
+import zipfile
 from unittest.mock import Mock, PropertyMock, patch
 from django.test.utils import override_settings
 from mixer.backend.django import mixer
+from django.db import transaction
 from django.test import TestCase
-from django_nextflow.models import Data, ProcessExecution, Execution
+from django_nextflow.models import Data, PendingDeletion, ProcessExecution, Execution
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 class DataCreationTests(TestCase):
@@ -42,15 +47,12 @@ class DataCreationFromPathTests(TestCase):
     @patch("os.path.getsize")
     @patch("os.path.isdir")
     @patch("os.mkdir")
-    @patch("shutil.copy")
-    @patch("django_nextflow.models.get_file_hash")
-    @patch("django_nextflow.models.check_if_binary")
-    def test_can_create_from_path(self, mock_bin, mock_md5, mock_copy, mock_mk, mock_dir, mock_size, mock_ext):
+    @patch("django_nextflow.models.import_file")
+    def test_can_create_from_path(self, mock_import, mock_mk, mock_dir, mock_size, mock_ext):
         mock_ext.return_value = "txt"
         mock_size.return_value = 100
         mock_dir.return_value = False
-        mock_md5.return_value = "X"
-        mock_bin.return_value = False
+        mock_import.return_value = ("X", b"abc")
         data = Data.create_from_path("/path/to/file")
         self.assertEqual(data.filename, "file")
         self.assertEqual(data.filetype, "txt")
@@ -62,11 +64,27 @@ class DataCreationFromPathTests(TestCase):
         self.assertIsNone(data.upstream_process_execution)
         mock_dir.assert_called_with("/path/to/file")
         mock_mk.assert_called_with(os.path.join("/uploads", str(data.id)))
-        mock_copy.assert_called_with("/path/to/file", os.path.join(
+        mock_import.assert_called_with("/path/to/file", os.path.join(
+            "/uploads", str(data.id), "file"
+        ), "copy")
+    
+
+    @override_settings(NEXTFLOW_UPLOADS_ROOT="/uploads")
+    @patch("django_nextflow.models.get_file_extension")
+    @patch("os.path.getsize")
+    @patch("os.path.isdir")
+    @patch("os.mkdir")
+    @patch("django_nextflow.models.import_file")
+    def test_can_create_binary_from_path_by_link(self, mock_import, mock_mk, mock_dir, mock_size, mock_ext):
+        mock_ext.return_value = "bin"
+        mock_dir.return_value = False
+        mock_size.return_value = 100
+        mock_import.return_value = ("X", b"\x00\x81")
+        data = Data.create_from_path("/path/to/file", mode="link")
+        self.assertTrue(data.is_binary)
+        mock_import.assert_called_with("/path/to/file", os.path.join(
             "/uploads", str(data.id), "file"
-        ))
-        mock_md5.assert_called_with(os.path.join(os.path.join("/uploads", str(data.id), "file")))
-        mock_bin.assert_called_with("/path/to/file")
+        ), "link")
     
 
     @override_settings(NEXTFLOW_UPLOADS_ROOT="/uploads")
@@ -74,15 +92,17 @@ class DataCreationFromPathTests(TestCase):
     @patch("os.path.getsize")
     @patch("os.path.isdir")
     @patch("os.mkdir")
-    @patch("shutil.copy")
-    @patch("shutil.make_archive")
-    @patch("django_nextflow.models.get_file_hash")
-    @patch("django_nextflow.models.check_if_binary")
-    def test_can_create_directory_from_path(self, mock_bin, mock_md5, mock_zip, mock_copy, mock_mk, mock_dir, mock_size, mock_ext):
+    @patch("django_nextflow.models.import_directory")
+    @patch("django_nextflow.models.write_archive")
+    @patch("django_nextflow.models.hash_file")
+    def test_can_create_directory_from_path(self, mock_bin, mock_zip, mock_import, mock_mk, mock_dir, mock_size, mock_ext):
         mock_ext.return_value = "txt"
         mock_size.return_value = 100
         mock_dir.return_value = True
-        mock_md5.return_value = "X"
+        mock_zip.return_value = ("X", [{
+            "name": "a.txt", "size": 5, "md5": "Y", "offset": 10,
+            "compressed_size": 5, "method": 0
+        }])
         data = Data.create_from_path("/path/to/file")
         self.assertEqual(data.filename, "file")
         self.assertEqual(data.filetype, "txt")
@@ -94,37 +114,167 @@ class DataCreationFromPathTests(TestCase):
         self.assertIsNone(data.upstream_process_execution)
         mock_dir.assert_called_with("/path/to/file")
         mock_mk.assert_called_with(os.path.join("/uploads", str(data.id)))
-        mock_copy.assert_called_with("/path/to/file", os.path.join(
+        mock_import.assert_called_with("/path/to/file", os.path.join(
             "/uploads", str(data.id), "file"
-        ))
+        ), "copy")
         mock_zip.assert_called_with(
             os.path.join("/uploads", str(data.id), "file"),
-            "zip", os.path.join("/uploads", str(data.id), "file"),
+            os.path.join("/uploads", str(data.id), "file.zip"),
+            workers=None, compresslevel=6
         )
-        mock_md5.assert_called_with(os.path.join(os.path.join("/uploads", str(data.id), "file.zip")))
+        self.assertEqual(data.members.get().name, "a.txt")
         self.assertFalse(mock_bin.called)
 
 
 
+class DataBulkCreationFromPathsTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.uploads = os.path.join(self.dir.name, "uploads")
+        os.mkdir(self.uploads)
+        self.settings = override_settings(NEXTFLOW_UPLOADS_ROOT=self.uploads)
+        self.settings.enable()
+        self.paths = []
+        for n in range(10):
+            self.paths.append(os.path.join(self.dir.name, f"reads{n}.fastq"))
+            with open(self.paths[-1], "w") as f: f.write(f"@read{n}\nACGT\n")
+    
+
+    def tearDown(self):
+        self.settings.disable()
+        self.dir.cleanup()
+    
+
+    def test_can_bulk_create(self):
+        progress = Mock()
+        objects, errors = Data.bulk_create_from_paths(self.paths, progress=progress)
+        self.assertEqual(errors, {})
+        self.assertEqual(len(objects), 10)
+        self.assertEqual(Data.objects.count(), 10)
+        data = Data.objects.get(filename="reads3.fastq")
+        self.assertEqual(data.filetype, "fastq")
+        self.assertEqual(data.md5, hashlib.md5(b"@read3\nACGT\n").hexdigest())
+        self.assertFalse(data.is_binary)
+        self.assertTrue(data.is_ready)
+        with open(data.full_path) as f: self.assertEqual(f.read(), "@read3\nACGT\n")
+        self.assertEqual(progress.call_count, 10)
+        progress.assert_called_with(10, 10)
+    
+
+    def test_byte_order_marks(self):
+        utf8 = os.path.join(self.dir.name, "utf8.txt")
+        utf16 = os.path.join(self.dir.name, "utf16.txt")
+        with open(utf8, "wb") as f: f.write("\ufeffhéllo\n".encode())
+        with open(utf16, "wb") as f: f.write("héllo\n".encode("utf-16"))
+        objects, errors = Data.bulk_create_from_paths([utf8, utf16])
+        self.assertEqual(errors, {})
+        data = Data.objects.get(filename="utf8.txt")
+        self.assertFalse(data.is_binary)
+        self.assertEqual(data.contents(), "\ufeffhéllo\n")
+        data = Data.objects.get(filename="utf16.txt")
+        self.assertTrue(data.is_binary)
+        self.assertIsNone(data.contents())
+    
+
+    def test_failures_do_not_stop_batch(self):
+        missing = os.path.join(self.dir.name, "missing.fastq")
+        objects, errors = Data.bulk_create_from_paths(self.paths[:3] + [missing])
+        self.assertEqual(len(objects), 3)
+        self.assertEqual(list(errors), [missing])
+        self.assertIsInstance(errors[missing], FileNotFoundError)
+        self.assertEqual(Data.objects.count(), 3)
+    
+
+    @patch("django_nextflow.models.import_file")
+    def test_failed_imports_are_cleaned_up(self, mock_import):
+        mock_import.side_effect = PermissionError
+        objects, errors = Data.bulk_create_from_paths(self.paths[:2])
+        self.assertEqual(objects, [])
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(os.listdir(self.uploads), [])
+        self.assertEqual(Data.objects.count(), 0)
+    
+
+    def test_rows_inserted_before_files_imported(self):
+        calls, real_import, real_create = [], Data.import_path, Data.objects.bulk_create
+        def import_path(data, path, mode):
+            calls.append("import")
+            return real_import(data, path, mode)
+        def bulk_create(objects):
+            calls.append("insert")
+            self.assertFalse(any(data.is_ready for data in objects))
+            return real_create(objects)
+        with patch("django_nextflow.models.Data.import_path", import_path):
+            with patch.object(Data.objects, "bulk_create", bulk_create):
+                objects, errors = Data.bulk_create_from_paths(self.paths, workers=2)
+        self.assertEqual(calls, ["insert"] + ["import"] * 10)
+        self.assertEqual(len(objects), 10)
+        self.assertEqual(Data.objects.filter(is_ready=True).count(), 10)
+    
+
+    def test_rows_marked_ready_in_batches(self):
+        saved = Mock()
+        with self.assertNumQueries(5):
+            Data.bulk_create_from_paths(self.paths, saved=saved, flush_size=4)
+        self.assertEqual([len(c[0][0]) for c in saved.call_args_list], [4, 4, 2])
+        self.assertEqual(
+            sorted(p for c in saved.call_args_list for p in c[0][0]), sorted(self.paths)
+        )
+    
+
+    def test_moved_files_are_saved_as_they_finish(self):
+        saved = []
+        def check_saved(paths):
+            for path in paths: self.assertFalse(os.path.exists(path))
+            saved.extend(paths)
+        objects, errors = Data.bulk_create_from_paths(
+            self.paths, mode="move", saved=check_saved, flush_size=1
+        )
+        self.assertEqual(sorted(saved), sorted(self.paths))
+        self.assertEqual(Data.objects.filter(is_ready=True).count(), 10)
+    
+
+    @patch("django_nextflow.models.import_file")
+    def test_moved_files_kept_if_import_fails(self, mock_import):
+        def import_file(source, destination, mode):
+            os.rename(source, destination)
+            raise OSError("Could not hash")
+        mock_import.side_effect = import_file
+        objects, errors = Data.bulk_create_from_paths(self.paths[:1], mode="move")
+        self.assertEqual(objects, [])
+        self.assertIsInstance(errors[self.paths[0]], OSError)
+        data = Data.objects.get()
+        self.assertFalse(data.is_ready)
+        self.assertTrue(os.path.exists(data.upload_path))
+    
+
+    @patch("django_nextflow.models.generate_random_id")
+    def test_can_generate_unused_ids(self, mock_id):
+        mixer.blend(Data, id=2)
+        mock_id.side_effect = [1, 2, 3, 4]
+        self.assertEqual(sorted(Data.generate_ids(3)), [1, 3, 4])
+
+
+
 class DataCreationFromUploadedFileTests(TestCase):
 
     @override_settings(NEXTFLOW_UPLOADS_ROOT="/uploads")
     @patch("django_nextflow.models.get_file_extension")
     @patch("os.mkdir")
     @patch("builtins.open")
-    @patch("django_nextflow.models.get_file_hash")
-    @patch("django_nextflow.models.check_if_binary")
+    @patch("django_nextflow.utils.get_file_hash")
+    @patch("django_nextflow.models.hash_file")
     def test_can_create_from_upload(self, mock_bin, mock_md5, mock_open, mock_mk, mock_ext):
         upload = SimpleUploadedFile(name="file.txt", content=b"abc")
         mock_ext.return_value = "txt"
-        mock_md5.return_value = "X"
-        mock_bin.return_value = False
         data = Data.create_from_upload(upload)
         self.assertEqual(data.filename, "file.txt")
         self.assertEqual(data.filetype, "txt")
-        self.assertEqual(data.md5, "X")
+        self.assertEqual(data.md5, hashlib.md5(b"abc").hexdigest())
         self.assertEqual(data.size, 3)
         self.assertFalse(data.is_directory)
+        self.assertFalse(data.is_binary)
         self.assertLess(abs(data.created - time.time()), 1)
         self.assertIsNone(data.upstream_process_execution)
         mock_ext.assert_called_with("file.txt")
@@ -133,8 +283,8 @@ class DataCreationFromUploadedFileTests(TestCase):
             "/uploads", str(data.id), "file.txt"
         ), "wb+")
         mock_open.return_value.__enter__.return_value.write.assert_called_with(b"abc")
-        mock_md5.assert_called_with(os.path.join("/uploads", str(data.id), "file.txt"))
-        mock_bin.assert_called_with(os.path.join("/uploads", str(data.id), "file.txt"))
+        self.assertFalse(mock_md5.called)
+        self.assertFalse(mock_bin.called)
 
     
 
@@ -142,17 +292,16 @@ class DataCreationFromUploadedFileTests(TestCase):
     @patch("django_nextflow.models.get_file_extension")
     @patch("os.mkdir")
     @patch("builtins.open")
-    @patch("shutil.unpack_archive")
-    @patch("django_nextflow.models.get_file_hash")
-    @patch("django_nextflow.models.check_if_binary")
+    @patch("django_nextflow.models.unpack_archive")
+    @patch("django_nextflow.utils.get_file_hash")
+    @patch("django_nextflow.models.hash_file")
     def test_can_create_directory_from_upload(self, mock_bin, mock_md5, mock_unzip, mock_open, mock_mk, mock_ext):
         upload = SimpleUploadedFile(name="file.zip", content=b"abc")
         mock_ext.return_value = ""
-        mock_md5.return_value = "X"
         data = Data.create_from_upload(upload, is_directory=True)
         self.assertEqual(data.filename, "file")
         self.assertEqual(data.filetype, "")
-        self.assertEqual(data.md5, "X")
+        self.assertEqual(data.md5, hashlib.md5(b"abc").hexdigest())
         self.assertEqual(data.size, 3)
         self.assertTrue(data.is_directory)
         self.assertFalse(data.is_binary)
@@ -166,10 +315,22 @@ class DataCreationFromUploadedFileTests(TestCase):
         mock_open.return_value.__enter__.return_value.write.assert_called_with(b"abc")
         mock_unzip.assert_called_with(
             os.path.join("/uploads", str(data.id), "file.zip"),
-            os.path.join("/uploads", str(data.id), "file"), "zip"
+            os.path.join("/uploads", str(data.id), "file")
         )
-        mock_md5.assert_called_with(os.path.join("/uploads", str(data.id), "file.zip"))
+        self.assertFalse(mock_md5.called)
         self.assertFalse(mock_bin.called)
+    
+
+    @patch("django_nextflow.utils.get_file_hash")
+    def test_upload_read_once(self, mock_md5):
+        with tempfile.TemporaryDirectory() as root:
+            with override_settings(NEXTFLOW_UPLOADS_ROOT=root):
+                content = b"\x00\x81" * 100000
+                data = Data.create_from_upload(SimpleUploadedFile("file.bin", content))
+                self.assertEqual(data.md5, hashlib.md5(content).hexdigest())
+                self.assertTrue(data.is_binary)
+                with open(data.full_path, "rb") as f: self.assertEqual(f.read(), content)
+        self.assertFalse(mock_md5.called)
 
 
 
@@ -179,7 +340,7 @@ class DataCreationFromMultiUploadedFileTests(TestCase):
     @patch("django_nextflow.models.get_file_extension")
     @patch("os.mkdir")
     @patch("builtins.open")
-    @patch("django_nextflow.models.check_if_binary")
+    @patch("django_nextflow.models.hash_file")
     def test_can_create_first_blob(self, mock_bin, mock_open, mock_mk, mock_ext):
         upload = SimpleUploadedFile(name="blob", content=b"abc")
         mock_ext.return_value = "txt"
@@ -190,7 +351,7 @@ class DataCreationFromMultiUploadedFileTests(TestCase):
         self.assertEqual(data.size, 3)
         self.assertLess(abs(data.created - time.time()), 1)
         self.assertFalse(data.is_directory)
-        self.assertTrue(data.is_binary)
+        self.assertFalse(data.is_binary)
         self.assertFalse(data.is_removed)
         self.assertFalse(data.is_ready)
         self.assertEqual(data.md5, "")
@@ -287,16 +448,14 @@ class DataCreationFromMultiUploadedFileTests(TestCase):
     @override_settings(NEXTFLOW_UPLOADS_ROOT="/uploads")
     @patch("builtins.open")
     @patch("os.path.getsize")
-    @patch("django_nextflow.models.get_file_hash")
-    @patch("django_nextflow.models.check_if_binary")
-    def test_can_add_final_blob(self, mock_bin, mock_md5, mock_size, mock_open):
+    @patch("django_nextflow.models.hash_file")
+    def test_can_add_final_blob(self, mock_md5, mock_size, mock_open):
         data = mixer.blend(
             Data, filename="file.txt", filetype="txt", size=0, created=100,
             is_directory=False, is_ready=False, md5=""
         )
-        mock_bin.return_value = False
         mock_size.return_value = 9
-        mock_md5.return_value = "hash"
+        mock_md5.return_value = ("hash", b"abc")
         upload = SimpleUploadedFile(name="blob", content=b"ghi")
         data = Data.create_from_partial_upload(upload, data=data, final=True)
         self.assertEqual(data.filename, "file.txt")
@@ -310,9 +469,9 @@ class DataCreationFromMultiUploadedFileTests(TestCase):
         self.assertEqual(data.md5, "hash")
         mock_open.assert_called_with(os.path.join("/uploads", str(data.id), "file.txt"), "ab")
         mock_open.return_value.__enter__.return_value.write.assert_called_with(b"ghi")
+        self.assertFalse(data.is_binary)
         mock_md5.assert_called_with(os.path.join("/uploads", str(data.id), "file.txt"))
         mock_size.assert_called_with(os.path.join("/uploads", str(data.id), "file.txt"))
-        mock_bin.assert_called_with(os.path.join("/uploads", str(data.id), "file.txt"))
     
 
     @override_settings(NEXTFLOW_UPLOADS_ROOT="/uploads")
@@ -328,7 +487,7 @@ class DataCreationFromMultiUploadedFileTests(TestCase):
         self.assertEqual(data.size, 3)
         self.assertLess(abs(data.created - time.time()), 1)
         self.assertTrue(data.is_directory)
-        self.assertTrue(data.is_binary)
+        self.assertFalse(data.is_binary)
         self.assertFalse(data.is_removed)
         self.assertFalse(data.is_ready)
         self.assertEqual(data.md5, "")
@@ -343,15 +502,15 @@ class DataCreationFromMultiUploadedFileTests(TestCase):
     @override_settings(NEXTFLOW_UPLOADS_ROOT="/uploads")
     @patch("builtins.open")
     @patch("os.path.getsize")
-    @patch("django_nextflow.models.get_file_hash")
-    @patch("shutil.unpack_archive")
+    @patch("django_nextflow.models.hash_file")
+    @patch("django_nextflow.models.unpack_archive")
     def test_can_add_final_directory_blob(self, mock_unpack, mock_md5, mock_size, mock_open):
         data = mixer.blend(
             Data, filename="file", filetype="", size=0, created=100,
             is_directory=True, is_ready=False, md5=""
         )
         mock_size.return_value = 9
-        mock_md5.return_value = "hash"
+        mock_md5.return_value = ("hash", b"PK\x03\x04")
         upload = SimpleUploadedFile(name="blob", content=b"ghi")
         data = Data.create_from_partial_upload(upload, data=data, final=True)
         self.assertEqual(data.filename, "file")
@@ -365,7 +524,7 @@ class DataCreationFromMultiUploadedFileTests(TestCase):
         self.assertEqual(data.md5, "hash")
         mock_unpack.assert_called_with(
             os.path.join("/uploads", str(data.id), "file.zip"),
-            os.path.join("/uploads", str(data.id), "file"), "zip"
+            os.path.join("/uploads", str(data.id), "file")
         )
         mock_open.assert_called_with(os.path.join("/uploads", str(data.id), "file.zip"), "ab")
         mock_open.return_value.__enter__.return_value.write.assert_called_with(b"ghi")
@@ -374,21 +533,236 @@ class DataCreationFromMultiUploadedFileTests(TestCase):
 
 
 
+class PartialUploadHashingTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(NEXTFLOW_UPLOADS_ROOT=self.dir.name)
+        self.settings.enable()
+    
+
+    def tearDown(self):
+        self.settings.disable()
+        self.dir.cleanup()
+    
+
+    @patch("django_nextflow.models.hash_file")
+    @patch("django_nextflow.utils.get_file_hash")
+    def test_final_blob_does_not_reread_file(self, mock_md5, mock_bin):
+        data = Data.create_from_partial_upload(
+            SimpleUploadedFile("blob", b"\x00\xff"), filename="file.bin"
+        )
+        self.assertTrue(data.is_binary)
+        data = Data.create_from_partial_upload(
+            SimpleUploadedFile("blob", b"abc"), data=data
+        )
+        data = Data.create_from_partial_upload(
+            SimpleUploadedFile("blob", b"def"), data=data, final=True
+        )
+        self.assertEqual(data.md5, hashlib.md5(b"\x00\xffabcdef").hexdigest())
+        self.assertTrue(data.is_binary)
+        self.assertFalse(mock_md5.called)
+        self.assertFalse(mock_bin.called)
+    
+
+    @patch("django_nextflow.models.get_upload_hasher")
+    def test_hash_caught_up_after_missed_blob(self, mock_get):
+        data = Data.create_from_partial_upload(
+            SimpleUploadedFile("blob", b"abc"), filename="file.txt"
+        )
+        mock_get.return_value = None
+        data = Data.create_from_partial_upload(
+            SimpleUploadedFile("blob", b"def"), data=data
+        )
+        data = Data.create_from_partial_upload(
+            SimpleUploadedFile("blob", b"ghi"), data=data, final=True
+        )
+        self.assertEqual(data.md5, hashlib.md5(b"abcdefghi").hexdigest())
+        self.assertFalse(data.is_binary)
+    
+
+    def test_chunked_upload_hashed_as_chunks_arrive(self):
+        data = Data.create_for_chunked_upload("file.txt", 6)
+        with patch("django_nextflow.utils.get_file_hash") as mock_md5:
+            data.write_chunk(SimpleUploadedFile("blob", b"cd"), 2)
+            data.write_chunk(SimpleUploadedFile("blob", b"ab"), 0)
+            data.write_chunk(SimpleUploadedFile("blob", b"ef"), 4)
+        self.assertFalse(mock_md5.called)
+        self.assertEqual(data.md5, hashlib.md5(b"abcdef").hexdigest())
+        self.assertFalse(data.is_binary)
+
+
+
+class DataCreationFromChunkedUploadTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(NEXTFLOW_UPLOADS_ROOT=self.dir.name)
+        self.settings.enable()
+    
+
+    def tearDown(self):
+        self.settings.disable()
+        self.dir.cleanup()
+    
+
+    def test_can_create_chunked_upload(self):
+        data = Data.create_for_chunked_upload("file.txt", 10)
+        self.assertEqual(data.filename, "file.txt")
+        self.assertEqual(data.filetype, "txt")
+        self.assertEqual(data.size, 10)
+        self.assertFalse(data.is_ready)
+        self.assertEqual(os.path.getsize(data.upload_path), 10)
+        self.assertEqual(data.missing_ranges(), [(0, 10)])
+    
+
+    def test_can_write_chunks_out_of_order(self):
+        data = Data.create_for_chunked_upload("file.txt", 10)
+        data.write_chunk(SimpleUploadedFile("blob", b"6789"), 6)
+        data.write_chunk(SimpleUploadedFile("blob", b"01"), 0)
+        self.assertEqual(data.received_ranges(), [(0, 2), (6, 10)])
+        self.assertEqual(data.missing_ranges(), [(2, 6)])
+        self.assertFalse(data.is_ready)
+        data.write_chunk(SimpleUploadedFile("blob", b"2345"), 2)
+        self.assertTrue(data.is_ready)
+        self.assertFalse(data.is_binary)
+        self.assertEqual(data.md5, "781e5e245d69b566979b86e28d23f2c7")
+        self.assertEqual(data.chunks.count(), 0)
+        with open(data.full_path, "rb") as f: self.assertEqual(f.read(), b"0123456789")
+    
+
+    def test_can_resend_and_overlap_chunks(self):
+        data = Data.create_for_chunked_upload("file.txt", 6)
+        data.write_chunk(SimpleUploadedFile("blob", b"xyz"), 0)
+        data.write_chunk(SimpleUploadedFile("blob", b"abc"), 0)
+        self.assertEqual(data.chunks.count(), 1)
+        data.write_chunk(SimpleUploadedFile("blob", b"cd"), 2)
+        self.assertEqual(data.received_ranges(), [(0, 4)])
+        self.assertEqual(data.chunks.count(), 1)
+        data.write_chunk(SimpleUploadedFile("blob", b"ef"), 4)
+        with open(data.full_path, "rb") as f: self.assertEqual(f.read(), b"abcdef")
+    
+
+    def test_chunks_merged_as_they_arrive(self):
+        data = Data.create_for_chunked_upload("file.txt", 10)
+        data.write_chunk(SimpleUploadedFile("blob", b"01"), 0)
+        data.write_chunk(SimpleUploadedFile("blob", b"6"), 6)
+        data.write_chunk(SimpleUploadedFile("blob", b"2"), 2)
+        self.assertEqual(list(data.chunks.values_list("offset", "size")), [(0, 3), (6, 1)])
+        with patch("django_nextflow.models.Data.received_ranges") as mock_ranges:
+            data.write_chunk(SimpleUploadedFile("blob", b"345"), 3)
+            data.write_chunk(SimpleUploadedFile("blob", b"789"), 7)
+        self.assertFalse(mock_ranges.called)
+        self.assertTrue(data.is_ready)
+        with open(data.full_path, "rb") as f: self.assertEqual(f.read(), b"0123456789")
+    
+
+    def test_chunks_must_fit_in_file(self):
+        data = Data.create_for_chunked_upload("file.txt", 4)
+        with self.assertRaises(ValueError):
+            data.write_chunk(SimpleUploadedFile("blob", b"abc"), 2)
+        with self.assertRaises(ValueError):
+            data.write_chunk(SimpleUploadedFile("blob", b"a"), -1)
+    
+
+    def test_finalisation_only_happens_once(self):
+        data = Data.create_for_chunked_upload("file.txt", 2)
+        with open(data.upload_path, "wb") as f: f.write(b"ab")
+        other = Data.objects.get(id=data.id)
+        self.assertTrue(data.finalise_chunked_upload())
+        self.assertFalse(other.finalise_chunked_upload())
+        self.assertTrue(other.is_ready)
+        with self.assertRaises(ValueError):
+            other.write_chunk(SimpleUploadedFile("blob", b"a"), 0)
+    
+
+    def test_can_upload_directory_in_chunks(self):
+        source = os.path.join(self.dir.name, "source")
+        os.mkdir(source)
+        with open(os.path.join(source, "a.txt"), "w") as f: f.write("A")
+        archive = shutil.make_archive(source, "zip", source)
+        with open(archive, "rb") as f: content = f.read()
+        data = Data.create_for_chunked_upload("dir.zip", len(content), is_directory=True)
+        self.assertEqual(data.filename, "dir")
+        self.assertTrue(data.upload_path.endswith("dir.zip"))
+        half = len(content) // 2
+        data.write_chunk(SimpleUploadedFile("blob", content[half:]), half)
+        data.write_chunk(SimpleUploadedFile("blob", content[:half]), 0)
+        self.assertTrue(data.is_ready)
+        self.assertFalse(data.is_binary)
+        self.assertTrue(os.path.exists(os.path.join(data.full_path, "a.txt")))
+        self.assertEqual(data.member("a.txt").read(), b"A")
+    
+
+    def test_empty_upload_is_ready_immediately(self):
+        data = Data.create_for_chunked_upload("file.txt", 0)
+        self.assertTrue(data.is_ready)
+
+
+
+class DataMemberTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(NEXTFLOW_UPLOADS_ROOT=self.dir.name)
+        self.settings.enable()
+        self.source = os.path.join(self.dir.name, "source")
+        os.makedirs(os.path.join(self.source, "matrix"))
+        with open(os.path.join(self.source, "matrix", "barcodes.tsv"), "w") as f:
+            f.write("AAAC\n" * 10000)
+    
+
+    def tearDown(self):
+        self.settings.disable()
+        self.dir.cleanup()
+    
+
+    def test_directory_members_recorded(self):
+        data = Data.create_from_path(self.source)
+        member = data.member("matrix/barcodes.tsv")
+        self.assertEqual(str(member), "source/matrix/barcodes.tsv")
+        self.assertEqual(member.filename, "barcodes.tsv")
+        self.assertEqual(member.size, 50000)
+        self.assertEqual(member.md5, hashlib.md5(b"AAAC\n" * 10000).hexdigest())
+        self.assertEqual(member.read(), b"AAAC\n" * 10000)
+        self.assertIsNone(data.member("matrix/missing.tsv"))
+        with open(data.full_path + ".zip", "rb") as f:
+            self.assertEqual(data.md5, hashlib.md5(f.read()).hexdigest())
+    
+
+    def test_bulk_created_directory_members_recorded(self):
+        objects, errors = Data.bulk_create_from_paths([self.source])
+        self.assertEqual(errors, {})
+        data = Data.objects.get(id=objects[0].id)
+        self.assertEqual(data.members.get().name, "matrix/barcodes.tsv")
+    
+
+    def test_other_compression_read_with_zipfile(self):
+        path = os.path.join(self.dir.name, "dir.zip")
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_BZIP2) as archive:
+            archive.writestr("a.txt", "A" * 1000)
+        with open(path, "rb") as f:
+            upload = SimpleUploadedFile("dir.zip", f.read())
+        data = Data.create_from_upload(upload, is_directory=True)
+        member = data.member("a.txt")
+        self.assertEqual(member.method, zipfile.ZIP_BZIP2)
+        self.assertEqual(member.read(), b"A" * 1000)
+
+
+
 class DataCreationFromOutputTests(TestCase):
 
     @override_settings(NEXTFLOW_UPLOADS_ROOT="/uploads")
     @patch("os.path.isdir")
     @patch("django_nextflow.models.get_file_extension")
     @patch("os.path.getsize")
-    @patch("django_nextflow.models.get_file_hash")
-    @patch("django_nextflow.models.check_if_binary")
-    def test_can_create_from_output(self, mock_bin, mock_md5, mock_size, mock_ext, mock_dir):
+    @patch("django_nextflow.models.hash_file")
+    def test_can_create_from_output(self, mock_md5, mock_size, mock_ext, mock_dir):
         process_execution = mixer.blend(ProcessExecution)
         mock_ext.return_value = "txt"
         mock_size.return_value = 200
-        mock_md5.return_value = "X"
+        mock_md5.return_value = ("X", b"abc")
         mock_dir.return_value = False
-        mock_bin.return_value = False
         data = Data.create_from_output("/path/to/file.txt", process_execution)
         self.assertEqual(data.filename, "file.txt")
         self.assertEqual(data.filetype, "txt")
@@ -402,21 +776,19 @@ class DataCreationFromOutputTests(TestCase):
         mock_size.assert_called_with("/path/to/file.txt")
         mock_dir.assert_called_with("/path/to/file.txt")
         mock_md5.assert_called_with(os.path.join("/path/to/file.txt"))
-        mock_bin.assert_called_with(os.path.join("/path/to/file.txt"))
     
 
     @override_settings(NEXTFLOW_UPLOADS_ROOT="/uploads")
     @patch("os.path.isdir")
     @patch("django_nextflow.models.get_file_extension")
     @patch("os.path.getsize")
-    @patch("shutil.make_archive")
-    @patch("django_nextflow.models.get_file_hash")
-    @patch("django_nextflow.models.check_if_binary")
-    def test_can_create_directory_from_output(self, mock_bin, mock_md5, mock_zip, mock_size, mock_ext, mock_dir):
+    @patch("django_nextflow.models.write_archive")
+    @patch("django_nextflow.models.hash_file")
+    def test_can_create_directory_from_output(self, mock_bin, mock_zip, mock_size, mock_ext, mock_dir):
         process_execution = mixer.blend(ProcessExecution)
         mock_ext.return_value = ""
         mock_size.return_value = 200
-        mock_md5.return_value = "X"
+        mock_zip.return_value = ("X", [])
         mock_dir.return_value = True
         data = Data.create_from_output("/path/to/file", process_execution)
         self.assertEqual(data.filename, "file")
@@ -430,8 +802,9 @@ class DataCreationFromOutputTests(TestCase):
         mock_ext.assert_called_with("file")
         mock_size.assert_called_with("/path/to/file.zip")
         mock_dir.assert_called_with("/path/to/file")
-        mock_zip.assert_called_with("/path/to/file", "zip", "/path/to/file")
-        mock_md5.assert_called_with(os.path.join("/path/to/file.zip"))
+        mock_zip.assert_called_with(
+            "/path/to/file", "/path/to/file.zip", workers=None, compresslevel=6
+        )
         self.assertFalse(mock_bin.called)
     
 
@@ -558,11 +931,11 @@ class DataContentsTests(TestCase):
         mock_path.return_value = "/path"
         data = mixer.blend(Data, is_binary=False)
         data.full_path = "/path"
-        mock_open.return_value.__enter__.return_value.read.return_value = "X"
+        mock_open.return_value.__enter__.return_value.read.return_value = b"X"
         self.assertEqual(data.contents(), "X")
-        mock_open.assert_called_with("/path")
+        mock_open.assert_called_with("/path", "rb")
         mock_open.return_value.__enter__.return_value.seek.assert_called_with(0)
-        mock_open.return_value.__enter__.return_value.read.assert_called_with(1024)
+        mock_open.return_value.__enter__.return_value.read.assert_called_with(1027)
     
 
     @patch("django_nextflow.models.Data.full_path", new_callable=PropertyMock)
@@ -571,11 +944,70 @@ class DataContentsTests(TestCase):
         mock_path.return_value = "/path"
         data = mixer.blend(Data, is_binary=False)
         data.full_path = "/path"
-        mock_open.return_value.__enter__.return_value.read.return_value = "X"
+        mock_open.return_value.__enter__.return_value.read.return_value = b"X"
         self.assertEqual(data.contents(4, 500), "X")
-        mock_open.assert_called_with("/path")
+        mock_open.assert_called_with("/path", "rb")
         mock_open.return_value.__enter__.return_value.seek.assert_called_with(2000)
-        mock_open.return_value.__enter__.return_value.read.assert_called_with(500)
+        mock_open.return_value.__enter__.return_value.read.assert_called_with(503)
+
+
+    @patch("django_nextflow.models.Data.full_path", new_callable=PropertyMock)
+    @patch("django_nextflow.models.get_line_index")
+    def test_can_get_lines(self, mock_index, mock_path):
+        data = mixer.blend(Data, is_binary=False, is_directory=False, is_ready=True)
+        mock_index.return_value.read_lines.return_value = ["A", "B"]
+        mock_index.return_value.line_count = 20
+        self.assertEqual(data.lines(10, 2), ["A", "B"])
+        self.assertEqual(data.line_count(), 20)
+        mock_index.assert_called_with(mock_path.return_value)
+        mock_index.return_value.read_lines.assert_called_with(10, 2)
+    
+
+    @patch("django_nextflow.models.Data.full_path", new_callable=PropertyMock)
+    @patch("django_nextflow.models.is_gzipped")
+    @patch("django_nextflow.models.read_last_lines")
+    def test_can_get_tail(self, mock_read, mock_gzipped, mock_path):
+        data = mixer.blend(Data, is_binary=False, is_directory=False, is_ready=True)
+        mock_gzipped.return_value = False
+        mock_read.return_value = "A\nB\n"
+        self.assertEqual(data.tail(2), ["A", "B"])
+        mock_read.assert_called_with(mock_path.return_value, 2)
+    
+
+    @patch("django_nextflow.models.Data.full_path", new_callable=PropertyMock)
+    @patch("django_nextflow.models.is_gzipped")
+    @patch("django_nextflow.models.read_last_compressed_lines")
+    def test_can_get_gzipped_tail(self, mock_read, mock_gzipped, mock_path):
+        data = mixer.blend(Data, is_binary=False, is_directory=False, is_ready=True)
+        mock_gzipped.return_value = True
+        mock_read.return_value = ["A", "B"]
+        self.assertEqual(data.tail(2), ["A", "B"])
+        mock_read.assert_called_with(mock_path.return_value, 2)
+    
+
+    @patch("django_nextflow.models.Data.full_path", new_callable=PropertyMock)
+    @patch("django_nextflow.models.map_file")
+    def test_can_memory_map(self, mock_map, mock_path):
+        mock_path.return_value = "/path"
+        data = mixer.blend(Data, is_binary=True, is_directory=False, is_ready=True)
+        self.assertIs(data.memory_map(), mock_map.return_value)
+        mock_map.assert_called_with("/path")
+        data.is_directory = True
+        data.memory_map()
+        mock_map.assert_called_with("/path.zip")
+        data.is_removed = True
+        with self.assertRaises(ValueError) as context: data.memory_map()
+        self.assertIn("removed", str(context.exception))
+        data.is_ready = False
+        with self.assertRaises(ValueError) as context: data.memory_map()
+        self.assertIn("not ready", str(context.exception))
+    
+
+    def test_binary_lines(self):
+        data = mixer.blend(Data, is_binary=True, is_directory=False, is_ready=True)
+        self.assertIsNone(data.lines())
+        self.assertIsNone(data.line_count())
+        self.assertIsNone(data.tail())
 
 
 
@@ -613,27 +1045,159 @@ class DataDeletionTests(TestCase):
     def test_can_delete_upload(self, mock_rm):
         data = mixer.blend(Data, id=1, upstream_process_execution=None)
         data.delete()
-        mock_rm.assert_called_with(os.path.join("/uploads", "1"))
+        self.assertEqual(
+            list(PendingDeletion.objects.values_list("path", flat=True)),
+            [os.path.join("/uploads", "1")]
+        )
+        self.assertFalse(mock_rm.called)
     
 
     @override_settings(NEXTFLOW_DATA_ROOT="/data")
     @override_settings(NEXTFLOW_UPLOADS_ROOT="/uploads")
-    @patch("shutil.rmtree")
     @patch("django_nextflow.models.Data.full_path", new_callable=PropertyMock)
-    def test_can_delete_produced_file(self, mock_path, mock_rm):
+    def test_can_delete_produced_file(self, mock_path):
         mock_path.return_value = "/data/proc/data.txt"
         data = mixer.blend(Data, id=1)
         data.delete()
-        mock_rm.assert_called_with(os.path.join("/data/proc/data.txt"))
+        self.assertEqual(
+            list(PendingDeletion.objects.values_list("path", flat=True)),
+            ["/data/proc/data.txt"]
+        )
     
 
     @override_settings(NEXTFLOW_DATA_ROOT="/data")
     @override_settings(NEXTFLOW_UPLOADS_ROOT="/uploads")
-    @patch("shutil.rmtree")
     @patch("django_nextflow.models.Data.full_path", new_callable=PropertyMock)
-    def test_can_delete_produced_directory(self, mock_path, mock_rm):
+    def test_can_delete_produced_directory(self, mock_path):
         mock_path.return_value = "/data/proc/data"
         data = mixer.blend(Data, id=1, is_directory=True)
         data.delete()
-        mock_rm.assert_any_call(os.path.join("/data/proc/data"))
-        mock_rm.assert_any_call(os.path.join("/data/proc/data.zip"))
\ No newline at end of file
+        self.assertEqual(
+            set(PendingDeletion.objects.values_list("path", flat=True)),
+            {"/data/proc/data", "/data/proc/data.zip"}
+        )
+    
+
+    @override_settings(NEXTFLOW_DATA_ROOT="/data")
+    @patch("django_nextflow.models.Data.full_path", new_callable=PropertyMock)
+    def test_execution_deletion_queues_directory_once(self, mock_path):
+        execution = mixer.blend(Execution, id=1)
+        process_execution = mixer.blend(ProcessExecution, execution=execution)
+        for id in range(2, 5):
+            mixer.blend(Data, id=id, upstream_process_execution=process_execution)
+        execution.delete()
+        self.assertFalse(Data.objects.exists())
+        self.assertEqual(
+            list(PendingDeletion.objects.values_list("path", flat=True)),
+            [os.path.join("/data", "1")]
+        )
+        self.assertFalse(mock_path.called)
+    
+
+    @override_settings(NEXTFLOW_DATA_ROOT="/data")
+    @patch("django_nextflow.models.Data.full_path", new_callable=PropertyMock)
+    def test_execution_queryset_deletion_queues_directory_once(self, mock_path):
+        execution = mixer.blend(Execution, id=1)
+        process_execution = mixer.blend(ProcessExecution, execution=execution)
+        mixer.blend(Data, id=2, upstream_process_execution=process_execution)
+        Execution.objects.filter(id=1).delete()
+        self.assertEqual(
+            list(PendingDeletion.objects.values_list("path", flat=True)),
+            [os.path.join("/data", "1")]
+        )
+        self.assertFalse(mock_path.called)
+    
+
+    @override_settings(NEXTFLOW_DATA_ROOT="/data")
+    @patch("django_nextflow.models.Data.full_path", new_callable=PropertyMock)
+    def test_failed_execution_deletion_forgotten(self, mock_path):
+        mock_path.return_value = "/data/1/work/ab/cdef/data.txt"
+        execution = mixer.blend(Execution, id=1)
+        process_execution = mixer.blend(ProcessExecution, execution=execution)
+        data = mixer.blend(Data, id=2, upstream_process_execution=process_execution)
+        with patch("django_nextflow.models.PendingDeletion.enqueue") as mock_enqueue:
+            mock_enqueue.side_effect = RuntimeError
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic(): execution.delete()
+        self.assertTrue(Data.objects.filter(id=2).exists())
+        data.delete()
+        self.assertEqual(
+            list(PendingDeletion.objects.values_list("path", flat=True)),
+            ["/data/1/work/ab/cdef/data.txt"]
+        )
+
+
+
+class DataDeduplicationTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.uploads = os.path.join(self.dir.name, "uploads")
+        self.blobs = os.path.join(self.dir.name, "blobs")
+        os.mkdir(self.uploads)
+        self.settings = override_settings(
+            NEXTFLOW_UPLOADS_ROOT=self.uploads, NEXTFLOW_BLOB_ROOT=self.blobs
+        )
+        self.settings.enable()
+    
+
+    def tearDown(self):
+        self.settings.disable()
+        self.dir.cleanup()
+    
+
+    def test_no_blob_store_by_default(self):
+        self.settings.disable()
+        data = mixer.blend(Data, md5="abc", upstream_process_execution=None)
+        self.assertIsNone(data.blob_path)
+        self.assertFalse(data.deduplicate())
+        self.settings.enable()
+    
+
+    def test_outputs_not_deduplicated(self):
+        data = mixer.blend(Data, md5="abc")
+        self.assertIsNone(data.blob_path)
+    
+
+    def test_identical_uploads_share_blob(self):
+        data1 = Data.create_from_upload(SimpleUploadedFile("a.txt", b"ACGT"))
+        data2 = Data.create_from_upload(SimpleUploadedFile("b.txt", b"ACGT"))
+        data3 = Data.create_from_upload(SimpleUploadedFile("c.txt", b"TTTT"))
+        blob = os.path.join(self.blobs, data1.md5[:2], data1.md5)
+        self.assertEqual(data1.blob_path, blob)
+        self.assertTrue(os.path.samefile(data1.full_path, blob))
+        self.assertTrue(os.path.samefile(data2.full_path, blob))
+        self.assertFalse(os.path.samefile(data3.full_path, blob))
+        self.assertEqual(os.stat(blob).st_nlink, 3)
+    
+
+    def test_linked_imports_are_copied_into_store(self):
+        path = os.path.join(self.dir.name, "external.txt")
+        with open(path, "wb") as f: f.write(b"ACGT")
+        data1 = Data.create_from_path(path, mode="link")
+        self.assertTrue(os.path.samefile(data1.full_path, path))
+        blob = data1.blob_path
+        self.assertFalse(os.path.samefile(blob, path))
+        self.assertEqual(os.listdir(os.path.dirname(blob)), [data1.md5])
+        data2 = Data.create_from_upload(SimpleUploadedFile("b.txt", b"ACGT"))
+        self.assertTrue(os.path.samefile(data2.full_path, blob))
+        with open(path, "wb") as f: f.write(b"TTTT")
+        with open(data2.full_path, "rb") as f: self.assertEqual(f.read(), b"ACGT")
+    
+
+    def test_md5_collisions_not_shared(self):
+        data1 = Data.create_from_upload(SimpleUploadedFile("a.txt", b"ACGT"))
+        data2 = Data.create_from_upload(SimpleUploadedFile("b.txt", b"TTTT"))
+        data2.md5 = data1.md5
+        self.assertFalse(data2.deduplicate())
+        with open(data2.full_path, "rb") as f: self.assertEqual(f.read(), b"TTTT")
+    
+
+    def test_blob_deleted_with_last_upload(self):
+        data1 = Data.create_from_upload(SimpleUploadedFile("a.txt", b"ACGT"))
+        data2 = Data.create_from_upload(SimpleUploadedFile("b.txt", b"ACGT"))
+        blob = data1.blob_path
+        data1.delete()
+        self.assertTrue(os.path.exists(blob))
+        data2.delete()
+        self.assertFalse(os.path.exists(blob))
@@ -1,8 +1,10 @@
 import os
+import tempfile
 from unittest.mock import mock_open, patch, Mock
 from mixer.backend.django import mixer
 from django.test import TestCase
 from django.test.utils import override_settings
+from django_nextflow.logs import close_log_follower
 from django_nextflow.models import Execution, Pipeline
 
 class ExecutionCreationTests(TestCase):
@@ -29,6 +31,19 @@ class ExecutionCreationTests(TestCase):
         e2 = mixer.blend(Execution, started=None)
         e3 = mixer.blend(Execution, started=100)
         self.assertEqual(list(Execution.objects.all()), [e2, e3, e1])
+    
+
+    def test_log_fields_are_deferred(self):
+        mixer.blend(Execution, stdout="out", stderr="err", command="run")
+        execution = Execution.objects.get()
+        self.assertEqual(
+            execution.get_deferred_fields(), {"stdout", "stderr", "command"}
+        )
+        self.assertEqual(execution.stdout, "out")
+        execution = Execution.objects.with_logs().get()
+        self.assertEqual(execution.get_deferred_fields(), set())
+        with self.assertNumQueries(0):
+            self.assertEqual(execution.stderr, "err")
 
 
 class ExecutionFinishedTests(TestCase):
@@ -60,6 +75,81 @@ class ExecutionLogTests(TestCase):
         mock_open.assert_called_with(
             os.path.join("/home/data", str(execution.id), ".nextflow.log"),
         )
+    
+
+    @override_settings(NEXTFLOW_DATA_ROOT="/home/data")
+    @patch("django_nextflow.models.read_last_lines")
+    def test_can_get_log_tail(self, mock_read):
+        execution = mixer.blend(Execution)
+        self.assertEqual(execution.get_log_tail(20), mock_read.return_value)
+        mock_read.assert_called_with(
+            os.path.join("/home/data", str(execution.id), ".nextflow.log"), 20
+        )
+        mock_read.side_effect = FileNotFoundError
+        self.assertIsNone(execution.get_log_tail())
+    
+
+    @override_settings(NEXTFLOW_DATA_ROOT="/home/data")
+    @patch("django_nextflow.models.read_file_range")
+    def test_can_get_log_range(self, mock_read):
+        execution = mixer.blend(Execution)
+        mock_read.return_value = ("text", 104)
+        self.assertEqual(execution.get_log_range(100, 4), ("text", 104))
+        mock_read.assert_called_with(
+            os.path.join("/home/data", str(execution.id), ".nextflow.log"), 100, 4
+        )
+        mock_read.side_effect = FileNotFoundError
+        self.assertEqual(execution.get_log_range(100), (None, 100))
+    
+
+    @override_settings(NEXTFLOW_DATA_ROOT="/home/data")
+    @patch("django_nextflow.models.iter_file_text")
+    def test_can_iterate_log(self, mock_iter):
+        execution = mixer.blend(Execution)
+        mock_iter.return_value = iter(["a", "b"])
+        self.assertEqual(list(execution.iter_log(chunk_size=10)), ["a", "b"])
+        mock_iter.assert_called_with(
+            os.path.join("/home/data", str(execution.id), ".nextflow.log"), 0, 10
+        )
+        mock_iter.side_effect = FileNotFoundError
+        self.assertEqual(list(execution.iter_log()), [])
+    
+
+    @override_settings(NEXTFLOW_DATA_ROOT="/home/data")
+    def test_can_get_log_follower(self):
+        execution = mixer.blend(Execution)
+        follower = execution.log_follower()
+        self.assertEqual(follower.path, os.path.join(
+            "/home/data", str(execution.id), ".nextflow.log"
+        ))
+        self.assertIs(Execution.objects.get(id=execution.id).log_follower(), follower)
+        close_log_follower(str(execution.id))
+    
+
+    def test_following_finished_execution_stops(self):
+        with tempfile.TemporaryDirectory() as root:
+            with override_settings(NEXTFLOW_DATA_ROOT=root):
+                execution = mixer.blend(Execution, duration=None, exit_code=None)
+                os.mkdir(os.path.join(root, str(execution.id)))
+                with open(execution.log_path, "w") as f: f.write("one\ntwo\n")
+                Execution.objects.filter(id=execution.id).update(duration=10, exit_code=0)
+                follower = execution.log_follower()
+                self.assertEqual(list(execution.follow_log(interval=60)), ["one", "two"])
+                self.assertTrue(follower.closed)
+                self.assertIsNot(execution.log_follower(), follower)
+                close_log_follower(str(execution.id))
+    
+
+    def test_following_running_execution_stops_when_it_finishes(self):
+        with tempfile.TemporaryDirectory() as root:
+            with override_settings(NEXTFLOW_DATA_ROOT=root):
+                execution = mixer.blend(Execution, duration=None, exit_code=None)
+                os.mkdir(os.path.join(root, str(execution.id)))
+                with open(execution.log_path, "w") as f: f.write("one\n")
+                lines = execution.follow_log(interval=0.01)
+                self.assertEqual(next(lines), "one")
+                Execution.objects.filter(id=execution.id).update(exit_code=1)
+                self.assertEqual(list(lines), [])
 
 
 
@@ -120,6 +210,21 @@ class CreationFromObjectTests(TestCase):
         self.assertEqual(execution.duration, 10)
         self.assertEqual(execution.pipeline, pipeline)
         self.assertEqual(Execution.objects.count(), 1)
+    
+
+    def test_unchanged_poll_is_not_rewritten(self):
+        execution = Mock(
+            id="x_y", status="-", command="nextflow run", started=2021,
+            stdout="out", stderr="", returncode=None, duration=None
+        )
+        pipeline = mixer.blend(Pipeline)
+        Execution.create_from_object(execution, 1234, pipeline)
+        with self.assertNumQueries(1):
+            Execution.create_from_object(execution, 1234, pipeline)
+        execution.stdout, execution.status = "out\nmore", "OK"
+        with patch("django_nextflow.models.Execution.save") as mock_save:
+            Execution.create_from_object(execution, 1234, pipeline)
+            mock_save.assert_called_with(update_fields=["stdout", "status"])
 
 
 
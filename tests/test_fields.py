@@ -0,0 +1,84 @@
+import gzip
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from mixer.backend.django import mixer
+from django_nextflow.fields import CompressedTextField
+from django_nextflow.models import Execution
+
+class CompressionTests(TestCase):
+
+    def test_short_values_are_not_compressed(self):
+        field = CompressedTextField()
+        self.assertEqual(field.compress("hello"), b"hello")
+
+
+    def test_long_values_are_compressed(self):
+        field = CompressedTextField()
+        compressed = field.compress("N E X T F L O W\n" * 1000)
+        self.assertTrue(compressed.startswith(b"\x1f\x8b"))
+        self.assertLess(len(compressed), 1000)
+        self.assertEqual(gzip.decompress(compressed), b"N E X T F L O W\n" * 1000)
+
+
+    def test_can_decompress(self):
+        self.assertEqual(CompressedTextField.decompress(b"hello"), "hello")
+        self.assertEqual(CompressedTextField.decompress(
+            memoryview(gzip.compress("héllo".encode()))
+        ), "héllo")
+
+
+    def test_legacy_text_is_passed_through(self):
+        field = CompressedTextField()
+        self.assertEqual(field.from_db_value("old text", None, connection), "old text")
+        self.assertIsNone(field.from_db_value(None, None, connection))
+
+
+
+class CompressedStorageTests(TestCase):
+
+    def test_values_round_trip_through_database(self):
+        stdout = "line of output\n" * 10000
+        execution = mixer.blend(Execution, stdout=stdout, stderr="", command="run")
+        execution = Execution.objects.with_logs().get(id=execution.id)
+        self.assertEqual(execution.stdout, stdout)
+        self.assertEqual(execution.stderr, "")
+        self.assertEqual(execution.command, "run")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT stdout FROM django_nextflow_execution WHERE id = %s",
+                [execution.id]
+            )
+            stored = bytes(cursor.fetchone()[0])
+        self.assertTrue(stored.startswith(b"\x1f\x8b"))
+        self.assertLess(len(stored), len(stdout) // 10)
+
+
+
+class CompressionMigrationTests(TransactionTestCase):
+
+    def test_existing_logs_are_compressed_unchanged(self):
+        executor = MigrationExecutor(connection)
+        old = [("django_nextflow", "0007_defer_log_fields")]
+        new = [("django_nextflow", "0008_compress_log_fields")]
+        executor.migrate(old)
+        apps = executor.loader.project_state(old).apps
+        pipeline = apps.get_model("django_nextflow", "Pipeline").objects.create(
+            id=1, name="P", description="", path="", schema_path="", config_path=""
+        )
+        stdout = "C:\\data\\x00 \\\\ line\n" * 100
+        apps.get_model("django_nextflow", "Execution").objects.create(
+            id=2, pipeline=pipeline, identifier="a", status="OK",
+            stdout=stdout, stderr="\\n", command="nextflow run \\\n  main.nf"
+        )
+        executor = MigrationExecutor(connection)
+        executor.migrate(new)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT stdout FROM django_nextflow_execution WHERE id = 2")
+            self.assertTrue(bytes(cursor.fetchone()[0]).startswith(b"\x1f\x8b"))
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes("django_nextflow"))
+        execution = Execution.objects.with_logs().get(id=2)
+        self.assertEqual(execution.stdout, stdout)
+        self.assertEqual(execution.stderr, "\\n")
+        self.assertEqual(execution.command, "nextflow run \\\n  main.nf")
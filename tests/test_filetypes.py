@@ -0,0 +1,42 @@
+from django.test import TestCase
+from django.test.utils import override_settings
+from django_nextflow import filetypes
+from django_nextflow.filetypes import FileTypeRegistry
+
+class FileTypeRegistryTests(TestCase):
+
+    def test_longest_suffix_matched(self):
+        registry = FileTypeRegistry(["gz", "vcf.gz", "vcf.gz.tbi"])
+        self.assertEqual(registry.detect("a.vcf.gz.tbi"), "vcf.gz.tbi")
+        self.assertEqual(registry.detect("a.vcf.gz"), "vcf.gz")
+        self.assertEqual(registry.detect("a.b.gz"), "gz")
+    
+
+    def test_base_name_not_matched(self):
+        registry = FileTypeRegistry(["fastq.gz"])
+        self.assertEqual(registry.detect("fastq.gz"), "gz")
+    
+
+    def test_can_register_filetypes(self):
+        registry = FileTypeRegistry()
+        self.assertEqual(registry.detect("a.g.vcf.gz"), "vcf.gz")
+        registry.register("g.vcf.gz")
+        self.assertEqual(registry.detect("a.g.vcf.gz"), "g.vcf.gz")
+    
+
+    def test_can_register_magic(self):
+        registry = FileTypeRegistry()
+        self.assertEqual(registry.detect("a", "bam"), "")
+        registry.register_magic("bam", "bam")
+        self.assertEqual(registry.detect("a", "bam"), "bam")
+    
+
+    @override_settings(NEXTFLOW_FILETYPES=["peaks.bed"])
+    def test_settings_filetypes_loaded(self):
+        original = filetypes.registry, filetypes._settings_loaded
+        filetypes.registry, filetypes._settings_loaded = FileTypeRegistry(), False
+        try:
+            registry = filetypes.get_registry()
+            self.assertEqual(registry.detect("x.peaks.bed"), "peaks.bed")
+        finally:
+            filetypes.registry, filetypes._settings_loaded = original
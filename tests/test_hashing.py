@@ -0,0 +1,117 @@
+import os
+import hashlib
+import tempfile
+from collections import OrderedDict
+from unittest.mock import patch
+from django.test import TestCase
+from django_nextflow import hashing
+from django_nextflow.hashing import UploadHasher, start_upload_hasher
+from django_nextflow.hashing import get_upload_hasher, discard_upload_hasher
+
+class UploadHasherTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "file")
+        with open(self.path, "wb") as f: f.write(b"0123456789")
+        self.hasher = UploadHasher(self.path)
+    
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+
+
+class HashUpdatingTests(UploadHasherTest):
+
+    def test_can_hash_contiguous_bytes(self):
+        self.assertTrue(self.hasher.update(0, b"0123"))
+        self.assertTrue(self.hasher.update(4, b"456789"))
+        self.assertEqual(self.hasher.offset, 10)
+        self.assertEqual(self.hasher.hexdigest(10), hashlib.md5(b"0123456789").hexdigest())
+    
+
+    def test_out_of_place_bytes_ignored(self):
+        self.assertFalse(self.hasher.update(4, b"4567"))
+        self.assertEqual(self.hasher.offset, 0)
+    
+
+    def test_can_hash_chunks_being_written(self):
+        chunks = list(self.hasher.hash_chunks(0, iter([b"01", b"23"])))
+        self.assertEqual(chunks, [b"01", b"23"])
+        self.assertEqual(self.hasher.offset, 4)
+        chunks = list(self.hasher.hash_chunks(8, iter([b"89"])))
+        self.assertEqual(chunks, [b"89"])
+        self.assertEqual(self.hasher.offset, 4)
+    
+
+    def test_lock_not_held_while_chunks_are_written(self):
+        chunks = self.hasher.hash_chunks(0, iter([b"01", b"23", b"45"]))
+        self.assertEqual(next(chunks), b"01")
+        self.assertFalse(self.hasher.lock.locked())
+        self.assertTrue(self.hasher.update(2, b"2345"))
+        self.assertEqual(list(chunks), [b"23", b"45"])
+        self.assertEqual(self.hasher.offset, 6)
+        self.assertEqual(self.hasher.hexdigest(10), hashlib.md5(b"0123456789").hexdigest())
+
+
+
+class HashCatchingUpTests(UploadHasherTest):
+
+    def test_can_catch_up_from_disk(self):
+        self.hasher.update(0, b"012")
+        self.hasher.catch_up(6, block_size=2)
+        self.assertEqual(self.hasher.offset, 6)
+        self.assertEqual(self.hasher.hexdigest(10), hashlib.md5(b"0123456789").hexdigest())
+    
+
+    def test_lock_not_held_while_reading(self):
+        locked = []
+        real_open = open
+        def checking_open(*args, **kwargs):
+            locked.append(self.hasher.lock.locked())
+            return real_open(*args, **kwargs)
+        with patch("builtins.open", checking_open):
+            self.hasher.catch_up(10)
+        self.assertEqual(locked, [False])
+        self.assertEqual(self.hasher.hexdigest(10), hashlib.md5(b"0123456789").hexdigest())
+
+
+
+class HasherRegistryTests(UploadHasherTest):
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch("django_nextflow.hashing._hashers", OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+
+    def test_can_register_hashers(self):
+        hasher = start_upload_hasher(123, self.path)
+        self.assertIs(get_upload_hasher(123), hasher)
+        self.assertIs(discard_upload_hasher(123), hasher)
+        self.assertIsNone(get_upload_hasher(123))
+        self.assertIsNone(discard_upload_hasher(123))
+    
+
+    def test_abandoned_hashers_are_forgotten(self):
+        with patch("django_nextflow.hashing.time.monotonic") as mock_time:
+            mock_time.return_value = -hashing.UPLOAD_HASHER_TIMEOUT - 1
+            start_upload_hasher(1, self.path)
+        new = start_upload_hasher(2, self.path)
+        self.assertIsNone(get_upload_hasher(1))
+        self.assertIs(get_upload_hasher(2), new)
+        discard_upload_hasher(2)
+    
+
+    def test_hasher_count_is_limited(self):
+        with patch("django_nextflow.hashing.MAX_UPLOAD_HASHERS", 2):
+            start_upload_hasher(1, self.path)
+            start_upload_hasher(2, self.path)
+            get_upload_hasher(1)
+            start_upload_hasher(3, self.path)
+        self.assertIsNone(get_upload_hasher(2))
+        self.assertIsNotNone(get_upload_hasher(1))
+        self.assertIsNotNone(get_upload_hasher(3))
+        for key in (1, 3): discard_upload_hasher(key)
@@ -0,0 +1,175 @@
+import os
+import tempfile
+import threading
+from unittest.mock import Mock, patch
+from django.test import TestCase
+from django_nextflow.logs import LogFollower, get_log_follower
+from django_nextflow.logs import poll_log_follower, close_log_follower, release_log_follower
+
+class LogFollowerTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, ".nextflow.log")
+        self.follower = LogFollower(self.path)
+    
+
+    def tearDown(self):
+        self.dir.cleanup()
+    
+
+    def append(self, content):
+        with open(self.path, "ab") as f: f.write(content)
+
+
+
+class LogPollingTests(LogFollowerTest):
+
+    def test_can_handle_missing_log(self):
+        self.assertEqual(self.follower.poll(), [])
+    
+
+    def test_only_new_lines_are_returned(self):
+        self.append(b"one\ntwo\n")
+        self.assertEqual(self.follower.poll(), ["one", "two"])
+        self.assertEqual(self.follower.poll(), [])
+        self.append(b"three\n")
+        self.assertEqual(self.follower.poll(), ["three"])
+        self.assertEqual(self.follower.offset, 14)
+    
+
+    def test_unfinished_lines_are_held_back(self):
+        self.append(b"one\ntw")
+        self.assertEqual(self.follower.poll(), ["one"])
+        self.append(b"o\nthr")
+        self.assertEqual(self.follower.poll(), ["two"])
+    
+
+    def test_large_logs_are_read_in_chunks(self):
+        follower = LogFollower(self.path, chunk_size=8)
+        self.append(b"one\ntwo\nthree\nfour\n")
+        self.assertEqual(follower.poll(), ["one", "two"])
+        self.assertEqual(follower.offset, 8)
+        self.assertFalse(follower.caught_up)
+        self.assertEqual(follower.poll(), ["three"])
+        self.assertEqual(follower.poll(), ["four"])
+        self.assertTrue(follower.caught_up)
+        self.assertEqual(follower.offset, 19)
+    
+
+    def test_close_reads_every_chunk(self):
+        follower = LogFollower(self.path, chunk_size=4)
+        callback = follower.subscribe(Mock())
+        self.append(b"one\ntwo\nthree")
+        follower.close()
+        self.assertEqual([c[0][0] for c in callback.call_args_list], [
+            ["one"], ["two"], ["three"], None
+        ])
+    
+
+    def test_subscribers_share_one_read(self):
+        callback1, callback2 = Mock(), Mock()
+        self.follower.subscribe(callback1)
+        self.follower.subscribe(callback2)
+        self.append(b"one\n")
+        with patch("builtins.open", wraps=open) as mock_open:
+            self.follower.poll()
+            self.assertEqual(mock_open.call_count, 1)
+        callback1.assert_called_once_with(["one"])
+        callback2.assert_called_once_with(["one"])
+        self.follower.unsubscribe(callback2)
+        self.append(b"two\n")
+        self.follower.poll()
+        callback1.assert_called_with(["two"])
+        self.assertEqual(callback2.call_count, 1)
+    
+
+    def test_close_flushes_and_notifies(self):
+        callback = Mock()
+        self.follower.subscribe(callback)
+        self.append(b"one\ntwo")
+        self.follower.close()
+        self.assertEqual(
+            [c[0][0] for c in callback.call_args_list], [["one"], ["two"], None]
+        )
+        self.assertTrue(self.follower.closed)
+
+
+
+class LogFollowingTests(LogFollowerTest):
+
+    def test_can_follow_log_until_closed(self):
+        lines = []
+        self.append(b"one\n")
+        generator = self.follower.follow(interval=0.01)
+        thread = threading.Thread(target=lambda: lines.extend(generator))
+        thread.start()
+        while not self.follower.subscribers: pass
+        self.append(b"two\nthree")
+        self.follower.poll()
+        self.follower.close()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(lines, ["one", "two", "three"])
+        self.assertEqual(self.follower.subscribers, [])
+    
+
+    def test_following_closed_log_stops(self):
+        self.follower.close()
+        self.assertEqual(list(self.follower.follow()), [])
+    
+
+    def test_following_finished_log_stops_at_once(self):
+        self.append(b"one\ntwo")
+        lines = list(self.follower.follow(interval=60, stop=lambda: True))
+        self.assertEqual(lines, ["one", "two"])
+        self.assertTrue(self.follower.closed)
+    
+
+    def test_stop_is_checked_when_polling(self):
+        stop = Mock(side_effect=[False, False, True])
+        self.append(b"one\n")
+        lines = list(self.follower.follow(interval=0.01, stop=stop))
+        self.assertEqual(lines, ["one"])
+        self.assertEqual(stop.call_count, 3)
+        self.assertTrue(self.follower.closed)
+
+
+
+class FollowerRegistryTests(TestCase):
+
+    def test_followers_are_shared(self):
+        follower = get_log_follower("1", "/path/.nextflow.log")
+        self.assertIs(get_log_follower("1", "/path/.nextflow.log"), follower)
+        self.assertEqual(follower.path, "/path/.nextflow.log")
+        with patch.object(follower, "poll") as mock_poll:
+            poll_log_follower("1")
+            mock_poll.assert_called_with()
+        with patch.object(follower, "close") as mock_close:
+            close_log_follower("1")
+            mock_close.assert_called_with()
+        self.assertIsNot(get_log_follower("1", "/path/.nextflow.log"), follower)
+        close_log_follower("1")
+    
+
+    def test_closed_followers_are_replaced(self):
+        follower = get_log_follower("3", "/path/.nextflow.log")
+        follower.close()
+        self.assertIsNot(get_log_follower("3", "/path/.nextflow.log"), follower)
+        close_log_follower("3")
+    
+
+    def test_finished_followers_are_released(self):
+        follower = get_log_follower("4", "/path/.nextflow.log")
+        follower.subscribe(Mock())
+        release_log_follower("4", follower)
+        self.assertIs(get_log_follower("4", "/path/.nextflow.log"), follower)
+        follower.close()
+        release_log_follower("4", follower)
+        self.assertIsNot(get_log_follower("4", "/path/.nextflow.log"), follower)
+        close_log_follower("4")
+    
+
+    def test_missing_followers_are_ignored(self):
+        poll_log_follower("2")
+        close_log_follower("2")
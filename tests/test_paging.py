@@ -0,0 +1,177 @@
+import os
+import gzip
+import tempfile
+from unittest.mock import patch
+from django.test import TestCase
+from django_nextflow.paging import LineIndex, BlockIndex, get_line_index
+from django_nextflow.paging import get_block_index, open_data_file, is_bgzf
+from django_nextflow.paging import read_last_compressed_lines
+from django_nextflow.utils import read_text_page
+
+def bgzip(data, block_size=100):
+    """Compresses bytes in the BGZF format, with small blocks."""
+
+    blocks = []
+    for start in range(0, len(data), block_size):
+        member = gzip.compress(data[start:start + block_size], mtime=0)
+        body = member[10:]
+        blocks.append(
+            member[:3] + b"\x04" + member[4:10] + b"\x06\x00BC\x02\x00" +
+            (len(member) + 8 - 1).to_bytes(2, "little") + body
+        )
+    eof = gzip.compress(b"", mtime=0)
+    blocks.append(
+        eof[:3] + b"\x04" + eof[4:10] + b"\x06\x00BC\x02\x00" +
+        (len(eof) + 8 - 1).to_bytes(2, "little") + eof[10:]
+    )
+    return b"".join(blocks)
+
+
+class LineIndexTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "file.txt")
+    
+
+    def tearDown(self):
+        self.dir.cleanup()
+    
+
+    def write(self, content):
+        with open(self.path, "wb") as f: f.write(content)
+
+
+
+class LineIndexBuildingTests(LineIndexTest):
+
+    def test_can_index_empty_file(self):
+        self.write(b"")
+        index = LineIndex(self.path)
+        self.assertEqual(index.line_count, 0)
+        self.assertEqual(index.offsets, [0])
+        self.assertEqual(index.read_lines(0, 10), [])
+    
+
+    def test_can_count_lines(self):
+        self.write(b"a\nb\nc\n")
+        self.assertEqual(LineIndex(self.path).line_count, 3)
+        self.write(b"a\nb\nc")
+        self.assertEqual(LineIndex(self.path).line_count, 3)
+    
+
+    def test_offsets_recorded_every_step(self):
+        self.write(b"".join(f"{n}\n".encode() for n in range(25)))
+        index = LineIndex(self.path, step=10, chunk_size=7)
+        self.assertEqual(index.line_count, 25)
+        self.assertEqual(index.offsets, [0, 20, 50])
+
+
+
+class LineReadingTests(LineIndexTest):
+
+    def test_can_read_lines_anywhere(self):
+        self.write(b"".join(f"line {n}\r\n".encode() for n in range(250)))
+        index = LineIndex(self.path, step=100, chunk_size=64)
+        self.assertEqual(index.read_lines(0, 2), ["line 0", "line 1"])
+        self.assertEqual(index.read_lines(99, 3), ["line 99", "line 100", "line 101"])
+        self.assertEqual(index.read_lines(248, 10), ["line 248", "line 249"])
+        self.assertEqual(index.read_lines(250, 10), [])
+        self.assertEqual(index.read_lines(-1, 10), [])
+    
+
+    def test_invalid_text_is_replaced(self):
+        self.write(b"ok\n\xff\xfe\n")
+        self.assertEqual(LineIndex(self.path).read_lines(0, 2), ["ok", "��"])
+
+
+
+class LineIndexCacheTests(LineIndexTest):
+
+    def test_index_is_cached(self):
+        self.write(b"a\nb\n")
+        self.assertIs(get_line_index(self.path), get_line_index(self.path))
+    
+
+    def test_index_rebuilt_when_file_changes(self):
+        self.write(b"a\nb\n")
+        index = get_line_index(self.path)
+        self.write(b"a\nb\nc\n")
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        new_index = get_line_index(self.path)
+        self.assertIsNot(index, new_index)
+        self.assertEqual(new_index.line_count, 3)
+
+
+
+class CompressedFileTests(LineIndexTest):
+
+    def setUp(self):
+        super().setUp()
+        self.content = b"".join(f"line {n}\n".encode() for n in range(500))
+    
+
+    def test_can_read_plain_file(self):
+        self.write(self.content)
+        with open_data_file(self.path) as f:
+            self.assertEqual(f.read(), self.content)
+    
+
+    def test_can_read_gzipped_file(self):
+        self.write(gzip.compress(self.content))
+        self.assertFalse(is_bgzf(open(self.path, "rb").read(18)))
+        with open_data_file(self.path) as f:
+            f.seek(1000)
+            self.assertEqual(f.read(10), self.content[1000:1010])
+        self.assertEqual(LineIndex(self.path).read_lines(250, 2), ["line 250", "line 251"])
+    
+
+    def test_can_index_bgzipped_file(self):
+        self.write(bgzip(self.content))
+        self.assertTrue(is_bgzf(open(self.path, "rb").read(18)))
+        index = BlockIndex(self.path)
+        self.assertEqual(index.size, len(self.content))
+        self.assertEqual(len(index.blocks), (len(self.content) + 99) // 100)
+        self.assertEqual(index.starts[:3], [0, 100, 200])
+    
+
+    def test_can_seek_in_bgzipped_file(self):
+        self.write(bgzip(self.content))
+        with open_data_file(self.path) as f:
+            f.seek(3456)
+            self.assertEqual(f.read(150), self.content[3456:3606])
+            f.seek(10)
+            self.assertEqual(f.readline(), self.content[10:14])
+            f.seek(-5, 2)
+            self.assertEqual(f.read(), self.content[-5:])
+        self.assertIs(get_block_index(self.path), get_block_index(self.path))
+    
+
+    def test_can_page_through_bgzipped_text(self):
+        self.write(bgzip(self.content))
+        page = read_text_page(self.path, 200, 50, opener=open_data_file)
+        self.assertEqual(page, self.content[200:250].decode())
+        index = LineIndex(self.path, step=100)
+        self.assertEqual(index.line_count, 500)
+        self.assertEqual(index.read_lines(499, 5), ["line 499"])
+    
+
+    def test_can_tail_gzipped_file(self):
+        self.write(gzip.compress(self.content + b"last"))
+        self.assertEqual(
+            read_last_compressed_lines(self.path, 3), ["line 498", "line 499", "last"]
+        )
+        self.assertEqual(read_last_compressed_lines(self.path, 0), [])
+    
+
+    def test_tailing_bgzipped_file_only_decompresses_last_blocks(self):
+        self.write(bgzip(self.content))
+        with patch("django_nextflow.paging.gzip.decompress", wraps=gzip.decompress) as mock_decompress:
+            lines = read_last_compressed_lines(self.path, 20)
+        self.assertEqual(lines, [f"line {n}" for n in range(480, 500)])
+        self.assertLess(mock_decompress.call_count, 5)
+        self.assertEqual(
+            read_last_compressed_lines(self.path, 1000),
+            [f"line {n}" for n in range(500)]
+        )
@@ -1,10 +1,15 @@
 import os
 import json
+import tempfile
+from io import StringIO
 from unittest.mock import MagicMock, Mock, PropertyMock, patch
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.test import TestCase
 from django.test.utils import override_settings
 from mixer.backend.django import mixer
 from django_nextflow.models import Execution, Pipeline, Data, ProcessExecution
+from django_nextflow.schemas import SchemaValidator
 
 class PipelineCreationTests(TestCase):
 
@@ -41,6 +46,17 @@ class PipelineNextflowCreationTests(TestCase):
         self.assertEqual(pipeline.schema, os.path.join("/pipelines", "schema"))
     
 
+    @override_settings(NEXTFLOW_PIPELINE_ROOT="/pipelines")
+    def test_nextflow_pipeline_reused(self):
+        pipeline = mixer.blend(Pipeline, path="path", config_path="", schema_path="")
+        nextflow_pipeline = pipeline.create_pipeline()
+        self.assertIs(Pipeline.objects.get(id=pipeline.id).create_pipeline(), nextflow_pipeline)
+        pipeline.path = "other"
+        self.assertEqual(pipeline.create_pipeline().path, os.path.join("/pipelines", "other"))
+        with override_settings(NEXTFLOW_PIPELINE_ROOT="/elsewhere"):
+            self.assertEqual(pipeline.create_pipeline().path, os.path.join("/elsewhere", "other"))
+    
+
     @override_settings(NEXTFLOW_PIPELINE_ROOT="/pipelines")
     def test_can_create_nextflow_pipeline_without_values(self):
         pipeline = mixer.blend(Pipeline, path="path", config_path="", schema_path="")
@@ -53,11 +69,191 @@ class PipelineNextflowCreationTests(TestCase):
 
 class InputSchemaTests(TestCase):
 
-    @patch("django_nextflow.models.Pipeline.create_pipeline")
-    def test_can_get_input_schema(self, mock_create):
-        pipeline = mixer.blend(Pipeline)
-        mock_create.return_value = Mock(input_schema = {1: "schema"})
-        self.assertEqual(pipeline.input_schema, {1: "schema"})
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(NEXTFLOW_PIPELINE_ROOT=self.dir.name)
+        self.settings.enable()
+        self.path = os.path.join(self.dir.name, "schema.json")
+        self.write({"a": 1})
+    
+
+    def tearDown(self):
+        self.settings.disable()
+        self.dir.cleanup()
+    
+
+    def write(self, definitions):
+        with open(self.path, "w") as f:
+            json.dump({"title": "Pipeline", "definitions": definitions}, f)
+    
+
+    def test_schema_stored_on_save(self):
+        pipeline = mixer.blend(Pipeline, schema_path="schema.json")
+        self.assertEqual(json.loads(pipeline.schema_json), {"a": 1})
+        with patch("builtins.open") as mock_open:
+            self.assertEqual(pipeline.input_schema, {"a": 1})
+        self.assertFalse(mock_open.called)
+        self.assertEqual(Pipeline.objects.get(id=pipeline.id).input_schema, {"a": 1})
+    
+
+    def test_stored_schema_ignored_if_file_changed(self):
+        pipeline = mixer.blend(Pipeline, schema_path="schema.json")
+        self.write({"b": 2, "c": 3})
+        pipeline = Pipeline.objects.get(id=pipeline.id)
+        self.assertEqual(pipeline.input_schema, {"b": 2, "c": 3})
+        pipeline.save(update_fields=["schema_json"])
+        pipeline = Pipeline.objects.get(id=pipeline.id)
+        self.assertEqual(json.loads(pipeline.schema_json), {"b": 2, "c": 3})
+        self.assertEqual(pipeline.stored_schema_json(), pipeline.schema_json)
+    
+
+    def test_schema_not_stored_if_unreadable(self):
+        pipeline = mixer.blend(Pipeline, schema_path="missing.json")
+        self.assertEqual(pipeline.schema_json, "")
+        self.assertEqual(pipeline.schema_stat, "")
+        pipeline = mixer.blend(Pipeline, schema_path="")
+        self.assertEqual(pipeline.schema_json, "")
+        self.assertIsNone(pipeline.input_schema)
+    
+
+    def test_schema_file_cached_until_changed(self):
+        pipeline = mixer.blend(Pipeline, schema_path="schema.json")
+        Pipeline.objects.filter(id=pipeline.id).update(schema_json="")
+        pipeline = Pipeline.objects.get(id=pipeline.id)
+        with patch("django_nextflow.schemas.json.load", wraps=json.load) as mock_load:
+            self.assertEqual(pipeline.input_schema, {"a": 1})
+            self.assertEqual(pipeline.input_schema, {"a": 1})
+            self.assertLessEqual(mock_load.call_count, 1)
+            self.write({"b": 2, "c": 3})
+            self.assertEqual(pipeline.input_schema, {"b": 2, "c": 3})
+    
+
+    def test_cached_schema_can_be_modified(self):
+        pipeline = mixer.blend(Pipeline, schema_path="schema.json")
+        pipeline.schema_json = ""
+        pipeline.input_schema["a"] = 2
+        self.assertEqual(pipeline.input_schema, {"a": 1})
+    
+
+    def test_can_refresh_schemas(self):
+        pipeline = mixer.blend(Pipeline, schema_path="schema.json")
+        self.write({"b": 2})
+        stdout = StringIO()
+        call_command("refresh_schemas", stdout=stdout)
+        self.assertIn("Stored schemas for 1 of 1 pipelines", stdout.getvalue())
+        self.assertEqual(Pipeline.objects.get(id=pipeline.id).input_schema, {"b": 2})
+
+
+
+class ParamValidationTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(NEXTFLOW_PIPELINE_ROOT=self.dir.name)
+        self.settings.enable()
+        with open(os.path.join(self.dir.name, "schema.json"), "w") as f:
+            json.dump({"definitions": {"inputs": {
+                "required": ["input", "threads"],
+                "properties": {
+                    "input": {"type": "string", "pattern": "^\\S+\\.pdb$"},
+                    "threads": {"type": "integer", "minimum": 1, "maximum": 64},
+                    "ratio": {"type": "number"},
+                    "mode": {"type": "string", "enum": ["fast", "slow"]},
+                    "verbose": {"type": "boolean"},
+                }
+            }}}, f)
+        self.pipeline = mixer.blend(Pipeline, schema_path="schema.json")
+    
+
+    def tearDown(self):
+        self.settings.disable()
+        self.dir.cleanup()
+    
+
+    def assertErrors(self, errors, **kwargs):
+        with self.assertRaises(ValidationError) as context:
+            self.pipeline.validate_params(**kwargs)
+        self.assertEqual(context.exception.message_dict, errors)
+    
+
+    def test_valid_params(self):
+        self.pipeline.validate_params(params={
+            "input": "a.pdb", "threads": "8", "ratio": "0.5", "mode": "fast",
+            "verbose": "true", "other": "x"
+        })
+        self.pipeline.validate_params(
+            params={"threads": 64, "verbose": False}, data_params={"input": 23}
+        )
+        self.pipeline.validate_params(
+            params={"threads": 1}, execution_params={"input": "24"}
+        )
+    
+
+    def test_invalid_params(self):
+        self.assertErrors({
+            "input": ["Must match the pattern ^\\S+\\.pdb$."],
+            "threads": ["Must be at most 64."],
+            "ratio": ["Expected a number."],
+            "mode": ["Must be one of: fast, slow."],
+            "verbose": ["Expected true or false."],
+        }, params={
+            "input": "a.txt", "threads": "65", "ratio": "x", "mode": "medium",
+            "verbose": "yes"
+        })
+        self.assertErrors(
+            {"threads": ["Expected an integer."]},
+            params={"input": "a.pdb", "threads": "1.5"}
+        )
+    
+
+    def test_required_params(self):
+        self.assertErrors({
+            "input": ["This param is required."],
+            "threads": ["This param is required."]
+        }, params={})
+    
+
+    def test_required_params_with_defaults(self):
+        validator = SchemaValidator({"inputs": {
+            "required": ["outdir", "input"],
+            "properties": {
+                "outdir": {"type": "string", "default": "./results"},
+                "input": {"type": "string"},
+            }
+        }})
+        self.assertEqual(validator.required, ["input"])
+        validator.validate(params={"input": "a.pdb"})
+        with self.assertRaises(ValidationError) as context: validator.validate(params={})
+        self.assertEqual(context.exception.message_dict, {"input": ["This param is required."]})
+    
+
+    def test_invalid_object_params(self):
+        self.assertErrors({
+            "input": ["Expected an object ID or list of IDs."],
+            "threads": ["This param doesn't take files."]
+        }, data_params={"input": [1, "x"], "threads": 2})
+    
+
+    def test_validator_compiled_once(self):
+        validator = self.pipeline.get_validator()
+        self.assertIs(Pipeline.objects.get(id=self.pipeline.id).get_validator(), validator)
+        self.assertEqual(len(validator.checks), 5)
+    
+
+    def test_no_schema_no_validation(self):
+        self.pipeline.schema_path = "missing.json"
+        self.pipeline.schema_json = ""
+        self.assertIsNone(self.pipeline.get_validator())
+        self.pipeline.validate_params(params={"threads": "many"})
+    
+
+    @patch("django_nextflow.models.Execution.prepare_directory")
+    def test_run_validates_before_preparing_directory(self, mock_prepare):
+        with self.assertRaises(ValidationError):
+            self.pipeline.run(params={"input": "a.pdb", "threads": "0"})
+        with self.assertRaises(ValidationError):
+            next(iter(self.pipeline.run_and_update(params={})), None)
+        self.assertFalse(mock_prepare.called)
 
 
 
@@ -111,6 +307,22 @@ class DataPramCreationTests(TestCase):
         self.assertEqual(data, [data1])
     
 
+    def test_removed_data_rejected(self):
+        pipeline = mixer.blend(Pipeline, schema_path="")
+        mixer.blend(Data, id=1, filename="file1", is_removed=True)
+        mixer.blend(Data, id=2, filename="file2", is_removed=False)
+        pipeline.check_data_params({"A": 2, "B": [2]})
+        for value in (1, [2, 1]):
+            with self.assertRaises(ValueError) as context:
+                pipeline.check_data_params({"A": value})
+            self.assertIn("file1", str(context.exception))
+        with tempfile.TemporaryDirectory() as root:
+            with override_settings(NEXTFLOW_DATA_ROOT=root):
+                with self.assertRaises(ValueError): pipeline.run(data_params={"A": [2, 1]})
+                with self.assertRaises(ValueError): pipeline.run_and_update(data_params={"A": 1})
+            self.assertEqual(os.listdir(root), [])
+    
+
     @override_settings(NEXTFLOW_DATA_ROOT="/data")
     @patch("django_nextflow.models.Data.full_path", new_callable=PropertyMock)
     @patch("os.symlink")
@@ -219,6 +431,24 @@ class PipelineRunningTests(TestCase):
 
 class PipelineRunningAndUpdatingTests(TestCase):
 
+    @override_settings(NEXTFLOW_DATA_ROOT="/data")
+    @patch("django_nextflow.models.close_log_follower")
+    @patch("django_nextflow.models.Pipeline.create_pipeline")
+    @patch("django_nextflow.models.Execution.prepare_directory")
+    @patch("django_nextflow.models.Pipeline.create_params")
+    def test_log_follower_closed_on_error(self, mock_params, mock_prepare, mock_create, mock_close):
+        mock_prepare.return_value = "1000"
+        mock_params.return_value = {}, [], []
+        mock_create.return_value.run_and_poll.side_effect = RuntimeError
+        mock_create.return_value.run.side_effect = RuntimeError
+        pipeline = mixer.blend(Pipeline)
+        with self.assertRaises(RuntimeError): pipeline.run_and_update()
+        mock_close.assert_called_once_with("1000")
+        with self.assertRaises(RuntimeError): pipeline.run()
+        self.assertEqual(mock_close.call_count, 2)
+    
+
+
     @override_settings(NEXTFLOW_DATA_ROOT="/data")
     @patch("django_nextflow.models.Pipeline.create_pipeline")
     @patch("django_nextflow.models.Execution.prepare_directory")
@@ -25,6 +25,19 @@ class ProcessExecutionCreationTests(TestCase):
         p2 = mixer.blend(ProcessExecution, started=None)
         p3 = mixer.blend(ProcessExecution, started=100)
         self.assertEqual(list(ProcessExecution.objects.all()), [p2, p3, p1])
+    
+
+    def test_log_fields_are_deferred(self):
+        execution = mixer.blend(Execution)
+        pe = mixer.blend(ProcessExecution, execution=execution, stdout="out")
+        data = mixer.blend(Data, upstream_process_execution=pe)
+        pe = execution.process_executions.get()
+        self.assertEqual(pe.get_deferred_fields(), {"stdout", "stderr"})
+        self.assertEqual(pe.stdout, "out")
+        pe = Data.objects.get(id=data.id).upstream_process_execution
+        self.assertEqual(pe.get_deferred_fields(), {"stdout", "stderr"})
+        pe = ProcessExecution.objects.with_logs().get()
+        self.assertEqual(pe.get_deferred_fields(), set())
 
 
 
@@ -71,6 +84,32 @@ class ProcessExecutionCreationFromObject(TestCase):
         self.assertEqual(ProcessExecution.objects.count(), 1)
 
 
+    def test_unchanged_object_is_not_rewritten(self):
+        mock_pe = Mock(
+            process="PROC", hash="ab/123", started=2000,
+            status="OK", stdout="out", stderr="err", duration=10
+        )
+        mock_pe.name = "PROC (1)"
+        ex = mixer.blend(Execution)
+        ProcessExecution.create_from_object(mock_pe, ex)
+        with self.assertNumQueries(1):
+            ProcessExecution.create_from_object(mock_pe, ex)
+
+
+    def test_only_changed_fields_are_written(self):
+        mock_pe = Mock(
+            process="PROC", hash="ab/123", started=2000,
+            status="-", stdout="", stderr="", duration=None
+        )
+        mock_pe.name = "PROC (1)"
+        ex = mixer.blend(Execution)
+        ProcessExecution.create_from_object(mock_pe, ex)
+        mock_pe.status, mock_pe.duration = "COMPLETED", 10
+        with patch("django_nextflow.models.ProcessExecution.save") as mock_save:
+            ProcessExecution.create_from_object(mock_pe, ex)
+            mock_save.assert_called_with(update_fields=["status", "duration"])
+
+
 class ExecutionFinishedTests(TestCase):
 
     def test_can_get_finish_time(self):
@@ -292,6 +331,31 @@ class UpstreamDataCreationTests(TestCase):
         self.assertEqual(proc_ex.upstream_data.count(), 2)
         self.assertEqual(mock_create.call_count, 1)
         self.assertEqual(set(proc_ex.upstream_data.all()), set(Data.objects.all()))
+    
 
-
-
+    @override_settings(NEXTFLOW_UPLOADS_ROOT="/uploads".replace("/", os.path.sep))
+    @override_settings(NEXTFLOW_DATA_ROOT="/data".replace("/", os.path.sep))
+    @patch("django_nextflow.models.ProcessExecution.work_dir", new_callable=PropertyMock())
+    @patch("builtins.open", new_callable=mock_open)
+    def test_upstream_lookups_are_batched(self, mock_open, mock_work):
+        uploads = [mixer.blend(
+            Data, id=1000 + i, upstream_process_execution=None
+        ) for i in range(20)]
+        ex = mixer.blend(Execution, id=123)
+        pes = [mixer.blend(
+            ProcessExecution, execution=ex, identifier=f"{i:02}/345678"
+        ) for i in range(20)]
+        outputs = [mixer.blend(
+            Data, upstream_process_execution=pe, filename="out.txt"
+        ) for pe in pes]
+        tokens = [f"/uploads/{d.id}/file.txt" for d in uploads] + [
+            f"/data/123/work/{i:02}/3456789abc/out.txt" for i in range(20)
+        ]
+        run = "nxf_stage() { " + " ".join(tokens).replace("/", os.path.sep) + " }"
+        mock_open.return_value.__enter__.return_value.read.return_value = run
+        proc_ex = mixer.blend(ProcessExecution)
+        with self.assertNumQueries(4):
+            proc_ex.create_upstream_data_objects()
+        self.assertEqual(set(proc_ex.upstream_data.all()), set(uploads + outputs))
+        proc_ex.create_upstream_data_objects()
+        self.assertEqual(proc_ex.upstream_data.count(), 40)
@@ -0,0 +1,106 @@
+import os
+from unittest.mock import Mock, PropertyMock, patch, mock_open
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import override_settings
+from mixer.backend.django import mixer
+from django_nextflow.models import Data, Execution, ProcessExecution
+
+class QueryCountTests(TestCase):
+
+    def setUp(self):
+        self.execution = mixer.blend(Execution, id=123)
+        self.mock_pe = Mock(
+            process="PROC", hash="ab/123456", started=2000,
+            status="OK", stdout="out", stderr="err", duration=10
+        )
+        self.mock_pe.name = "PROC (1)"
+
+
+    def test_process_execution_creation_queries(self):
+        with self.assertNumQueries(5):
+            ProcessExecution.create_from_object(self.mock_pe, self.execution)
+
+
+    def test_process_execution_update_queries(self):
+        ProcessExecution.create_from_object(self.mock_pe, self.execution)
+        self.mock_pe.status = "FAILED"
+        with self.assertNumQueries(2):
+            ProcessExecution.create_from_object(self.mock_pe, self.execution)
+
+
+    @patch("os.path.isdir")
+    @patch("os.path.getsize")
+    @patch("django_nextflow.models.hash_file")
+    def test_data_from_output_queries(self, mock_md5, mock_size, mock_dir):
+        mock_dir.return_value = False
+        mock_size.return_value = 10
+        mock_md5.return_value = ("X", b"abc")
+        pe = mixer.blend(ProcessExecution, execution=self.execution)
+        with self.assertNumQueries(3):
+            Data.create_from_output("/path/to/file.txt", pe)
+        with self.assertNumQueries(1):
+            Data.create_from_output("/path/to/file.txt", pe)
+
+
+    @override_settings(NEXTFLOW_UPLOADS_ROOT="/uploads".replace("/", os.path.sep))
+    @override_settings(NEXTFLOW_DATA_ROOT="/data".replace("/", os.path.sep))
+    @patch("django_nextflow.models.ProcessExecution.work_dir", new_callable=PropertyMock())
+    @patch("builtins.open", new_callable=mock_open)
+    def test_upstream_data_queries_do_not_grow_with_inputs(self, mock_open, mock_work):
+        proc_ex = mixer.blend(ProcessExecution, execution=self.execution)
+        for count in (1, 50):
+            uploads = [mixer.blend(
+                Data, id=count * 1000 + i, upstream_process_execution=None
+            ) for i in range(count)]
+            pes = [mixer.blend(
+                ProcessExecution, execution=self.execution,
+                identifier=f"{i:02x}/{count:06}"
+            ) for i in range(count)]
+            for pe in pes:
+                mixer.blend(Data, upstream_process_execution=pe, filename="out.txt")
+            tokens = [f"/uploads/{d.id}/in.txt" for d in uploads] + [
+                f"/data/{self.execution.id}/work/{pe.identifier}abc/out.txt"
+                for pe in pes
+            ]
+            mock_open.return_value.__enter__.return_value.read.return_value = (
+                "nxf_stage() { " + " ".join(tokens).replace("/", os.path.sep) + " }"
+            )
+            with self.assertNumQueries(4):
+                proc_ex.create_upstream_data_objects()
+        self.assertEqual(proc_ex.upstream_data.count(), 102)
+
+
+
+class QueryPlanTests(TestCase):
+
+    def setUp(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("Query plans are only checked on SQLite")
+
+
+    def test_process_execution_lookup_uses_index(self):
+        plan = ProcessExecution.objects.filter(
+            execution_id=1, identifier="ab/123456"
+        ).explain()
+        self.assertIn("USING INDEX", plan)
+        self.assertIn("(execution_id=? AND identifier=?)", plan)
+
+
+    def test_output_filename_lookup_uses_index(self):
+        plan = Data.objects.filter(
+            upstream_process_execution_id=1, filename="file.txt"
+        ).explain()
+        self.assertIn("USING INDEX data_output_filename_idx", plan)
+
+
+    def test_batched_output_lookup_uses_index(self):
+        plan = Data.objects.filter(
+            upstream_process_execution_id__in=[1, 2], filename__in=["a", "b"]
+        ).explain()
+        self.assertIn("USING INDEX data_output_filename_idx", plan)
+
+
+    def test_md5_lookup_uses_index(self):
+        plan = Data.objects.filter(md5="abc").explain()
+        self.assertIn("USING INDEX data_md5_idx", plan)
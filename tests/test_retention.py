@@ -0,0 +1,184 @@
+import os
+import time
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from mixer.backend.django import mixer
+from django_nextflow.models import Data, Execution, Pipeline, ProcessExecution
+from django_nextflow.retention import (
+    apply_retention, executions_due, path_size, plan_retention,
+    protected_data_ids
+)
+
+class RetentionTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(NEXTFLOW_DATA_ROOT=self.dir.name)
+        self.settings.enable()
+        self.pipeline = mixer.blend(Pipeline, retention_policy=Pipeline.KEEP_OUTPUTS)
+        self.execution = mixer.blend(
+            Execution, id=1, pipeline=self.pipeline, started=time.time() - 100,
+            duration=50
+        )
+        self.work = os.path.join(self.dir.name, "1", "work")
+        self.pe1 = mixer.blend(ProcessExecution, execution=self.execution, identifier="ab/cdef")
+        self.pe2 = mixer.blend(ProcessExecution, execution=self.execution, identifier="cd/ef01")
+        self.write("ab/cdef1234/out.txt", 100)
+        self.write("ab/cdef1234/intermediate.bam", 1000)
+        self.write("ab/cdef1234/.command.sh", 10)
+        self.write("cd/ef012345/final.txt", 200)
+        self.write("cd/ef012345/out.txt", 1)
+        self.write("ef/99999999/unrelated.txt", 500)
+        self.write("../results/final.txt", 10)
+        self.data1 = mixer.blend(
+            Data, id=11, filename="out.txt", upstream_process_execution=self.pe1
+        )
+        self.data2 = mixer.blend(
+            Data, id=12, filename="final.txt", upstream_process_execution=self.pe2
+        )
+    
+
+    def tearDown(self):
+        self.settings.disable()
+        self.dir.cleanup()
+    
+
+    def write(self, path, size):
+        path = os.path.join(self.work, *path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f: f.write(b"x" * size)
+    
+
+    def exists(self, path):
+        return os.path.exists(os.path.join(self.work, *path.split("/")))
+
+
+
+class PathSizeTests(RetentionTest):
+
+    def test_can_get_path_size(self):
+        self.assertEqual(path_size(os.path.join(self.work, "ab", "cdef1234", "out.txt")), 100)
+        self.assertGreaterEqual(path_size(os.path.join(self.work, "ab")), 1110)
+        self.assertEqual(path_size(os.path.join(self.work, "missing")), 0)
+        os.symlink("/", os.path.join(self.work, "link"))
+        self.assertLess(path_size(os.path.join(self.work, "link")), 100)
+
+
+
+class ProtectionTests(RetentionTest):
+
+    def test_nothing_protected(self):
+        self.assertEqual(protected_data_ids(self.execution), set())
+    
+
+    def test_data_used_by_other_executions_protected(self):
+        other = mixer.blend(Execution, pipeline=self.pipeline)
+        self.data1.downstream_executions.add(self.execution)
+        self.data2.downstream_executions.add(other)
+        self.assertEqual(protected_data_ids(self.execution), {12})
+    
+
+    def test_data_used_by_other_process_executions_protected(self):
+        other = mixer.blend(ProcessExecution)
+        self.data1.downstream_process_executions.add(self.pe2)
+        self.assertEqual(protected_data_ids(self.execution), set())
+        self.data1.downstream_process_executions.add(other)
+        self.assertEqual(protected_data_ids(self.execution), {11})
+    
+
+    def test_execution_inputs_protect_everything(self):
+        other = mixer.blend(Execution, pipeline=self.pipeline)
+        other.upstream_executions.add(self.execution)
+        self.assertEqual(protected_data_ids(self.execution), {11, 12})
+
+
+
+class RetentionPlanningTests(RetentionTest):
+
+    def test_keep_all_deletes_nothing(self):
+        self.assertEqual(plan_retention(self.execution, Pipeline.KEEP_ALL), ([], []))
+    
+
+    def test_keep_outputs(self):
+        paths, removed = plan_retention(self.execution, Pipeline.KEEP_OUTPUTS)
+        self.assertEqual(paths, [
+            os.path.join(self.work, "ab", "cdef1234", "intermediate.bam"),
+            os.path.join(self.work, "cd", "ef012345", "out.txt"),
+            os.path.join(self.work, "ef", "99999999"),
+        ])
+        self.assertEqual(removed, [])
+    
+
+    def test_keep_referenced(self):
+        self.data2.downstream_executions.add(mixer.blend(Execution, pipeline=self.pipeline))
+        paths, removed = plan_retention(self.execution, Pipeline.KEEP_REFERENCED)
+        self.assertEqual(paths, [
+            os.path.join(self.work, "ab", "cdef1234"),
+            os.path.join(self.work, "cd", "ef012345", "out.txt"),
+            os.path.join(self.work, "ef", "99999999"),
+        ])
+        self.assertEqual(removed, [self.data1])
+
+
+
+class RetentionApplicationTests(RetentionTest):
+
+    def test_can_apply_retention(self):
+        reclaimed = apply_retention(self.execution, Pipeline.KEEP_REFERENCED, workers=2)
+        self.assertGreaterEqual(reclaimed, 1811)
+        self.assertFalse(self.exists("ab/cdef1234"))
+        self.assertEqual(os.listdir(os.path.join(self.work, "cd")), [])
+        self.assertTrue(os.path.exists(os.path.join(self.dir.name, "1", "results", "final.txt")))
+        self.assertTrue(Data.objects.get(id=11).is_removed)
+        execution = Execution.objects.get(id=1)
+        self.assertEqual(execution.reclaimed_bytes, reclaimed)
+        self.assertIsNotNone(execution.retention_applied)
+    
+
+    def test_removed_data_cannot_be_input(self):
+        apply_retention(self.execution, Pipeline.KEEP_REFERENCED)
+        pipeline = mixer.blend(Pipeline)
+        with self.assertRaises(ValueError) as context:
+            pipeline.check_data_params({"reads": 11})
+        self.assertIn("has been removed", str(context.exception))
+        os.mkdir(os.path.join(self.dir.name, "2"))
+        params = {}
+        pipeline.create_execution_params({"previous": 1}, "2", params)
+        self.assertEqual(os.listdir(os.path.join(
+            self.dir.name, "2", "executions", "previous", self.pe1.process_name
+        )), [])
+    
+
+    def test_dry_run_deletes_nothing(self):
+        reclaimed = apply_retention(self.execution, Pipeline.KEEP_OUTPUTS, dry_run=True)
+        self.assertGreaterEqual(reclaimed, 1501)
+        self.assertTrue(self.exists("ab/cdef1234/intermediate.bam"))
+        self.assertEqual(Execution.objects.get(id=1).reclaimed_bytes, 0)
+    
+
+    def test_executions_due(self):
+        mixer.blend(Execution, pipeline=self.pipeline, started=time.time(), duration=None)
+        mixer.blend(
+            Execution, pipeline=self.pipeline, started=time.time(), duration=1,
+            retention_applied=time.time()
+        )
+        self.assertEqual(list(executions_due(self.pipeline)), [self.execution])
+        self.pipeline.retention_days = 1
+        self.assertEqual(list(executions_due(self.pipeline)), [])
+        self.assertEqual(list(executions_due(
+            self.pipeline, now=time.time() + 86400
+        )), [self.execution])
+    
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command("apply_retention", stdout=stdout)
+        self.assertIn("Reclaimed", stdout.getvalue())
+        self.assertFalse(self.exists("ab/cdef1234/intermediate.bam"))
+        self.assertTrue(self.exists("ab/cdef1234/out.txt"))
+        self.assertTrue(self.exists("ab/cdef1234/.command.sh"))
+        self.assertFalse(self.exists("ef/99999999"))
+        self.assertGreaterEqual(Execution.objects.get(id=1).reclaimed_bytes, 1501)
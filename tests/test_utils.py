@@ -1,6 +1,26 @@
+import os
+import gzip
+import hashlib
+import tempfile
 from unittest.mock import patch
 from django.test import TestCase
-from django_nextflow.utils import check_if_binary, get_file_extension, get_file_hash
+from django_nextflow.utils import check_if_binary, get_file_extension, get_file_hash, is_gzipped
+from django_nextflow.utils import split_utf8, read_last_lines, read_file_range, iter_file_text
+from django_nextflow.utils import read_text_page, map_file, allocate_file, write_at
+from django_nextflow.utils import check_bytes_if_binary, write_and_hash, hash_file
+from django_nextflow.utils import detect_format
+from django_nextflow.utils import copy_and_hash, import_file, import_directory
+
+def bgzf_block(data):
+    """Compresses some bytes as a single BGZF block."""
+
+    member = gzip.compress(data, mtime=0)
+    return (
+        member[:3] + b"\x04" + member[4:10] + b"\x06\x00BC\x02\x00" +
+        (len(member) + 7).to_bytes(2, "little") + member[10:]
+    )
+
+
 
 class FileExtensionTests(TestCase):
 
@@ -14,6 +34,26 @@ class FileExtensionTests(TestCase):
 
     def test_can_get_no_extension(self):
         self.assertEqual(get_file_extension("file"), "")
+    
+
+    def test_can_get_compound_extensions(self):
+        self.assertEqual(get_file_extension("calls.vcf.gz.tbi"), "vcf.gz.tbi")
+        self.assertEqual(get_file_extension("reads.FASTQ.GZ"), "fastq.gz")
+        self.assertEqual(get_file_extension("run.v2.tar.gz"), "tar.gz")
+        self.assertEqual(get_file_extension("reads.fastq.bz2"), "fastq.bz2")
+        self.assertEqual(get_file_extension("file.gz"), "gz")
+    
+
+    def test_unknown_extensions_keep_compression(self):
+        self.assertEqual(get_file_extension("data.v1.xyz"), "xyz")
+        self.assertEqual(get_file_extension("data.xyz.zst"), "xyz.zst")
+        self.assertEqual(get_file_extension("data.xyz.gz.csi"), "xyz.gz.csi")
+    
+
+    def test_can_get_extension_from_magic_number(self):
+        self.assertEqual(get_file_extension("alignments", b"CRAM\x03"), "cram")
+        self.assertEqual(get_file_extension("notes", b"hello"), "")
+        self.assertEqual(get_file_extension("notes.txt", b"CRAM\x03"), "txt")
 
 
 
@@ -35,15 +75,333 @@ class FileBinaryCheckTests(TestCase):
 
     @patch("builtins.open")
     def test_can_detect_binary(self, mock_open):
-        mock_open.return_value.__enter__.return_value.read.return_value = ""
-        mock_open.return_value.__enter__.return_value.read.side_effect = UnicodeDecodeError("1", b"", 3, 4, "5")
+        mock_open.return_value.__enter__.return_value.read.return_value = b"\x00\x81"
         self.assertTrue(check_if_binary("/path/to/file"))
-        mock_open.assert_called_with("/path/to/file")
-        mock_open.return_value.__enter__.return_value.read.assert_called_with(1024)
+        mock_open.assert_called_with("/path/to/file", "rb")
+        mock_open.return_value.__enter__.return_value.read.assert_called_with(4096)
     
 
     @patch("builtins.open")
     def test_can_detect_not_binary(self, mock_open):
+        mock_open.return_value.__enter__.return_value.read.return_value = b"ACGT\n"
         self.assertFalse(check_if_binary("/path/to/file"))
-        mock_open.assert_called_with("/path/to/file")
-        mock_open.return_value.__enter__.return_value.read.assert_called_with(1024)
\ No newline at end of file
+        mock_open.assert_called_with("/path/to/file", "rb")
+        mock_open.return_value.__enter__.return_value.read.assert_called_with(4096)
+
+
+
+class FormatDetectionTests(TestCase):
+
+    def test_can_detect_magic_numbers(self):
+        self.assertEqual(detect_format(b"CRAM\x03\x00"), "cram")
+        self.assertEqual(detect_format(b"PK\x03\x04rest"), "zip")
+        self.assertEqual(detect_format(b"\x89HDF\r\n\x1a\n"), "hdf5")
+        self.assertEqual(detect_format(gzip.compress(b"ACGT")), "gzip")
+        self.assertIsNone(detect_format(b"ACGT\n"))
+        self.assertEqual(detect_format(b"BZh91AY&SY"), "bzip2")
+        self.assertIsNone(detect_format(b"CRAM and BAM files\n"))
+        self.assertIsNone(detect_format(b"BZh is a bzip2 header\n"))
+        self.assertFalse(check_bytes_if_binary(b"CRAM and BAM files\n"))
+        self.assertIsNone(detect_format(b""))
+    
+
+    def test_can_detect_bgzf_formats(self):
+        self.assertEqual(detect_format(bgzf_block(b"ACGT\n")), "bgzf")
+        self.assertEqual(detect_format(bgzf_block(b"BAM\x01header")), "bam")
+        self.assertEqual(detect_format(bgzf_block(b"BCF\x02\x02header")), "bcf")
+    
+
+    def test_can_classify_bytes(self):
+        self.assertFalse(check_bytes_if_binary(b""))
+        self.assertFalse(check_bytes_if_binary("héllo".encode()))
+        self.assertFalse(check_bytes_if_binary("hé".encode()[:2]))
+        self.assertFalse(check_bytes_if_binary("\ufeffhéllo".encode()))
+        self.assertTrue(check_bytes_if_binary("héllo".encode("utf-16")))
+        self.assertTrue(check_bytes_if_binary("héllo".encode("utf-32")))
+        self.assertTrue(check_bytes_if_binary(b"A\x00B\x00"))
+        self.assertTrue(check_bytes_if_binary(b"CRAM\x03\x00"))
+        self.assertTrue(check_bytes_if_binary(bgzf_block(b"BAM\x01header")))
+        self.assertFalse(check_bytes_if_binary(bgzf_block(b"##fileformat=VCFv4.2\n")))
+    
+
+    def test_only_fixed_prefix_examined(self):
+        self.assertFalse(check_bytes_if_binary(b"A" * 4096 + b"\x00"))
+
+
+
+class GzipBinaryCheckTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "file.gz")
+    
+
+    def tearDown(self):
+        self.dir.cleanup()
+    
+
+    def test_gzipped_text_is_not_binary(self):
+        with gzip.open(self.path, "wb") as f: f.write(b"@read1\nACGT\n")
+        self.assertTrue(is_gzipped(self.path))
+        self.assertFalse(check_if_binary(self.path))
+    
+
+    def test_gzipped_binary_is_binary(self):
+        with gzip.open(self.path, "wb") as f: f.write(bytes(range(256)) * 8)
+        self.assertTrue(check_if_binary(self.path))
+    
+
+    def test_corrupt_gzip_is_binary(self):
+        with open(self.path, "wb") as f: f.write(b"\x1f\x8b\x08\x00corrupt")
+        self.assertTrue(check_if_binary(self.path))
+
+
+
+class ByteBinaryCheckTests(TestCase):
+
+    def test_can_check_bytes(self):
+        self.assertFalse(check_bytes_if_binary(b"ACGT\n"))
+        self.assertFalse(check_bytes_if_binary("€".encode()[:2]))
+        self.assertTrue(check_bytes_if_binary(b"\x00\xff\xfe"))
+    
+
+    def test_can_check_gzipped_bytes(self):
+        compressed = gzip.compress(b"ACGT\n" * 10000)
+        self.assertFalse(check_bytes_if_binary(compressed[:100]))
+        self.assertTrue(check_bytes_if_binary(gzip.compress(bytes(range(256)))))
+        self.assertTrue(check_bytes_if_binary(b"\x1f\x8bcorrupt"))
+
+
+
+class FileReadingTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "file.log")
+    
+
+    def tearDown(self):
+        self.dir.cleanup()
+    
+
+    def write(self, content):
+        with open(self.path, "wb") as f: f.write(content)
+
+
+
+class Utf8SplittingTests(TestCase):
+
+    def test_can_split_complete_text(self):
+        self.assertEqual(split_utf8(b"abc"), (b"abc", b""))
+        self.assertEqual(split_utf8("abé".encode()), ("abé".encode(), b""))
+        self.assertEqual(split_utf8(b""), (b"", b""))
+    
+
+    def test_can_split_partial_character(self):
+        data = "ab€".encode()
+        self.assertEqual(split_utf8(data[:-1]), (b"ab", data[2:-1]))
+        self.assertEqual(split_utf8(data[:-2]), (b"ab", data[2:-2]))
+
+
+
+class LastLinesTests(FileReadingTest):
+
+    def test_can_read_last_lines(self):
+        self.write(b"".join(f"line {i}\n".encode() for i in range(10000)))
+        self.assertEqual(read_last_lines(self.path, 2), "line 9998\nline 9999\n")
+        self.assertEqual(read_last_lines(self.path, 3, block_size=4), "line 9997\nline 9998\nline 9999\n")
+    
+
+    def test_can_read_last_lines_without_final_newline(self):
+        self.write(b"one\ntwo\nthree")
+        self.assertEqual(read_last_lines(self.path, 2, block_size=3), "two\nthree")
+    
+
+    def test_can_read_more_lines_than_file_has(self):
+        self.write(b"one\ntwo\n")
+        self.assertEqual(read_last_lines(self.path, 20), "one\ntwo\n")
+        self.assertEqual(read_last_lines(self.path, 0), "")
+
+
+
+class FileRangeTests(FileReadingTest):
+
+    def test_can_read_range(self):
+        self.write(b"0123456789")
+        self.assertEqual(read_file_range(self.path, 2, 3), ("234", 5))
+        self.assertEqual(read_file_range(self.path, 8, 5), ("89", 10))
+        self.assertEqual(read_file_range(self.path, 10, 5), ("", 10))
+    
+
+    def test_range_leaves_split_characters_for_next_read(self):
+        self.write("a€b".encode())
+        self.assertEqual(read_file_range(self.path, 0, 2), ("a", 1))
+        self.assertEqual(read_file_range(self.path, 1, 4), ("€b", 5))
+
+
+
+class TextPageTests(FileReadingTest):
+
+    def test_can_read_page(self):
+        self.write(b"0123456789")
+        self.assertEqual(read_text_page(self.path, 0, 4), "0123")
+        self.assertEqual(read_text_page(self.path, 8, 4), "89")
+        self.assertEqual(read_text_page(self.path, 12, 4), "")
+    
+
+    def test_pages_split_characters_cleanly(self):
+        self.write("ab€cd€".encode())
+        pages = [read_text_page(self.path, n * 3, 3) for n in range(3)]
+        self.assertEqual(pages, ["ab€", "c", "d€"])
+        self.assertEqual("".join(pages), "ab€cd€")
+    
+
+    def test_tiny_pages_split_characters_cleanly(self):
+        text = "a\u00e9\u20ac\U0001f600b"
+        self.write(text.encode())
+        for size in (1, 2, 3):
+            pages = [read_text_page(self.path, n, size) for n in range(0, 11, size)]
+            self.assertEqual("".join(pages), text)
+            self.assertNotIn("\ufffd", "".join(pages))
+        self.assertEqual(read_text_page(self.path, 0, 1), "a")
+        self.assertEqual(read_text_page(self.path, 1, 1), "\u00e9")
+        self.assertEqual(read_text_page(self.path, 2, 1), "")
+        self.assertEqual(read_text_page(self.path, 7, 2), "")
+    
+
+    def test_page_size_must_be_positive(self):
+        self.write(b"0123456789")
+        with self.assertRaises(ValueError): read_text_page(self.path, 0, 0)
+        with self.assertRaises(ValueError): read_text_page(self.path, 0, -4)
+
+
+
+class FileIterationTests(FileReadingTest):
+
+    def test_can_iterate_through_file(self):
+        self.write("a€b€c".encode())
+        chunks = list(iter_file_text(self.path, chunk_size=2))
+        self.assertTrue(all(len(c.encode()) <= 4 for c in chunks))
+        self.assertEqual("".join(chunks), "a€b€c")
+        self.assertEqual("".join(iter_file_text(self.path, offset=4)), "b€c")
+
+
+
+
+class FileMappingTests(FileReadingTest):
+
+    def test_can_map_file(self):
+        self.write(b"0123456789")
+        with map_file(self.path) as view:
+            self.assertIsInstance(view, memoryview)
+            self.assertTrue(view.readonly)
+            self.assertEqual(bytes(view[2:5]), b"234")
+            with self.assertRaises(TypeError): view[0] = 1
+        with self.assertRaises(ValueError): view[0]
+    
+
+    def test_can_map_empty_file(self):
+        self.write(b"")
+        with map_file(self.path) as view:
+            self.assertEqual(len(view), 0)
+    
+
+    def test_slices_can_outlive_map(self):
+        self.write(b"0123456789")
+        with map_file(self.path) as view:
+            part = view[5:]
+        self.assertEqual(bytes(part), b"56789")
+
+
+
+
+class ChunkWritingTests(FileReadingTest):
+
+    def test_can_write_and_hash(self):
+        md5, head = write_and_hash(self.path, [b"abc", b"def"], head_size=4)
+        self.assertEqual(md5, hashlib.md5(b"abcdef").hexdigest())
+        self.assertEqual(head, b"abcd")
+        with open(self.path, "rb") as f: self.assertEqual(f.read(), b"abcdef")
+    
+
+    def test_can_allocate_file(self):
+        allocate_file(self.path, 1000)
+        self.assertEqual(os.path.getsize(self.path), 1000)
+    
+
+    def test_can_write_at_offsets(self):
+        allocate_file(self.path, 10)
+        self.assertEqual(write_at(self.path, 6, [b"67", b"89"]), 4)
+        self.assertEqual(write_at(self.path, 0, [b"012345"]), 6)
+        with open(self.path, "rb") as f: self.assertEqual(f.read(), b"0123456789")
+
+
+
+
+class FileImportTests(FileReadingTest):
+
+    def setUp(self):
+        super().setUp()
+        self.write(b"0123456789")
+        self.destination = os.path.join(self.dir.name, "imported.log")
+        self.md5 = hashlib.md5(b"0123456789").hexdigest()
+    
+
+    def test_can_hash_file(self):
+        self.assertEqual(hash_file(self.path, head_size=4), (self.md5, b"0123"))
+    
+
+    def test_can_copy_and_hash(self):
+        self.assertEqual(copy_and_hash(self.path, self.destination, chunk_size=3)[0], self.md5)
+        with open(self.destination, "rb") as f: self.assertEqual(f.read(), b"0123456789")
+    
+
+    def test_can_import_by_copy(self):
+        self.assertEqual(import_file(self.path, self.destination)[0], self.md5)
+        self.assertNotEqual(os.stat(self.path).st_ino, os.stat(self.destination).st_ino)
+    
+
+    def test_can_import_by_link(self):
+        self.assertEqual(import_file(self.path, self.destination, "link")[0], self.md5)
+        self.assertEqual(os.stat(self.path).st_ino, os.stat(self.destination).st_ino)
+    
+
+    def test_can_import_by_move(self):
+        self.assertEqual(import_file(self.path, self.destination, "move")[0], self.md5)
+        self.assertFalse(os.path.exists(self.path))
+    
+
+    def test_can_import_by_reflink(self):
+        self.assertEqual(import_file(self.path, self.destination, "reflink")[0], self.md5)
+        with open(self.destination, "rb") as f: self.assertEqual(f.read(), b"0123456789")
+    
+
+    @patch("os.link")
+    def test_falls_back_to_copy(self, mock_link):
+        mock_link.side_effect = OSError(18, "Invalid cross-device link")
+        self.assertEqual(import_file(self.path, self.destination, "link")[0], self.md5)
+        with open(self.destination, "rb") as f: self.assertEqual(f.read(), b"0123456789")
+    
+
+    def test_missing_file_is_not_copied(self):
+        with self.assertRaises(FileNotFoundError):
+            import_file(self.path + "x", self.destination, "link")
+    
+
+    def test_unknown_mode_rejected(self):
+        with self.assertRaises(ValueError):
+            import_file(self.path, self.destination, "teleport")
+    
+
+    def test_can_import_directory(self):
+        source = os.path.join(self.dir.name, "source")
+        os.mkdir(source)
+        os.rename(self.path, os.path.join(source, "file.log"))
+        for mode in ["copy", "link", "reflink"]:
+            destination = os.path.join(self.dir.name, mode)
+            import_directory(source, destination, mode)
+            with open(os.path.join(destination, "file.log"), "rb") as f:
+                self.assertEqual(f.read(), b"0123456789")
+        import_directory(source, self.destination, "move")
+        self.assertFalse(os.path.exists(source))
+        self.assertTrue(os.path.exists(os.path.join(self.destination, "file.log")))